@@ -1,41 +1,61 @@
-import json
+import io
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import (Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify,
+                   stream_with_context)
 from datetime import datetime, timedelta
 
+import metrics
+from bulk import FORMATS, MIMETYPES, export_chunks, guess_format, import_issues, iter_issues, read_records
+from events import POLL_SECONDS, EventBus, StreamLimitReached, can_stream, stream
+from geo import parse_coords
+from http_cache import ResponseCache, cached_json
+from jobs import schedule_training, start_training, training_status
+from repository import FILTER_FIELDS, SORT_KEYS, Repository, decode_cursor, encode_cursor
+from storage import ROLLUP_FIELDS, get_storage, new_issue_id, read_cache
+from uploads import MAX_UPLOAD_BYTES, UploadError, queue_thumbnail, save_upload, thumbnail_for
+from upvotes import buffer_upvotes
+
 app = Flask(__name__)
 app.secret_key = "super_secret_key" 
-
-USERS_FILE = "users.json"
-OFFICIALS_FILE = "officials.json"
-ISSUES_FILE = "all_issues.json"
-AI_PREDICTIONS_FILE = "ai_predictions.json"
-
-# ------------------- Helper Functions ------------------- #
-# ------------------- Helper Functions ------------------- #
-def load_data(file):
-    if os.path.exists(file):
-        with open(file, "r") as f:
-            try:
-                # Use a specific check for AI predictions file
-                if file == AI_PREDICTIONS_FILE:
-                    data = json.load(f)
-                    return data if isinstance(data, list) else []
-                # Original logic for other files
-                data = json.load(f)
-                if file == ISSUES_FILE:
-                    return data if isinstance(data, dict) else {}
-                else:
-                    return data if data else []
-            except json.JSONDecodeError:
-                return [] if file == AI_PREDICTIONS_FILE else {} if file == ISSUES_FILE else []
-    
-    # Return appropriate empty data structure if file doesn't exist
-    return [] if file == AI_PREDICTIONS_FILE else {} if file == ISSUES_FILE else []
-
-def save_data(file, data):
-    with open(file, "w") as f:
-        json.dump(data, f, indent=4)
+# Werkzeug rejects larger request bodies before they are read (the margin is
+# for the other form fields); save_upload enforces the photo limit itself
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 2 ** 20
+app.add_template_filter(thumbnail_for, "thumbnail")
+# Request and template timings for /metrics, plus the slow-request profiler
+metrics.instrument(app)
+
+# ------------------- Storage ------------------- #
+# SQLite (WAL) by default; set FIXORA_STORAGE=json to keep using the flat files.
+# Lookups are answered from the repository's in-process indexes. Upvotes are
+# buffered and written in batches (see upvotes.py).
+storage = Repository(buffer_upvotes(get_storage()))
+
+# JSON responses keyed by request and tagged with storage.version(); any write
+# to users, issues or predictions moves the version on, so entries never go stale
+response_cache = ResponseCache()
+
+# Change events for the dashboards' /events stream, published by the actions below
+events = EventBus()
+
+# Warm-started training makes frequent refreshes cheap; e.g.
+# FIXORA_TRAIN_INTERVAL=300 refreshes AI predictions every five minutes
+if os.environ.get("FIXORA_TRAIN_INTERVAL"):
+    schedule_training(int(os.environ["FIXORA_TRAIN_INTERVAL"]))
+
+def _wants_json():
+    return request.accept_mimetypes.best == "application/json"
+
+def _action_reply(endpoint, code=200, message=None, category="success", **data):
+    """Replies to a form action: small JSON for fetch() callers, else flash + redirect."""
+    if _wants_json():
+        return jsonify(dict(data, ok=code < 400, message=message)), code
+    if message:
+        flash(message, category)
+    return redirect(url_for(endpoint))
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return _action_reply("citizen_home", 413, f"Photos can be at most {MAX_UPLOAD_BYTES // 2 ** 20} MB", "error")
 
 # ------------------- Public Routes ------------------- #
 @app.route("/")
@@ -44,11 +64,9 @@ def home():
     official_email = session.get("official_email")
     user = None
     if user_email:
-        users = load_data(USERS_FILE)
-        user = next((u for u in users if u["email"] == user_email), None)
+        user = storage.get_user(user_email)
     elif official_email:
-        officials = load_data(OFFICIALS_FILE)
-        user = next((o for o in officials if o["email"] == official_email), None)
+        user = storage.get_official(official_email)
     return render_template("index.html", user=user)
 
 @app.route("/create-account")
@@ -62,10 +80,7 @@ def user_register():
         username = request.form["username"]
         password = request.form["password"]
         pincode = request.form.get("pincode", "")
-        users = load_data(USERS_FILE)
-        if any(u["email"] == email for u in users):
-            return redirect(url_for("user_register"))
-        users.append({
+        added = storage.add_user({
             "email": email,
             "username": username,
             "password": password,
@@ -73,7 +88,8 @@ def user_register():
             "upvoted_issues": [],
             "upvoted_ai_predictions": []
         })
-        save_data(USERS_FILE, users)
+        if not added:
+            return redirect(url_for("user_register"))
         return redirect(url_for("user_login"))
     return render_template("user_register.html")
 
@@ -84,11 +100,8 @@ def govt_register():
         name = request.form["name"]
         email = request.form["email"]
         password = request.form["password"]
-        officials = load_data(OFFICIALS_FILE)
-        if any(o["email"] == email for o in officials):
+        if not storage.add_official({"dept": dept, "name": name, "email": email, "password": password}):
             return redirect(url_for("govt_register"))
-        officials.append({"dept": dept, "name": name, "email": email, "password": password})
-        save_data(OFFICIALS_FILE, officials)
         return redirect(url_for("govt_login"))
     return render_template("govt_register.html")
 
@@ -97,9 +110,8 @@ def user_login():
     if request.method == "POST":
         email = request.form["email"]
         password = request.form["password"]
-        users = load_data(USERS_FILE)
-        user = next((u for u in users if u["email"] == email and u["password"] == password), None)
-        if user:
+        user = storage.get_user(email)
+        if user and user["password"] == password:
             session["user_email"] = user["email"]
             return redirect(url_for("citizen_home"))
 
@@ -111,9 +123,8 @@ def govt_login():
     if request.method == "POST":
         email = request.form["email"]
         password = request.form["password"]
-        officials = load_data(OFFICIALS_FILE)
-        official = next((o for o in officials if o["email"] == email and o["password"] == password), None)
-        if official:
+        official = storage.get_official(email)
+        if official and official["password"] == password:
             session["official_email"] = official["email"]
             return redirect(url_for("official_home"))
 
@@ -127,54 +138,36 @@ def citizen_home():
     if not user_email:
         return redirect(url_for("user_login"))
     
-    users = load_data("users.json")
-    user = next((u for u in users if u["email"] == user_email), None)
+    user = storage.get_user(user_email)
     if not user:
         return redirect(url_for("user_login"))
 
     user_pincode = user.get("pincode")
-    all_ai_predictions = load_data("ai_predictions.json")
-    all_issues_data = load_data("all_issues.json")
-    flattened_issues = []
-    if isinstance(all_issues_data, dict):
-        for user_issues_list in all_issues_data.values():
-            if isinstance(user_issues_list, list):
-                flattened_issues.extend(user_issues_list)
 
     # Load user's issues for the "My Issues" section
-    user_issues = []
-    username_key_lower = f"{user['username'].lower()}_issues"
-    if isinstance(all_issues_data, dict):
-        for key in all_issues_data:
-            if key.lower() == username_key_lower:
-                user_issues = all_issues_data[key]
-                if not isinstance(user_issues, list):
-                    user_issues = []
-                break
+    user_issues = storage.issues_for_user(user['username'])
 
     # Filter AI predictions for the user's pincode
     if user_pincode:
-        ai_predictions_to_upvote = [
-            pred for pred in all_ai_predictions 
-            if pred.get("pincode") == user_pincode
-        ]
+        ai_predictions_to_upvote = storage.predictions_for_pincode(user_pincode)
     else:
         ai_predictions_to_upvote = []
 
     issues_to_display = []
     heading = ""
-    upvoted_issue_ids = user.get("upvoted_issues", [])
-    upvoted_ai_prediction_ids = user.get("upvoted_ai_predictions", [])
+    # Sets, so the template's membership checks are O(1) per issue
+    upvoted_issue_ids = user.get("upvoted_issues", set())
+    upvoted_ai_prediction_ids = user.get("upvoted_ai_predictions", set())
 
     if request.method == "POST":
         # User entered a pincode to filter issues
         pincode = request.form.get("pincode")
-        issues_to_display = [i for i in flattened_issues if i.get('pincode') == pincode]
+        issues_to_display = storage.issues_for_pincode(pincode)
         heading = f"Issues in pincode: {pincode}"
     else:
         # Default: show issues in user's area (matching user's pincode)
         if user_pincode:
-            issues_to_display = [i for i in flattened_issues if i.get('pincode') == user_pincode]
+            issues_to_display = storage.issues_for_pincode(user_pincode)
             heading = "Issues in your area"
 
     return render_template(
@@ -202,15 +195,14 @@ def logout():
 def report_issue():
     if 'user_email' not in session:
         
-        return redirect(url_for("user_login"))
+        return _action_reply("user_login", 401)
     
     user_email = session['user_email']
-    users = load_data(USERS_FILE)
-    user = next((u for u in users if u['email'] == user_email), None)
+    user = storage.get_user(user_email)
     
     if not user:
        
-        return redirect(url_for("user_login"))
+        return _action_reply("user_login", 401)
 
     title = request.form['title']
     description = request.form['description']
@@ -222,11 +214,22 @@ def report_issue():
     anonymous = request.form.get('anonymous', 'no') == 'yes'
     photo = request.files.get('photo')
     photo_path = None
+
+    # Checked before the photo is stored; the form resubmits with
+    # report_anyway=yes once the citizen has seen the suggestions
+    if request.form.get('report_anyway') != 'yes':
+        duplicates = _duplicates(user, category, latitude, longitude, title, description)
+        if duplicates:
+            message = f'A similar issue is already open nearby: "{duplicates[0]["title"]}". Upvote it instead?'
+            return _action_reply("citizen_home", 409, message, "error", duplicates=duplicates)
     
     if photo and photo.filename != "":
-        photo_path = f"static/uploads/{photo.filename}"
-        os.makedirs(os.path.dirname(photo_path), exist_ok=True)
-        photo.save(photo_path)
+        # Stored under the SHA-256 of its bytes; the thumbnail is made off the request path
+        try:
+            photo_path = save_upload(photo)
+        except UploadError as e:
+            return _action_reply("citizen_home", 400, str(e), "error")
+        queue_thumbnail(photo_path)
         
     now = datetime.now()
     issue_date = now.strftime("%Y-%m-%d")
@@ -234,6 +237,7 @@ def report_issue():
     issue_month = now.strftime("%B")
     
     issue = {
+        "id": new_issue_id(),
         "title": title,
         "description": description,
         "pincode": pincode,
@@ -248,26 +252,40 @@ def report_issue():
         "month": issue_month
     }
     
-    user_file = f"{user['username']}_issues.json"
-    user_issues = load_data(user_file)
-    if not isinstance(user_issues, list):
-        user_issues = []
-    
-    user_issues.append(issue)
-    save_data(user_file, user_issues)
-    
-    all_issues = load_data(ISSUES_FILE)
-    username_key = f"{user['username']}_issues"
-    if username_key not in all_issues:
-        all_issues[username_key] = []
-    
-    global_issue = issue.copy()
-    global_issue["username"] = user['username']
-    global_issue["status"] = "Pending"
-    all_issues[username_key].append(global_issue)
-    save_data(ISSUES_FILE, all_issues)
-
-    return redirect(url_for("citizen_home"))
+    # Storage is the single source of truth; "My Issues" comes from the
+    # repository's username index (`python storage.py reconcile` merges any
+    # old {username}_issues.json files)
+    issue["username"] = user['username']
+    issue["status"] = "Pending"
+    storage.add_issue(issue)
+    payload = _issue_event(issue)
+    events.publish("issue_created", payload)
+
+    return _action_reply("citizen_home", 201, issue=payload)
+
+def _duplicates(user, category, latitude, longitude, title, description):
+    """Open issues near the given spot that look like the same report, as upvotable cards."""
+    coords = parse_coords({"lat": latitude, "lng": longitude})
+    if coords is None or not category:
+        return []
+    found = []
+    for issue, metres, score in storage.find_duplicates(category, *coords, f"{title} {description}"):
+        card = _issue_event(issue)
+        card.update(upvoted=issue["id"] in user.get("upvoted_issues", set()),
+                    distance_m=round(metres), similarity=round(score, 2))
+        found.append(card)
+    return found
+
+@app.route("/api/duplicates")
+def api_duplicates():
+    """Likely duplicates of a report being written, so the form can offer an upvote instead."""
+    user = storage.get_user(session.get('user_email', ''))
+    if not user:
+        return jsonify({"error": "login required"}), 401
+    args = request.args
+    return jsonify({"duplicates": _duplicates(user, args.get('category'), args.get('latitude'),
+                                              args.get('longitude'), args.get('title', ''),
+                                              args.get('description', ''))})
 
 # app.py
 
@@ -279,25 +297,13 @@ def view_my_issues():
     if not user_email:
         return redirect(url_for("user_login"))
 
-    users = load_data(USERS_FILE)
-    user = next((u for u in users if u["email"] == user_email), None)
+    user = storage.get_user(user_email)
 
     if not user:
         return redirect(url_for("user_login"))
 
-    # Load all issues from the central file
-    all_issues = load_data(ISSUES_FILE)
-    user_issues = []
-
-    # Check if the data is a dictionary and contains the user's issues (case-insensitive key lookup)
-    username_key_lower = f"{user['username'].lower()}_issues"
-    if isinstance(all_issues, dict):
-        for key in all_issues:
-            if key.lower() == username_key_lower:
-                user_issues = all_issues[key]
-                if not isinstance(user_issues, list):
-                    user_issues = []
-                break
+    # Issues are matched to the user case-insensitively
+    user_issues = storage.issues_for_user(user['username'])
 
     return render_template("view_my_issues.html", user=user, issues=user_issues)
 
@@ -306,156 +312,177 @@ def view_my_issues():
 @app.route("/increment_upvote", methods=["POST"])
 def increment_upvote():
     if 'user_email' not in session:
-        return redirect(url_for("user_login"))
+        return _action_reply("user_login", 401)
     
     user_email = session.get("user_email")
-    users = load_data(USERS_FILE)
-    user = next((u for u in users if u["email"] == user_email), None)
+    user = storage.get_user(user_email)
     if not user:
-        return redirect(url_for("user_login"))
-
-    issue_title = request.form.get('issue_title')
-    issue_pincode = request.form.get('issue_pincode')
-    issue_username = request.form.get('issue_username')
+        return _action_reply("user_login", 401)
 
-    # Compose a unique identifier for the issue to track upvotes
-    issue_id = f"{issue_title}__{issue_pincode}__{issue_username}"
+    issue_id = request.form.get('issue_id')
 
     # Check if user has already upvoted this issue
-    if "upvoted_issues" not in user:
-        user["upvoted_issues"] = []
-
-    if issue_id in user["upvoted_issues"]:
-        # User already upvoted this issue, redirect
-        return redirect(url_for("citizen_home"))
-
-    # Increment upvotes in all_issues.json
-    all_issues = load_data(ISSUES_FILE)
-    if isinstance(all_issues, dict) and issue_username:
-        username_key = f"{issue_username}_issues"
-        if username_key in all_issues and isinstance(all_issues[username_key], list):
-            for issue in all_issues[username_key]:
-                if issue.get('title') == issue_title and issue.get('pincode') == issue_pincode:
-                    issue['upvotes'] = issue.get('upvotes', 0) + 1
-                    break
-            save_data(ISSUES_FILE, all_issues)
-
-    # Increment upvotes in user's own issues file
-    if issue_username:
-        user_file = f"{issue_username}_issues.json"
-        user_issues = load_data(user_file)
-        if isinstance(user_issues, list):
-            for issue in user_issues:
-                if issue.get('title') == issue_title and issue.get('pincode') == issue_pincode:
-                    issue['upvotes'] = issue.get('upvotes', 0) + 1
-                    break
-            save_data(user_file, user_issues)
-
-    # Add issue_id to user's upvoted_issues and save users.json
-    user["upvoted_issues"].append(issue_id)
-    save_data(USERS_FILE, users)
-
-    flash("Upvoted successfully!", "success")
-    return redirect(url_for("citizen_home"))
+    if issue_id in user.get("upvoted_issues", set()):
+        return _action_reply("citizen_home", 409, id=issue_id)
+
+    # Records the vote and increments the counter in one step; False if already upvoted
+    if not storage.upvote_issue(user_email, issue_id):
+        return _action_reply("citizen_home", 409, id=issue_id)
+
+    change = {"id": issue_id, "upvotes": storage.get_issue(issue_id).get("upvotes", 0)}
+    events.publish("issue_upvoted", change)
+    return _action_reply("citizen_home", 200, "Upvoted successfully!", **change)
 
 @app.route("/official_home")
 def official_home():
     user_email = session.get("official_email")
-    officials = load_data(OFFICIALS_FILE)
-    user = next((o for o in officials if o["email"] == user_email), None)
+    user = storage.get_official(user_email)
 
     # Get category filter from query parameters
     selected_category = request.args.get('category', '')
 
     # --- Simplified AI Predictions loading ---
-    ai_predictions = load_data(AI_PREDICTIONS_FILE)
-
-    # Load and process all issues for the main dashboard and tables
-    all_issues_data = load_data(ISSUES_FILE)
-    cleaned_issues = []
-    issue_markers = []
-    # ... (rest of your existing logic for all_issues and issue_markers) ...
-
-    if isinstance(all_issues_data, dict):
-        for issues_list in all_issues_data.values():
-            if isinstance(issues_list, list):
-                for issue in issues_list:
-                    if isinstance(issue, dict):
-                        if "status" not in issue:
-                            issue["status"] = "Pending"
-                        cleaned_issues.append(issue)
-
-                        if issue.get("location") and issue["location"].get("lat") and issue["location"].get("lng"):
-                            try:
-                                lat = float(issue["location"]["lat"])
-                                lng = float(issue["location"]["lng"])
-                                issue_markers.append({
-                                    "lat": lat,
-                                    "lng": lng,
-                                    "title": issue.get("title", "N/A"),
-                                    "description": issue.get("description", "N/A"),
-                                    "upvotes": issue.get("upvotes", 0),
-                                    "photo": issue.get("photo"),
-                                    "category": issue.get("category", "N/A"),
-                                    "priority": issue.get("priority", "N/A"),
-                                    "status": issue.get("status", "Pending"),
-                                    "username": issue.get("username", "Anonymous"),
-                                    "pincode": issue.get("pincode", "N/A"),
-                                    "date": issue.get("date", "N/A"),
-                                    "time": issue.get("time", "N/A")
-                                })
-                            except (ValueError, TypeError):
-                                continue
-
-    # Filter issues by category if selected
-    if selected_category:
-        cleaned_issues = [issue for issue in cleaned_issues if issue.get('category') == selected_category]
-
-    # Calculate total and high-priority issues for the dashboard cards (based on filtered issues)
-    total_issues = len(cleaned_issues)
-    high_priority_issues = sum(1 for i in cleaned_issues if i.get('priority', '').lower() == 'high')
+    ai_predictions = storage.list_predictions()
+
+    # The issues table and the map markers are fetched separately through
+    # /api/issues and /api/markers
+
+    # Dashboard cards come straight from the rollup counters
+    total_issues = storage.rollups(category=selected_category or None)[0]["issues"]
+    high_priority_issues = storage.rollups(category=selected_category or None, priority="High")[0]["issues"]
     high_risk_areas = [p for p in ai_predictions if p.get('priority', '').lower() == 'high']
 
     return render_template(
         "official_home.html",
         user=user,
         ai_predictions=ai_predictions, # This will now be a proper list
-        all_issues=cleaned_issues,
         total_issues=total_issues,
         high_priority_issues=high_priority_issues,
         high_risk_areas=high_risk_areas,
-        issue_markers=issue_markers,
         selected_category=selected_category
     )
 
+@app.route("/api/issues")
+def api_issues():
+    """Cursor-paginated issue list for the official dashboard table.
+
+    Query params: category, status, priority, pincode (exact match),
+    date_from/date_to (YYYY-MM-DD, inclusive), sort=date|upvotes,
+    order=desc|asc, limit (max 200) and the cursor from the previous page.
+    """
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+
+    sort = request.args.get("sort", "date")
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 200)
+        after = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "invalid limit or cursor"}), 400
+
+    def build():
+        issues, last_key = storage.query_issues(
+            sort=sort,
+            descending=request.args.get("order", "desc") != "asc",
+            after=after,
+            limit=limit,
+            date_from=request.args.get("date_from") or None,
+            date_to=request.args.get("date_to") or None,
+            **{field: request.args.get(field) or None for field in FILTER_FIELDS}
+        )
+        return {
+            "issues": [dict(i, thumbnail=thumbnail_for(i.get("photo"))) for i in issues],
+            "next_cursor": encode_cursor(last_key) if last_key else None
+        }
+
+    key = ("api_issues", tuple(sorted(request.args.items())))
+    return cached_json(response_cache, key, storage.version(), build)
+
+@app.route("/api/rollups")
+def api_rollups():
+    """Issue and upvote counts from the rollup counters.
+
+    Query params: group_by (comma-separated subset of category, pincode,
+    status, priority, month) and any of those fields as exact-match filters,
+    with month written as YYYY-MM.
+    """
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+
+    group_by = tuple(f for f in request.args.get("group_by", "").split(",") if f)
+    unknown = [f for f in group_by if f not in ROLLUP_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown rollup field(s): {', '.join(unknown)}"}), 400
+    filters = {f: request.args[f] for f in ROLLUP_FIELDS if f in request.args}
+
+    key = ("api_rollups", group_by, tuple(sorted(filters.items())))
+    return cached_json(response_cache, key, storage.version(), lambda: {
+        "group_by": list(group_by),
+        "rollups": storage.rollups(group_by, **filters)
+    })
+
+def _marker(issue, lat, lng):
+    return {
+        "id": issue["id"],
+        "lat": lat,
+        "lng": lng,
+        "title": issue.get("title", "N/A"),
+        "description": issue.get("description", "N/A"),
+        "upvotes": issue.get("upvotes", 0),
+        "photo": issue.get("photo"),
+        "thumbnail": thumbnail_for(issue.get("photo")),
+        "category": issue.get("category", "N/A"),
+        "priority": issue.get("priority", "N/A"),
+        "status": issue.get("status", "Pending"),
+        "username": issue.get("username", "Anonymous"),
+        "pincode": issue.get("pincode", "N/A"),
+        "date": issue.get("date", "N/A"),
+        "time": issue.get("time", "N/A")
+    }
+
+@app.route("/api/markers")
+def api_markers():
+    """Map markers inside the visible viewport, clustered server-side.
+
+    Query params: bbox=west,south,east,north (Leaflet's toBBoxString) and
+    zoom. Returns {"clusters": [{lat, lng, count}], "markers": [issue...]}.
+    """
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+
+    try:
+        west, south, east, north = (float(v) for v in request.args["bbox"].split(","))
+        zoom = min(max(int(request.args.get("zoom", 12)), 0), 22)
+    except (KeyError, ValueError):
+        return jsonify({"error": "bbox=west,south,east,north and an integer zoom are required"}), 400
+
+    def build():
+        clusters, singles = storage.markers_in_bbox(west, south, east, north, zoom)
+        return {
+            "clusters": clusters,
+            "markers": [_marker(issue, lat, lng) for issue, lat, lng in singles]
+        }
+
+    key = ("api_markers", west, south, east, north, zoom)
+    return cached_json(response_cache, key, storage.version(), build)
+
 @app.route("/update_issue_status", methods=["POST"])
 def update_issue_status():
     if 'official_email' not in session:
         
-        return redirect(url_for('govt_login'))
+        return _action_reply('govt_login', 401)
     
-    issue_title = request.form.get('issue_title')
-    issue_pincode = request.form.get('issue_pincode')
-    issue_username = request.form.get('issue_username')
+    issue_id = request.form.get('issue_id')
     new_status = request.form.get('status')
     
-    all_raw = load_data(ISSUES_FILE)
-    updated = False
-    
-    if isinstance(all_raw, dict) and issue_username:
-        username_key = f"{issue_username}_issues"
-        if username_key in all_raw and isinstance(all_raw[username_key], list):
-            for issue in all_raw[username_key]:
-                if issue.get('title') == issue_title and issue.get('pincode') == issue_pincode:
-                    issue['status'] = new_status
-                    updated = True
-                    break
-    
-    if updated:
-        save_data(ISSUES_FILE, all_raw)
-        flash("Issue status updated successfully!", "success")
+    if not storage.set_issue_status(issue_id, new_status, actor=session['official_email']):
+        return _action_reply('official_home', 404, id=issue_id)
 
-    return redirect(url_for('official_home'))
+    change = {"id": issue_id, "status": new_status}
+    events.publish("issue_status", change)
+    return _action_reply('official_home', 200, "Issue status updated successfully!", **change)
 
 @app.route('/train_ai', methods=['POST'])
 def train_ai_route():
@@ -463,108 +490,223 @@ def train_ai_route():
         
         return redirect(url_for('govt_login'))
     
-    from train_ai import train_and_predict
-    
-    preds = train_and_predict()
-    flash("AI training completed successfully!", "success")
+    # Training runs in a background worker; a trigger while a job is queued
+    # or running just reports on that job
+    status, started = start_training()
+    if _wants_json():
+        return jsonify(dict(status, started=started)), 202
+    if started:
+        flash("AI training started; predictions will update when it finishes.", "success")
+    else:
+        flash("AI training is already in progress.", "success")
     return redirect(url_for('official_home'))
 
+@app.route('/train_ai/status')
+def train_ai_status():
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+    return jsonify(training_status())
+
+@app.route('/api/cache_stats')
+def api_cache_stats():
+    """Hit/miss counters of this worker's caches (each worker keeps its own)."""
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+    return jsonify({"read_cache": read_cache.stats(), "responses": response_cache.stats()})
+
+# Partner feeds can be far larger than a photo upload
+IMPORT_MAX_BYTES = int(os.environ.get("FIXORA_IMPORT_MAX_MB", 512)) * 2 ** 20
+
+@app.route('/api/issues/export')
+def api_export_issues():
+    """Streams issues as NDJSON or CSV (?format=), oldest first.
+
+    Optional filters: pincode, date_from and date_to (YYYY-MM-DD, inclusive).
+    """
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    issues = iter_issues(storage, request.args.get("pincode") or None,
+                         request.args.get("date_from") or None, request.args.get("date_to") or None)
+    return Response(stream_with_context(export_chunks(issues, fmt)), mimetype=MIMETYPES[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="fixora-issues.{fmt}"'})
+
+@app.route('/api/issues/import', methods=['POST'])
+def api_import_issues():
+    """Adds issues from an NDJSON or CSV feed, read as a stream and written in batches.
+
+    The feed is the request body (?format= names it) or an uploaded `file`
+    (format from its name). ?source= is the username for records without one.
+    Replies with the counts of added, already stored and invalid records.
+    """
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+    request.max_content_length = IMPORT_MAX_BYTES
+    upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+    fmt = request.args.get("format") or guess_format(upload.filename if upload else None,
+                                                     "csv" if request.mimetype == "text/csv" else "ndjson")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    body = upload.stream if upload else request.stream
+    text = io.TextIOWrapper(body, encoding="utf-8-sig", errors="replace", newline="")
+    summary = import_issues(storage, read_records(text, fmt), request.args.get("source") or "import")
+    if summary["added"]:
+        events.publish("resync", {})  # dashboards refetch rather than receive thousands of events
+    return jsonify(summary)
+
+@app.route('/api/issues/<issue_id>/history')
+def api_issue_history(issue_id):
+    """Who reported, upvoted and changed the status of an issue, and when."""
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+    if not hasattr(storage, "issue_history"):
+        return jsonify({"error": "this storage backend keeps no history (set FIXORA_STORAGE=eventlog)"}), 404
+    history = storage.issue_history(issue_id)
+    if not history:
+        return jsonify({"error": "issue not found"}), 404
+    return jsonify({"id": issue_id, "events": history})
+
 @app.route("/upvote_ai_prediction", methods=["POST"])
 def upvote_ai_prediction():
     if 'user_email' not in session:
         
-        return redirect(url_for("user_login"))
+        return _action_reply("user_login", 401)
 
     # Extract data from the form
     predicted_issue = request.form.get("predicted_issue")
     pincode = request.form.get("pincode")
     expected_date = request.form.get("expected_date")
 
-    # Load the full list of all AI predictions
-    full_preds = load_data("ai_predictions.json")
-
     user_email = session.get("user_email")
-    users = load_data(USERS_FILE)
-    user = next((u for u in users if u["email"] == user_email), None)
+    user = storage.get_user(user_email)
     if not user:
-        flash("User not found.", "error")
-        return redirect(url_for("citizen_home"))
+        return _action_reply("citizen_home", 401, "User not found.", "error")
 
-    # Compose a unique identifier for the AI prediction to track upvotes
-    prediction_id = f"{predicted_issue}__{pincode}__{expected_date}"
+    # Records the vote and increments the counter in one step; False if already upvoted
+    change = {"predicted_issue": predicted_issue, "pincode": pincode, "expected_date": expected_date}
+    if not storage.upvote_prediction(user_email, predicted_issue, pincode, expected_date):
+        return _action_reply("citizen_home", 409, **change)
 
-    # Check if user has already upvoted this AI prediction
-    if "upvoted_ai_predictions" not in user:
-        user["upvoted_ai_predictions"] = []
+    change["upvotes"] = next((p.get("upvotes", 0) for p in storage.predictions_for_pincode(pincode)
+                              if p.get("predicted_issue") == predicted_issue
+                              and p.get("expected_date") == expected_date), None)
+    events.publish("prediction_upvoted", change)
+    return _action_reply("citizen_home", 200, "AI prediction upvoted successfully!", **change)
 
-    if prediction_id in user["upvoted_ai_predictions"]:
-        return redirect(url_for("citizen_home"))
+@app.route("/update_status/<issue_id>", methods=["POST"])
+def update_issue_status_route(issue_id):
+    if 'official_email' not in session:
+        return _action_reply('govt_login', 401)
+    if not storage.get_official(session['official_email']):
+        return _action_reply('govt_login', 403, "Official account not found.", "error")
 
-    updated = False
-    
-    # Iterate through the full list to find and update the correct prediction
-    if isinstance(full_preds, list):
-        for fp in full_preds:
-            if (fp.get("predicted_issue") == predicted_issue and
-                fp.get("pincode") == pincode and
-                fp.get("expected_date") == expected_date):
-
-                # Ensure 'upvotes' key exists and is an integer
-                fp['upvotes'] = int(fp.get('upvotes', 0)) + 1
-                updated = True
-                break
-
-    if updated:
-        save_data("ai_predictions.json", full_preds)
-        # Add prediction_id to user's upvoted_ai_predictions and save users.json
-        user["upvoted_ai_predictions"].append(prediction_id)
-        save_data(USERS_FILE, users)
-        flash("AI prediction upvoted successfully!", "success")
-
-    return redirect(url_for("citizen_home"))
-
-@app.route("/update_status/<issue_title>", methods=["POST"])
-def update_issue_status_route(issue_title):
-    all_issues = load_data(ISSUES_FILE)
-    updated = False
-    
-    if isinstance(all_issues, dict):
-        for username_key, issues_list in all_issues.items():
-            if isinstance(issues_list, list):
-                for issue in issues_list:
-                    if issue["title"] == issue_title:
-                        issue["status"] = "Resolved" if issue.get("status") == "Pending" else "Pending"
-                        updated = True
-                        break
-            if updated:
-                break
-    else:
-        if isinstance(all_issues, list):
-            for issue in all_issues:
-                if issue["title"] == issue_title:
-                    issue["status"] = "Resolved" if issue.get("status") == "Pending" else "Pending"
-                    updated = True
-                    break
-    
-    if updated:
-        save_data(ISSUES_FILE, all_issues)
-    return redirect(url_for("official_home"))
+    if storage.toggle_issue_status(issue_id, actor=session['official_email']):
+        change = {"id": issue_id, "status": storage.get_issue(issue_id).get("status")}
+        events.publish("issue_status", change)
+        return _action_reply("official_home", 200, **change)
+    return _action_reply("official_home", 404, id=issue_id)
 
-@app.route("/search_issues", methods=["POST"])
+@app.route("/search_issues", methods=["GET", "POST"])
 def search_issues():
-    pincode = request.form.get("pincode")
-    all_issues_data = load_data(ISSUES_FILE)
-    flattened_issues = []
-    
-    if isinstance(all_issues_data, dict):
-        for user_issues_list in all_issues_data.values():
-            if isinstance(user_issues_list, list):
-                flattened_issues.extend(user_issues_list)
-    elif isinstance(all_issues_data, list):
-        flattened_issues = all_issues_data
+    """Issues for ?pincode=, with the caller's upvote flags.
 
-    issues_to_display = [i for i in flattened_issues if i.get('pincode') == pincode]
-    return jsonify({"issues": issues_to_display})
+    GET is the cacheable form (ETag / 304); POST with a form field is kept
+    for older clients.
+    """
+    pincode = request.values.get("pincode")
+    user_email = session.get("user_email")
+
+    def build():
+        user = storage.get_user(user_email)
+        upvoted = user.get("upvoted_issues", set()) if user else set()
+        return {"issues": [dict(i, upvoted=i["id"] in upvoted, thumbnail=thumbnail_for(i.get("photo")))
+                           for i in storage.issues_for_pincode(pincode)]}
+
+    key = ("search_issues", pincode, user_email)
+    return cached_json(response_cache, key, storage.version(), build)
+
+# ------------------- Metrics ------------------- #
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition; set FIXORA_METRICS=1 to enable. Each worker reports its own numbers."""
+    if not metrics.ENABLED:
+        return "Metrics are disabled; set FIXORA_METRICS=1\n", 404
+    # Training runs in the job worker, so its phases come from the job status
+    phases = metrics.gauge_lines("fixora_training_last_phase_seconds", "Phase durations of the latest training job.",
+                                 "phase", training_status().get("phase_seconds", {}))
+    return Response(metrics.render(phases), mimetype="text/plain; version=0.0.4")
+
+@app.route("/profiler", methods=["GET", "POST"])
+def profiler_route():
+    """GET: folded stacks of the slow requests sampled so far (for flamegraph.pl or speedscope).
+
+    POST slow_ms=N samples this worker's requests and keeps those slower than
+    N ms; slow_ms=0 turns the profiler off.
+    """
+    if 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+    if request.method == "POST":
+        try:
+            metrics.profiler.slow_ms = max(float(request.form.get("slow_ms", 0)), 0)
+        except ValueError:
+            return jsonify({"error": "slow_ms must be a number"}), 400
+        return jsonify({"slow_ms": metrics.profiler.slow_ms})
+    stacks = ""
+    if os.path.exists(metrics.profiler.path):
+        with open(metrics.profiler.path) as f:
+            stacks = f.read()
+    return Response(stacks, mimetype="text/plain")
+
+# ------------------- Live Updates ------------------- #
+def _issue_event(issue):
+    coords = parse_coords(issue.get("location"))
+    payload = _marker(issue, *(coords or (None, None)))
+    if issue.get("anonymous"):
+        payload["username"] = "Anonymous"
+    return payload
+
+@app.route("/events")
+def event_stream():
+    """Server-Sent Events for the dashboards.
+
+    Event types: issue_created (the issue as a map marker), issue_upvoted
+    {id, upvotes}, issue_status {id, status}, prediction_upvoted and resync
+    (refetch everything). Each open stream holds a server thread, so past
+    FIXORA_MAX_STREAMS per process, or on a server that handles one request
+    at a time, the reply is 503 and the page polls /events/poll instead.
+    """
+    if 'user_email' not in session and 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    try:
+        if not can_stream(request.environ):
+            raise StreamLimitReached("this server handles one request at a time")
+        subscriber, chunks = stream(events, last_event_id, storage.version)
+    except StreamLimitReached as e:
+        return jsonify({"error": str(e), "poll": url_for("poll_events")}), 503, {"Retry-After": str(POLL_SECONDS)}
+    response = Response(chunks, mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(lambda: events.unsubscribe(subscriber))  # also when the stream never started
+    return response
+
+@app.route("/events/poll")
+def poll_events():
+    """The /events stream as a short poll: events after ?after=<id>, in order.
+
+    Pass back the reply's last_id and version on the next poll; resync is
+    true when the client must refetch everything (missed events, or data
+    changed by another process).
+    """
+    if 'user_email' not in session and 'official_email' not in session:
+        return jsonify({"error": "login required"}), 401
+    after = request.args.get("after", type=int)
+    version = str(storage.version())
+    backlog, last_id = events.since(after)
+    resync = after is not None and (backlog is None or (not backlog and request.args.get("version") != version))
+    return jsonify({"events": [{"id": i, "type": t, "data": d} for i, t, d in backlog or ()],
+                    "last_id": last_id, "version": version, "resync": resync, "retry_ms": POLL_SECONDS * 1000})
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True, threaded=True)
\ No newline at end of file
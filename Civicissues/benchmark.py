@@ -0,0 +1,557 @@
+import argparse
+import atexit
+import http.cookiejar
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import train_ai
+from records import IssueRecord
+from storage import load_data, save_data
+
+CATEGORIES = list(train_ai.CATEGORY_MESSAGES)
+PRIORITIES = ["Low", "Medium", "High"]
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# ------------------- Forecast ------------------- #
+def synthetic_training_frame(pincodes, issues_per_pincode=train_ai.MIN_ISSUES_FOR_PREDICTION, seed=42):
+    """A preprocessed training frame shaped like train_ai.preprocess_data's output."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for p in range(pincodes):
+        for _ in range(issues_per_pincode):
+            day = start + timedelta(days=rng.randrange(365))
+            rows.append({
+                "pincode": str(500000 + p),
+                "day_of_week": day.weekday(),
+                "month": day.month,
+                "category": rng.choice(CATEGORIES),
+                "priority": rng.choice(PRIORITIES),
+            })
+    return pd.DataFrame(rows)
+
+
+def fit(df):
+    model, pincodes = train_ai.fit_model(df)
+    return model, dict(enumerate(pincodes))
+
+
+def predict_upcoming_per_row(model, df, pincode_mapping, horizon_days, today):
+    """The original forecast: one predict call and one mask scan per pincode x day."""
+    predictions = []
+    for pincode_code, pincode_str in pincode_mapping.items():
+        pincode_issues = df[df["pincode"] == pincode_str]
+        for i in range(1, horizon_days + 1):
+            future_date = today + timedelta(days=i)
+            future_data = pd.DataFrame([{
+                "pincode_code": pincode_code,
+                "day_of_week": future_date.weekday(),
+                "month": future_date.month
+            }])
+            predicted_category = model.predict(future_data)[0]
+            priority_counts = pincode_issues[pincode_issues["category"] == predicted_category]["priority"].value_counts()
+            predictions.append({
+                "pincode": pincode_str,
+                "predicted_issue": predicted_category,
+                "expected_date": future_date.strftime("%Y-%m-%d"),
+                "description": train_ai.CATEGORY_MESSAGES.get(
+                    predicted_category, f"{predicted_category} may occur due to past trends."),
+                "priority": priority_counts.idxmax() if not priority_counts.empty else "Low",
+                "upvotes": 0
+            })
+    return predictions
+
+
+def bench_forecast(pincode_counts, horizon_days, per_row_limit):
+    today = datetime(2025, 9, 20)
+    print(f"{'pincodes':>9} {'rows':>7} {'per-row s':>10} {'batched s':>10} {'speedup':>8}")
+    for pincodes in pincode_counts:
+        df = synthetic_training_frame(pincodes)
+        model, mapping = fit(df)
+        batched, batched_s = _timed(train_ai.predict_upcoming, model, df, mapping, horizon_days, today)
+        if pincodes <= per_row_limit:
+            per_row, per_row_s = _timed(predict_upcoming_per_row, model, df, mapping, horizon_days, today)
+            if per_row != batched:
+                raise SystemExit(f"❌ Batched forecast differs from the per-row one at {pincodes} pincodes")
+            print(f"{pincodes:>9} {len(batched):>7} {per_row_s:>10.3f} {batched_s:>10.3f} {per_row_s / batched_s:>7.1f}x")
+        else:
+            print(f"{pincodes:>9} {len(batched):>7} {'skipped':>10} {batched_s:>10.3f} {'':>8}")
+
+
+# ------------------- Preprocess ------------------- #
+def synthetic_issues(count, pincodes=500, seed=42):
+    """Raw issue dicts as the app stores them, ~1% of them unusable for training."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    issues = []
+    for i in range(count):
+        issues.append({
+            "id": f"{i:032x}",
+            "title": "Synthetic issue",
+            "description": "Generated for benchmarking",
+            "pincode": str(500000 + rng.randrange(pincodes)),
+            "location": {"lat": f"{17.3 + rng.random() / 5:.6f}", "lng": f"{78.4 + rng.random() / 5:.6f}"},
+            "category": rng.choice(CATEGORIES),
+            "priority": rng.choice(PRIORITIES),
+            "photo": None,
+            "anonymous": False,
+            "upvotes": rng.randrange(20),
+            "date": (start + timedelta(days=rng.randrange(600))).strftime("%Y-%m-%d") if rng.random() > 0.01 else "n/a",
+            "time": "12:00:00",
+            "status": "Pending",
+        })
+    return issues
+
+
+def preprocess_data_per_row(issues):
+    """The original preprocessing: a dict and a strptime call per issue."""
+    data = []
+    for issue in issues:
+        if issue.get("pincode") and issue.get("category") and issue.get("date") and issue.get("priority"):
+            try:
+                date_obj = datetime.strptime(issue["date"], "%Y-%m-%d")
+                data.append({
+                    "pincode": issue["pincode"],
+                    "day_of_week": date_obj.weekday(),
+                    "month": date_obj.month,
+                    "category": issue["category"],
+                    "priority": issue["priority"]
+                })
+            except ValueError:
+                continue
+    return pd.DataFrame(data)
+
+
+def _peak_mb(fn, *args):
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_preprocess(row_counts):
+    # Each pair of memory columns is per-row, then columnar
+    print(f"{'issues':>9} {'per-row s':>10} {'columnar s':>11} {'speedup':>8} "
+          f"{'peak MB':>8} {'peak MB':>8} {'frame MB':>9} {'frame MB':>9}")
+    for rows in row_counts:
+        issues = synthetic_issues(rows)
+        old, old_s = _timed(preprocess_data_per_row, issues)
+        new, new_s = _timed(train_ai.preprocess_data, issues)
+        if old.to_dict("records") != new.astype(object).to_dict("records"):
+            raise SystemExit(f"❌ Columnar preprocessing differs from the per-row one at {rows} issues")
+        old_peak, new_peak = _peak_mb(preprocess_data_per_row, issues), _peak_mb(train_ai.preprocess_data, issues)
+        old_mb, new_mb = (f.memory_usage(deep=True).sum() / 2 ** 20 for f in (old, new))
+        print(f"{rows:>9} {old_s:>10.3f} {new_s:>11.3f} {old_s / new_s:>7.1f}x "
+              f"{old_peak:>8.1f} {new_peak:>8.1f} {old_mb:>9.1f} {new_mb:>9.1f}")
+
+
+# ------------------- Synthetic City ------------------- #
+# The citizen form's categories and risk levels, weighted by how often they are reported
+REPORT_CATEGORIES = {"Garbage / Waste": 22, "Potholes": 18, "Drainage": 14, "Street Lights": 12,
+                     "Water Supply": 10, "Traffic Signals": 7, "Public Safety": 6,
+                     "Parks / Public Spaces": 5, "Other": 6}
+REPORT_PRIORITIES = {"Low": 45, "Medium": 38, "High": 17}
+CITY_CENTRE = (17.385, 78.4867)  # Hyderabad, like the sample data
+BENCH_PASSWORD = "bench"
+BENCH_OFFICIAL = {"dept": "Benchmark", "name": "Bench Official", "email": "official@bench.test",
+                  "password": BENCH_PASSWORD}
+
+
+def synthetic_city(users=1000, issues=10000, pincodes=100, days=365, seed=42, today=datetime(2025, 9, 20)):
+    """Seeded users and issues (grouped by reporter as in all_issues.json) with a real city's skew.
+
+    Pincode populations follow a Zipf law and reports scatter around each
+    pincode's centre. Older issues are more likely to be resolved. Upvotes
+    are heavy-tailed: most issues get none, a few get hundreds. They are
+    cast by residents of the issue's pincode and recorded on both the issue
+    and the voter.
+    """
+    rng = random.Random(seed)
+    codes = [str(500001 + p) for p in range(pincodes)]
+    populations = [1 / (rank + 1) for rank in range(pincodes)]
+    centres = {code: (rng.gauss(CITY_CENTRE[0], 0.08), rng.gauss(CITY_CENTRE[1], 0.08)) for code in codes}
+
+    people = []
+    residents = {code: [] for code in codes}
+    for i, code in enumerate(rng.choices(codes, populations, k=users)):
+        user = {"email": f"user{i}@bench.test", "username": f"user{i}", "password": BENCH_PASSWORD,
+                "pincode": code, "upvoted_issues": [], "upvoted_ai_predictions": []}
+        people.append(user)
+        residents[code].append(user)
+
+    categories, category_weights = list(REPORT_CATEGORIES), list(REPORT_CATEGORIES.values())
+    priorities, priority_weights = list(REPORT_PRIORITIES), list(REPORT_PRIORITIES.values())
+    all_issues = {}
+    for _ in range(issues):
+        reporter = rng.choice(people)
+        code = reporter["pincode"] if rng.random() < 0.9 else rng.choices(codes, populations)[0]
+        category = rng.choices(categories, category_weights)[0]
+        age = rng.randrange(days * 86400)
+        reported = today - timedelta(seconds=age)
+        resolved_odds = rng.random() * days * 86400
+        issue_id = f"{rng.getrandbits(128):032x}"
+        voters = rng.sample(residents[code], min(int(rng.paretovariate(1.2)) - 1, len(residents[code])))
+        for voter in voters:
+            voter["upvoted_issues"].append(issue_id)
+        all_issues.setdefault(f"{reporter['username']}_issues", []).append({
+            "id": issue_id,
+            "title": f"{category} near {code}",
+            "description": "Generated for benchmarking",
+            "pincode": code,
+            "location": {"lat": f"{rng.gauss(centres[code][0], 0.005):.6f}",
+                         "lng": f"{rng.gauss(centres[code][1], 0.005):.6f}"},
+            "category": category,
+            "priority": rng.choices(priorities, priority_weights)[0],
+            "photo": None,
+            "anonymous": rng.random() < 0.1,
+            "upvotes": len(voters),
+            "date": reported.strftime("%Y-%m-%d"),
+            "time": reported.strftime("%H:%M:%S"),
+            "month": reported.strftime("%B"),
+            "username": reporter["username"],
+            "status": "Resolved" if resolved_odds < age * 0.8 else rng.choice(["Pending", "Pending", "In Progress"]),
+        })
+    return people, all_issues
+
+
+def write_city(out, people, all_issues):
+    """Writes a data directory the app (and train_ai) can run from."""
+    os.makedirs(out, exist_ok=True)
+    save_data(os.path.join(out, "users.json"), people)
+    save_data(os.path.join(out, "officials.json"), [BENCH_OFFICIAL])
+    save_data(os.path.join(out, "all_issues.json"), all_issues)
+    save_data(os.path.join(out, "ai_predictions.json"), [])
+
+
+# ------------------- Memory ------------------- #
+def _retained_mb(build):
+    """Returns build() and the MB it still holds once built (peak aside)."""
+    tracemalloc.start()
+    try:
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(issue_counts):
+    """Memory held by a city's issues as the backend's dicts vs the repository's IssueRecords."""
+    print(f"{'issues':>9} {'dicts MB':>9} {'records MB':>11} {'saving':>7} {'B/issue':>8} {'B/issue':>8} {'convert s':>10}")
+    for count in issue_counts:
+        _, all_issues = synthetic_city(users=max(count // 10, 1), issues=count)
+        # Serialized first so both sides start from freshly parsed strings, as after a load
+        payload = json.dumps([issue for issues in all_issues.values() for issue in issues])
+        del all_issues
+        dicts, dict_mb = _retained_mb(lambda: json.loads(payload))
+        del dicts
+        (records, record_mb), seconds = _timed(_retained_mb, lambda: [IssueRecord(i) for i in json.loads(payload)])
+        del records
+        print(f"{count:>9} {dict_mb:>9.1f} {record_mb:>11.1f} {dict_mb / record_mb:>6.1f}x "
+              f"{dict_mb * 2 ** 20 / count:>8.0f} {record_mb * 2 ** 20 / count:>8.0f} {seconds:>10.2f}")
+
+
+# ------------------- Load Test ------------------- #
+class _TestClientSession:
+    """One browser session driven through Flask's test client, in this process."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, headers=None):
+        response = self.client.open(path, method=method, data=data, headers=headers)
+        return response.status_code, response.get_data()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # time the action itself, not the page it redirects to
+
+
+class _HTTPSession:
+    """One browser session (with its cookies) against a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        cookies = urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        self.opener = urllib.request.build_opener(cookies, _NoRedirect)
+
+    def request(self, method, path, data=None, headers=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            with self.opener.open(req) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class _User:
+    """A logged-in session plus what the scenarios need to know about its user."""
+
+    def __init__(self, session, record, rng):
+        self.session, self.record, self.rng = session, record, rng
+        self.to_upvote = []
+
+    def refill_upvotes(self, pincodes):
+        # Untimed: issue ids come from the same search the dashboard uses
+        for pincode in [self.record["pincode"]] + self.rng.sample(pincodes, min(5, len(pincodes))):
+            _, body = self.session.request("GET", "/search_issues?" + urllib.parse.urlencode({"pincode": pincode}))
+            self.to_upvote += [i["id"] for i in json.loads(body)["issues"] if not i["upvoted"]]
+            if self.to_upvote:
+                return
+
+
+JSON_REPLY = {"Accept": "application/json"}
+
+
+def _citizen_home(user, pincodes):
+    return user.session.request("GET", "/citizen_home")[0]
+
+
+def _search_issues(user, pincodes):
+    query = urllib.parse.urlencode({"pincode": user.rng.choice(pincodes)})
+    return user.session.request("GET", f"/search_issues?{query}")[0]
+
+
+def _upvote(user, pincodes):
+    if not user.to_upvote:
+        return None  # nothing left to vote on; not counted
+    data = {"issue_id": user.to_upvote.pop()}
+    return user.session.request("POST", "/increment_upvote", data, JSON_REPLY)[0]
+
+
+def _report(user, pincodes):
+    category = user.rng.choices(list(REPORT_CATEGORIES), list(REPORT_CATEGORIES.values()))[0]
+    data = {"title": f"{category} (load test)", "description": "Reported by the load test",
+            "pincode": user.record["pincode"], "category": category,
+            "priority": user.rng.choice(list(REPORT_PRIORITIES)),
+            "latitude": f"{user.rng.gauss(CITY_CENTRE[0], 0.05):.6f}",
+            "longitude": f"{user.rng.gauss(CITY_CENTRE[1], 0.05):.6f}"}
+    # 409 is the suggestion to upvote a nearby duplicate instead; run_scenario counts it apart
+    return user.session.request("POST", "/report_issue", data, JSON_REPLY)[0]
+
+
+def _official_home(user, pincodes):
+    return user.session.request("GET", "/official_home")[0]
+
+
+def _train_ai(user, pincodes):
+    return user.session.request("POST", "/train_ai", headers=JSON_REPLY)[0]
+
+
+# name -> (request, runs as an official)
+SCENARIOS = {
+    "citizen_home": (_citizen_home, False),
+    "search_issues": (_search_issues, False),
+    "upvote": (_upvote, False),
+    "report": (_report, False),
+    "official_home": (_official_home, True),
+    "train_ai": (_train_ai, True),
+}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_scenario(name, users, requests, pincodes):
+    """Runs `requests` requests of one scenario spread over `users` (one thread each).
+
+    A 409 (a report turned back as a duplicate) is counted in `duplicates`,
+    neither as a success nor as an error.
+    """
+    fn = SCENARIOS[name][0]
+    latencies, errors, duplicates = [], 0, 0
+    lock = threading.Lock()
+    if name == "upvote":
+        for user in users:
+            user.refill_upvotes(pincodes)
+
+    def work(user, count):
+        nonlocal errors, duplicates
+        for _ in range(count):
+            start = time.perf_counter()
+            status = fn(user, pincodes)
+            elapsed = time.perf_counter() - start
+            if status is None:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                duplicates += status == 409
+                errors += status >= 400 and status != 409
+
+    share, extra = divmod(requests, len(users))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        for i, user in enumerate(users):
+            pool.submit(work, user, share + (i < extra))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {"requests": len(latencies), "errors": errors, "duplicates": duplicates,
+            "throughput": round(len(latencies) / wall, 2) if wall else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2)}
+
+
+def _wait_for_training(official, timeout=3600):
+    """Seconds until the queued training job settles, or None if it never started."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        _, body = official.session.request("GET", "/train_ai/status")
+        if json.loads(body).get("state") not in ("queued", "running"):
+            return time.perf_counter() - start
+        time.sleep(0.2)
+    return None
+
+
+def _connect(data, url):
+    """A session factory for the app serving `data` (in-process) or for `url`."""
+    if url:
+        return lambda: _HTTPSession(url)
+    # On a scratch copy, so every run starts from the same data. The app opens
+    # its files relative to the working directory
+    scratch = tempfile.mkdtemp(prefix="fixora-load-")
+    shutil.copytree(data, scratch, dirs_exist_ok=True)
+    atexit.register(shutil.rmtree, scratch, ignore_errors=True)
+    os.chdir(scratch)
+    import app
+    return lambda: _TestClientSession(app.app)
+
+
+def load_test(data, scenarios, requests, concurrency, url=None, seed=42):
+    rng = random.Random(seed)
+    people = load_data(os.path.join(data, "users.json"))
+    pincodes = sorted({p["pincode"] for p in people if p.get("pincode")})
+    started = time.perf_counter()
+    new_session = _connect(data, url)
+
+    def login(official):
+        session = new_session()
+        if official:
+            record = BENCH_OFFICIAL
+            session.request("POST", "/govt_login", {"email": record["email"], "password": record["password"]})
+        else:
+            record = rng.choice(people)
+            session.request("POST", "/user_login", {"email": record["email"], "password": record["password"]})
+        return _User(session, record, random.Random(rng.random()))
+
+    citizens = [login(False) for _ in range(concurrency)]
+    officials = [login(True) for _ in range(concurrency)]
+    # Warm up: the first request of a worker builds its in-memory indexes
+    citizens[0].session.request("GET", "/citizen_home")
+    print(f"App ready in {time.perf_counter() - started:.1f}s "
+          f"({len(people)} users, {len(pincodes)} pincodes, {'server' if url else 'test client'})")
+
+    results = {}
+    for name in scenarios:
+        users = officials if SCENARIOS[name][1] else citizens
+        results[name] = run_scenario(name, users, requests, pincodes)
+        if name == "train_ai":
+            # The trigger only queues the job; time the job too
+            seconds = _wait_for_training(officials[0])
+            results["train_ai_job"] = {"requests": 1, "errors": int(seconds is None), "duplicates": 0,
+                                       "throughput": 0.0,
+                                       "p50_ms": round((seconds or 0) * 1000, 2),
+                                       "p99_ms": round((seconds or 0) * 1000, 2)}
+    return results
+
+
+def report_results(results, baseline=None, tolerance=0.2):
+    """Prints the results table; returns the scenarios whose latency regressed past `baseline`."""
+    print(f"{'scenario':<15} {'requests':>9} {'errors':>7} {'409':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    regressions = []
+    for name, r in results.items():
+        flag = ""
+        before = (baseline or {}).get(name)
+        if before and any(r[k] > before[k] * (1 + tolerance) for k in ("p50_ms", "p99_ms")):
+            regressions.append(name)
+            flag = f"  REGRESSION (was p50 {before['p50_ms']} / p99 {before['p99_ms']})"
+        print(f"{name:<15} {r['requests']:>9} {r['errors']:>7} {r.get('duplicates', 0):>7} {r['throughput']:>9.1f} "
+              f"{r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixora micro-benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    forecast = sub.add_parser("forecast", help="per-row vs batched train_ai forecasting")
+    forecast.add_argument("--pincodes", default="10,100,1000,3000",
+                          help="comma-separated pincode counts to try")
+    forecast.add_argument("--days", type=int, default=train_ai.PREDICTION_HORIZON_DAYS)
+    forecast.add_argument("--per-row-limit", type=int, default=1000,
+                          help="skip the slow per-row baseline above this many pincodes")
+    preprocess = sub.add_parser("preprocess", help="per-row vs columnar train_ai preprocessing")
+    preprocess.add_argument("--issues", default="10000,100000,1000000",
+                            help="comma-separated issue counts to try")
+    memory = sub.add_parser("memory", help="memory held by issues as dicts vs compact records")
+    memory.add_argument("--issues", default="10000,100000,1000000",
+                        help="comma-separated issue counts to try")
+    city = sub.add_parser("city", help="write a seeded synthetic city to a data directory")
+    city.add_argument("--out", required=True, help="directory to write users/officials/issues JSON into")
+    city.add_argument("--users", type=int, default=100_000)
+    city.add_argument("--issues", type=int, default=1_000_000)
+    city.add_argument("--pincodes", type=int, default=200)
+    city.add_argument("--days", type=int, default=365, help="spread issue dates over this many days")
+    city.add_argument("--seed", type=int, default=42)
+    load = sub.add_parser("load", help="p50/p99 latency and throughput of the main app routes")
+    load.add_argument("--data", required=True, help="a directory written by `city` (left unchanged)")
+    load.add_argument("--url", help="benchmark a running server (started in --data) instead of the test client")
+    load.add_argument("--scenarios", default=",".join(SCENARIOS),
+                      help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    load.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    load.add_argument("--concurrency", type=int, default=4, help="concurrent sessions")
+    load.add_argument("--seed", type=int, default=42)
+    load.add_argument("--json", help="also write the results to this file")
+    load.add_argument("--baseline", help="results file of an earlier run; exit 1 if latency regressed")
+    load.add_argument("--tolerance", type=float, default=0.2, help="allowed latency growth over the baseline")
+    args = parser.parse_args()
+
+    if args.command == "forecast":
+        bench_forecast([int(n) for n in args.pincodes.split(",")], args.days, args.per_row_limit)
+    elif args.command == "preprocess":
+        bench_preprocess([int(n) for n in args.issues.split(",")])
+    elif args.command == "memory":
+        bench_memory([int(n) for n in args.issues.split(",")])
+    elif args.command == "city":
+        (people, all_issues), seconds = _timed(synthetic_city, args.users, args.issues, args.pincodes,
+                                               args.days, args.seed)
+        write_city(args.out, people, all_issues)
+        print(f"✅ {len(people)} users and {args.issues} issues written to {args.out} "
+              f"(generated in {seconds:.1f}s)")
+    elif args.command == "load":
+        unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+        if unknown:
+            raise SystemExit(f"❌ Unknown scenario(s): {', '.join(sorted(unknown))}")
+        baseline = load_data(os.path.abspath(args.baseline)) if args.baseline else None
+        output = os.path.abspath(args.json) if args.json else None
+        results = load_test(os.path.abspath(args.data), args.scenarios.split(","), args.requests,
+                            args.concurrency, args.url, args.seed)
+        regressions = report_results(results, baseline, args.tolerance)
+        if output:
+            save_data(output, results)
+        if regressions:
+            raise SystemExit(f"❌ Latency regressed: {', '.join(regressions)}")
@@ -0,0 +1,242 @@
+import argparse
+import csv
+import io
+import json
+import re
+import sys
+from datetime import datetime
+
+from geo import parse_coords
+from storage import get_storage, new_issue_id
+
+FORMATS = ("ndjson", "csv")
+MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+IMPORT_BATCH = 1000  # validated issues written to storage at a time
+EXPORT_PAGE = 1000  # issues fetched from the repository at a time
+CHUNK_BYTES = 64 * 1024  # exports are written/streamed in chunks of about this size
+MAX_ERRORS = 100  # invalid records listed in an import summary; the rest are only counted
+CSV_FIELDS = ("id", "title", "description", "pincode", "lat", "lng", "category", "priority", "status",
+              "upvotes", "date", "time", "username", "anonymous")
+PRIORITIES = ("Low", "Medium", "High")
+STATUSES = ("Pending", "In Progress", "Resolved")
+
+
+def guess_format(filename, default="ndjson"):
+    """`csv` for *.csv files, `ndjson` for *.ndjson/*.jsonl, else `default`."""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return default
+
+
+# ------------------- Export ------------------- #
+def iter_issues(source, pincode=None, date_from=None, date_to=None):
+    """Issues matching the filters, oldest first, without materializing them all.
+
+    The app's Repository is paged through its date index; SQLite streams a
+    cursor; other backends already hold their issues and are filtered in place.
+    """
+    if hasattr(source, "query_issues"):
+        after = None
+        while True:
+            page, after = source.query_issues(sort="date", descending=False, after=after, limit=EXPORT_PAGE,
+                                              date_from=date_from, date_to=date_to, pincode=pincode)
+            yield from page
+            if after is None:
+                return
+    if hasattr(source, "iter_issues"):
+        yield from source.iter_issues(pincode, date_from, date_to)
+        return
+    issues = source.issues_for_pincode(pincode) if pincode else source.list_issues()
+    matching = [i for i in issues if (not date_from or (i.get("date") or "") >= date_from)
+                and (not date_to or (i.get("date") or "") <= date_to)]
+    yield from sorted(matching, key=lambda i: (i.get("date") or "", i.get("time") or "", i.get("id") or ""))
+
+
+def _csv_row(issue):
+    row = {f: issue.get(f) for f in CSV_FIELDS if f not in ("lat", "lng")}
+    row["lat"], row["lng"] = parse_coords(issue.get("location")) or ("", "")
+    return row
+
+
+def export_chunks(issues, fmt):
+    """The export as text chunks: one JSON object per line, or a CSV header and rows."""
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        write = lambda issue: writer.writerow(_csv_row(issue))
+    else:
+        write = lambda issue: buffer.write(json.dumps(dict(issue), separators=(",", ":")) + "\n")
+    for issue in issues:
+        write(issue)
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# ------------------- Import ------------------- #
+def read_records(stream, fmt):
+    """(line number, record) for each record of a text stream; a line that does not
+    parse gives an error message instead of a record."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        try:
+            for record in reader:
+                yield reader.line_num, record
+        except csv.Error as e:
+            yield reader.line_num, f"invalid CSV: {e}"
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, f"invalid JSON: {e.msg}"
+
+
+def _choice(value, choices, field, default=None):
+    value = str(value or "").strip()
+    if not value and default:
+        return default
+    for choice in choices:
+        if value.lower() == choice.lower():
+            return choice
+    raise ValueError(f"{field} must be one of {', '.join(choices)}")
+
+
+def validate(record, source="import"):
+    """The issue dict for one imported record; raises ValueError naming the bad field.
+
+    Uses the fields of a reported issue. Missing optional fields get the
+    form's defaults (status Pending, no upvotes, today's date); photos are
+    never imported.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    title = str(record.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    pincode = str(record.get("pincode") or "").strip()
+    if not re.fullmatch(r"\d{6}", pincode):
+        raise ValueError("pincode must be 6 digits")
+    category = str(record.get("category") or "").strip()
+    if not category:
+        raise ValueError("category is required")
+
+    location = record.get("location")
+    if not isinstance(location, dict):
+        location = {"lat": record.get("lat"), "lng": record.get("lng")}
+    if location.get("lat") in (None, "") and location.get("lng") in (None, ""):
+        location = {"lat": None, "lng": None}
+    else:
+        coords = parse_coords(location)
+        if coords is None:
+            raise ValueError("lat/lng must be valid coordinates")
+        location = {"lat": str(coords[0]), "lng": str(coords[1])}
+
+    now = datetime.now()
+    try:
+        date = datetime.strptime(str(record.get("date") or now.strftime("%Y-%m-%d")), "%Y-%m-%d")
+        time = str(record.get("time") or "00:00:00")
+        datetime.strptime(time, "%H:%M:%S")
+    except ValueError:
+        raise ValueError("date must be YYYY-MM-DD and time HH:MM:SS") from None
+    try:
+        upvotes = int(record.get("upvotes") or 0)
+    except (TypeError, ValueError):
+        raise ValueError("upvotes must be a whole number") from None
+    if upvotes < 0:
+        raise ValueError("upvotes must be a whole number")
+
+    return {
+        "id": str(record.get("id") or "") or new_issue_id(),
+        "title": title,
+        "description": str(record.get("description") or ""),
+        "pincode": pincode,
+        "location": location,
+        "category": category,
+        "priority": _choice(record.get("priority"), PRIORITIES, "priority"),
+        "photo": None,
+        "anonymous": str(record.get("anonymous") or "").strip().lower() in ("1", "true", "yes"),
+        "upvotes": upvotes,
+        "date": date.strftime("%Y-%m-%d"),
+        "time": time,
+        "month": date.strftime("%B"),
+        "username": str(record.get("username") or "").strip() or source,
+        "status": _choice(record.get("status"), STATUSES, "status", default="Pending"),
+    }
+
+
+def import_issues(storage, records, source="import", batch=IMPORT_BATCH):
+    """Validates `records` (see read_records) and adds them `batch` at a time.
+
+    Issues whose id is already stored are skipped, so a feed can be
+    re-imported safely. Returns {"added", "skipped", "invalid", "errors"}.
+    """
+    summary = {"added": 0, "skipped": 0, "invalid": 0, "errors": []}
+    pending = []
+
+    def flush():
+        added = storage.add_issues(pending)
+        summary["added"] += added
+        summary["skipped"] += len(pending) - added
+        pending.clear()
+
+    for line, record in records:
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            pending.append(validate(record, source))
+        except ValueError as e:
+            summary["invalid"] += 1
+            if len(summary["errors"]) < MAX_ERRORS:
+                summary["errors"].append({"line": line, "error": str(e)})
+            continue
+        if len(pending) >= batch:
+            flush()
+    if pending:
+        flush()
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixora bulk issue import/export")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write issues as NDJSON or CSV")
+    export.add_argument("--format", choices=FORMATS, help="default: from --out, else ndjson")
+    export.add_argument("--pincode")
+    export.add_argument("--from", dest="date_from", help="first date, YYYY-MM-DD")
+    export.add_argument("--to", dest="date_to", help="last date, YYYY-MM-DD")
+    export.add_argument("--out", help="file to write (default: stdout)")
+    load = sub.add_parser("import", help="add issues from an NDJSON or CSV feed")
+    load.add_argument("path", help="feed file, or - for stdin")
+    load.add_argument("--format", choices=FORMATS, help="default: from the file name, else ndjson")
+    load.add_argument("--source", default="import", help="username for records that carry none")
+    load.add_argument("--batch", type=int, default=IMPORT_BATCH)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        fmt = args.format or guess_format(args.out)
+        out = open(args.out, "w", newline="") if args.out else sys.stdout
+        try:
+            for chunk in export_chunks(iter_issues(get_storage(), args.pincode, args.date_from, args.date_to), fmt):
+                out.write(chunk)
+        finally:
+            if args.out:
+                out.close()
+                print(f"✅ Exported issues to {args.out}")
+    elif args.command == "import":
+        fmt = args.format or guess_format(args.path)
+        with (open(args.path, newline="") if args.path != "-" else sys.stdin) as stream:
+            summary = import_issues(get_storage(), read_records(stream, fmt), args.source, args.batch)
+        print(f"✅ Added {summary['added']} issues, skipped {summary['skipped']} already stored, "
+              f"{summary['invalid']} invalid")
+        for error in summary["errors"]:
+            print(f"  line {error['line']}: {error['error']}")
@@ -0,0 +1,624 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from bisect import bisect_right
+from datetime import datetime
+
+from storage import (JSONStorage, _stat, file_lock, issue_key, new_issue_id, prediction_key,
+                     rollups_of)
+
+LOG_DIR = os.environ.get("FIXORA_EVENT_LOG", "eventlog")
+# Events appended before a background compaction writes a new snapshot
+COMPACT_EVENTS = int(os.environ.get("FIXORA_COMPACT_EVENTS", 10_000))
+SNAPSHOT_FILE = "snapshot.json"
+LOG_FILE = "events.log"
+ARCHIVE_DIR = "archive"
+
+logger = logging.getLogger(__name__)
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _archived(directory, first):
+    return os.path.join(directory, ARCHIVE_DIR, f"events-{first:012d}.log")
+
+
+def _issue_of(event):
+    """The id of the issue an event is about, or None."""
+    return event["issue"]["id"] if event["type"] == "issue_reported" else event.get("id")
+
+
+def _segments(directory):
+    """Archived log segments, oldest first, then the live log."""
+    return sorted(glob.glob(os.path.join(directory, ARCHIVE_DIR, "events-*.log"))) + [os.path.join(directory, LOG_FILE)]
+
+
+def iter_events(directory=LOG_DIR):
+    """Every event ever written, in order: the archive plus the live log.
+
+    Consecutive segments can overlap (compaction carries the newest events
+    over into the next one), so events are deduplicated by seq.
+    """
+    last = 0
+    for path in _segments(directory):
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            continue
+        with f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written
+                event = json.loads(line)
+                if event["seq"] > last:
+                    last = event["seq"]
+                    yield event
+
+
+def replay_reported_issues(directory=LOG_DIR):
+    """Issues as they were reported, grouped like all_issues.json ({username}_issues lists).
+
+    A sequential read of the log, without rebuilding any state: train_ai
+    only needs what was known when each issue was reported.
+    """
+    all_issues = {}
+    for event in iter_events(directory):
+        if event["type"] == "issue_reported":
+            issue = event["issue"]
+            all_issues.setdefault(f"{issue['username']}_issues", []).append(issue)
+    return all_issues
+
+
+class EventLogStorage:
+    """Backend that records every mutation as one appended line in an event log.
+
+    The log (events.log, one JSON event per line) is the source of truth: a
+    write is a single fsync'd append, and each process rebuilds its state from
+    the latest snapshot plus the events after it, then follows the log's tail
+    on every read. Every COMPACT_EVENTS events a background compaction writes
+    a new snapshot and starts a new log segment; old segments are kept under
+    archive/ as the audit trail (`issue_history`) and for training replays.
+
+    Issue dicts are replaced, never mutated, so returned issues are stable
+    snapshots. A user's vote lists grow in place (copying them on every vote
+    made replay quadratic). Like the other backends' records they are shared
+    and read-only.
+
+    `issue_history` reads only the log lines about that issue, found through
+    an index of (segment, byte offset) per issue. Events this process applies
+    are indexed as they are read; archived segments are indexed the first time
+    history is asked for after they appear. Compaction archives a segment
+    under its first seq with the same bytes, so offsets stay valid.
+    """
+
+    def __init__(self, directory=LOG_DIR, seed=None):
+        self.directory = directory
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        os.makedirs(os.path.join(directory, ARCHIVE_DIR), exist_ok=True)
+        self._state = threading.RLock()
+        self._compacting = False
+        self._history = {}  # issue id -> {seq: (first seq of its segment, byte offset)}
+        self._archive_indexed = set()
+        self._log_first = None  # seq of the live log's first event
+        with self._locked():
+            if seed is not None and not os.path.exists(self.snapshot_path) and not _stat(self.log_path):
+                self._import(seed)
+            self._load()
+
+    def _locked(self):
+        return file_lock(self.log_path)
+
+    # ------------------- Replay ------------------- #
+    def _reset(self, seq):
+        self._users = {}
+        self._officials = {}
+        self._issues = {}  # id -> issue, in report order
+        self._predictions = []
+        self._seq = self._snapshot_seq = seq
+        # (seq, "user"/"issue", key) of every change since _changes_base, for changes_since
+        self._changes = []
+        self._changes_base = seq
+
+    def _load(self):
+        """Rebuilds the state from the snapshot and the log after it."""
+        while True:
+            try:
+                with open(self.snapshot_path) as f:
+                    snapshot_id = os.fstat(f.fileno()).st_ino
+                    snapshot = json.load(f)
+            except FileNotFoundError:
+                snapshot_id, snapshot = None, {"seq": 0}
+            try:
+                log = open(self.log_path, "rb")
+            except FileNotFoundError:
+                open(self.log_path, "ab").close()
+                continue
+            # A compaction between the two opens pairs an old snapshot with a
+            # new log; the snapshot is always replaced first, so check it again
+            current = _stat(self.snapshot_path)
+            if (current.st_ino if current else None) == snapshot_id:
+                break
+            log.close()
+
+        with self._state, log:
+            self._reset(snapshot["seq"])
+            for user in snapshot.get("users", ()):
+                self._users[user["email"]] = user
+            for official in snapshot.get("officials", ()):
+                self._officials[official["email"]] = official
+            for issue in snapshot.get("issues", ()):
+                self._issues[issue["id"]] = issue
+            self._predictions = snapshot.get("predictions", [])
+            st = os.fstat(log.fileno())
+            self._log_id = (st.st_dev, st.st_ino)
+            self._log_offset = 0
+            self._read_tail(log)
+
+    def _read_tail(self, log):
+        log.seek(self._log_offset)
+        data = log.read()
+        end = data.rfind(b"\n") + 1  # a line without its newline is still being written
+        offset = self._log_offset
+        for line in data[:end].split(b"\n")[:-1]:
+            event = json.loads(line)
+            if offset == 0:
+                self._log_first = event["seq"]
+            if event["seq"] > self._seq:  # a compacted segment repeats some events
+                self._apply(event, offset)
+            offset += len(line) + 1
+        self._log_offset += end
+
+    def _catch_up(self):
+        """Applies events other processes appended; reloads if the log was compacted."""
+        with self._state:
+            st = _stat(self.log_path)
+            if st is None or (st.st_dev, st.st_ino) != self._log_id or st.st_size < self._log_offset:
+                self._load()
+            elif st.st_size > self._log_offset:
+                with open(self.log_path, "rb") as log:
+                    self._read_tail(log)
+
+    def _changed(self, seq, kind, key):
+        self._changes.append((seq, kind, key))
+        if len(self._changes) > 4 * COMPACT_EVENTS:
+            # Repositories further behind than this simply reload in full
+            drop = len(self._changes) // 2
+            self._changes_base = self._changes[drop - 1][0]
+            del self._changes[:drop]
+
+    def _index_history(self, event, first, offset):
+        issue_id = _issue_of(event)
+        if issue_id is not None:
+            self._history.setdefault(issue_id, {})[event["seq"]] = (first, offset)
+
+    def _apply(self, event, offset=None):
+        """Applies one event to the state; `offset` is where it sits in the live log."""
+        seq, kind = event["seq"], event["type"]
+        if offset is not None:
+            self._index_history(event, self._log_first, offset)
+        if kind == "user_added":
+            user = event["user"]
+            # Own lists, so votes can be appended without touching the caller's dict
+            self._users[user["email"]] = dict(user, upvoted_issues=list(user.get("upvoted_issues", [])),
+                                              upvoted_ai_predictions=list(user.get("upvoted_ai_predictions", [])))
+            self._changed(seq, "user", user["email"])
+        elif kind == "official_added":
+            self._officials[event["official"]["email"]] = event["official"]
+        elif kind == "issue_reported":
+            self._issues[event["issue"]["id"]] = event["issue"]
+            self._changed(seq, "issue", event["issue"]["id"])
+        elif kind == "issue_upvoted":
+            issue = self._issues[event["id"]]
+            self._issues[event["id"]] = dict(issue, upvotes=issue.get("upvotes", 0) + 1)
+            self._users[event["email"]].setdefault("upvoted_issues", []).append(event["id"])
+            self._changed(seq, "issue", event["id"])
+            self._changed(seq, "user", event["email"])
+        elif kind == "issue_status":
+            self._issues[event["id"]] = dict(self._issues[event["id"]], status=event["status"])
+            self._changed(seq, "issue", event["id"])
+        elif kind == "issue_upvotes_raised":
+            self._issues[event["id"]] = dict(self._issues[event["id"]], upvotes=event["upvotes"])
+            self._changed(seq, "issue", event["id"])
+        elif kind == "predictions_replaced":
+            self._predictions = event["predictions"]
+        elif kind == "prediction_upvoted":
+            key = (event["predicted_issue"], event["pincode"], event["expected_date"])
+            self._predictions = [dict(p, upvotes=int(p.get("upvotes", 0)) + 1) if _prediction_id(p) == key else p
+                                 for p in self._predictions]
+            self._users[event["email"]].setdefault("upvoted_ai_predictions", []).append(prediction_key(*key))
+            self._changed(seq, "user", event["email"])
+        self._seq = seq
+
+    # ------------------- Writes ------------------- #
+    def _append(self, kind, actor=None, **fields):
+        """Appends one event and applies it; call with the lock held, after _catch_up."""
+        event = {"seq": self._seq + 1, "ts": _now(), "type": kind, "actor": actor, **fields}
+        self._write_events([event])
+        return event
+
+    def _write_events(self, events):
+        data = b"".join(json.dumps(e, separators=(",", ":")).encode() + b"\n" for e in events)
+        with open(self.log_path, "ab") as log:
+            log.write(data)
+            log.flush()
+            os.fsync(log.fileno())
+        with self._state:
+            offset = self._log_offset
+            for event in events:
+                if offset == 0:
+                    self._log_first = event["seq"]
+                self._apply(event, offset)
+                offset += len(json.dumps(event, separators=(",", ":")).encode()) + 1
+            self._log_offset += len(data)
+        if self._seq - self._snapshot_seq >= COMPACT_EVENTS and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self._background_compact, name="fixora-compact", daemon=True).start()
+
+    def _import(self, source):
+        """Seeds an empty log from the legacy JSON files, as events, so training
+        replays and audits cover the full history."""
+        issues = [dict(i) for i in source.list_issues()]
+        legacy = {}
+        for issue in issues:
+            issue["id"] = issue.get("id") or new_issue_id()
+            legacy.setdefault(issue_key(issue.get("title"), issue.get("pincode"), issue.get("username")), issue["id"])
+        events = []
+        for user in source.list_users():
+            upvoted = list(dict.fromkeys(legacy.get(k, k) for k in user.get("upvoted_issues", [])))
+            events.append(("user_added", {"user": dict(user, upvoted_issues=upvoted)}))
+        events += [("official_added", {"official": o}) for o in source.list_officials()]
+        events += [("issue_reported", {"issue": i}) for i in issues]
+        events.append(("predictions_replaced", {"predictions": source.list_predictions()}))
+        ts = _now()
+        with open(self.log_path, "ab") as log:
+            for seq, (kind, fields) in enumerate(events, 1):
+                event = {"seq": seq, "ts": ts, "type": kind, "actor": "import", **fields}
+                log.write(json.dumps(event, separators=(",", ":")).encode() + b"\n")
+            log.flush()
+            os.fsync(log.fileno())
+
+    # ------------------- Compaction ------------------- #
+    def _background_compact(self):
+        try:
+            self.compact()
+        except Exception:
+            logger.exception("Background compaction of %s failed", self.directory)
+        finally:
+            self._compacting = False
+
+    def compact(self):
+        """Snapshots the current state and moves the log on to a new segment.
+
+        The snapshot is serialized without holding the writer lock; events
+        appended meanwhile are carried over into the new segment. The old
+        segment is kept under archive/. Returns False if another process
+        compacted first.
+        """
+        with self._state:
+            self._catch_up()
+            seq, offset, log_id = self._seq, self._log_offset, self._log_id
+            # Vote lists grow in place, so they are copied while no event can touch them
+            users = [dict(u, upvoted_issues=list(u.get("upvoted_issues", [])),
+                          upvoted_ai_predictions=list(u.get("upvoted_ai_predictions", [])))
+                     for u in self._users.values()]
+            snapshot = {"seq": seq, "users": users,
+                        "officials": list(self._officials.values()),
+                        "issues": list(self._issues.values()), "predictions": self._predictions}
+        snapshot_tmp = self._write_temp(json.dumps(snapshot, separators=(",", ":")).encode())
+        try:
+            with self._locked():
+                st = _stat(self.log_path)
+                if st is None or (st.st_dev, st.st_ino) != log_id:
+                    return False
+                if st.st_size == 0:
+                    return True  # the snapshot is already current
+                with open(self.log_path, "rb") as log:
+                    first = json.loads(log.readline() or b'{"seq": 0}')["seq"]
+                    log.seek(offset)
+                    tail = log.read()
+                log_tmp = self._write_temp(tail)
+                archived = _archived(self.directory, first)
+                if not os.path.exists(archived):
+                    try:
+                        os.link(self.log_path, archived)
+                    except OSError:  # no hard links on this filesystem
+                        shutil.copyfile(self.log_path, archived)
+                with self._state:
+                    # Snapshot first: a crash in between leaves it with the old
+                    # log, whose already-snapshotted events are skipped by seq
+                    os.replace(snapshot_tmp, self.snapshot_path)
+                    os.replace(log_tmp, self.log_path)
+                    st = os.stat(self.log_path)
+                    self._log_id = (st.st_dev, st.st_ino)
+                    self._log_offset -= offset
+                    self._snapshot_seq = seq
+                    # Lines already read stay indexed under the archived copy
+                    self._log_first = json.loads(tail[:tail.index(b"\n")])["seq"] if self._log_offset else None
+                return True
+        finally:
+            if os.path.exists(snapshot_tmp):
+                os.unlink(snapshot_tmp)
+
+    def _write_temp(self, data):
+        fd, path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return path
+
+    # ------------------- Storage Interface ------------------- #
+    def version(self):
+        """The seq of the last event; compaction leaves it unchanged."""
+        self._catch_up()
+        return self._seq
+
+    def changes_since(self, version):
+        with self._state:
+            self._catch_up()
+            if version is None or version < self._changes_base:
+                # Fresh copies: the repository takes ownership of (and mutates) these
+                return (self._seq, [dict(u) for u in self._users.values()],
+                        [dict(i) for i in self._issues.values()], True)
+            changed = {"user": {}, "issue": {}}
+            for _, kind, key in self._changes[bisect_right(self._changes, (version, "~")):]:
+                changed[kind][key] = None
+            return (self._seq, [dict(self._users[k]) for k in changed["user"]],
+                    [dict(self._issues[k]) for k in changed["issue"]], False)
+
+    # Users
+    def list_users(self):
+        self._catch_up()
+        return list(self._users.values())
+
+    def get_user(self, email):
+        self._catch_up()
+        return self._users.get(email)
+
+    def add_user(self, user):
+        with self._locked():
+            self._catch_up()
+            if user["email"] in self._users:
+                return False
+            self._append("user_added", user["email"], user=user)
+            return True
+
+    # Officials
+    def list_officials(self):
+        self._catch_up()
+        return list(self._officials.values())
+
+    def get_official(self, email):
+        self._catch_up()
+        return self._officials.get(email)
+
+    def add_official(self, official):
+        with self._locked():
+            self._catch_up()
+            if official["email"] in self._officials:
+                return False
+            self._append("official_added", official["email"], official=official)
+            return True
+
+    # Issues
+    def list_issues(self):
+        self._catch_up()
+        return list(self._issues.values())
+
+    def issues_for_user(self, username):
+        return [i for i in self.list_issues() if (i.get("username") or "").lower() == username.lower()]
+
+    def issues_for_pincode(self, pincode):
+        return [i for i in self.list_issues() if i.get("pincode") == pincode]
+
+    def get_issue(self, issue_id):
+        self._catch_up()
+        return self._issues.get(issue_id)
+
+    def add_issue(self, issue):
+        issue.setdefault("id", new_issue_id())
+        with self._locked():
+            self._catch_up()
+            self._append("issue_reported", issue.get("username"), issue=dict(issue))
+            return issue
+
+    def add_issues(self, issues):
+        """Appends a batch of reports with one write and fsync, skipping ids already
+        stored; returns how many were added."""
+        with self._locked():
+            self._catch_up()
+            events, ids, ts = [], set(), _now()
+            for issue in issues:
+                issue.setdefault("id", new_issue_id())
+                if issue["id"] in self._issues or issue["id"] in ids:
+                    continue
+                ids.add(issue["id"])
+                events.append({"seq": self._seq + len(events) + 1, "ts": ts, "type": "issue_reported",
+                               "actor": issue.get("username"), "issue": dict(issue)})
+            if events:
+                self._write_events(events)
+            return len(events)
+
+    def backfill_issue_ids(self):
+        """Issues get their id when they are logged (or imported); nothing to do."""
+
+    def upvote_issue(self, email, issue_id):
+        """Adds one upvote from `email`; returns False if already voted or not found."""
+        with self._locked():
+            self._catch_up()
+            user = self._users.get(email)
+            if user is None or issue_id not in self._issues or issue_id in user.get("upvoted_issues", []):
+                return False
+            self._append("issue_upvoted", email, id=issue_id, email=email)
+            return True
+
+    def apply_upvotes(self, votes):
+        """Appends a batch of (kind, email, target) upvotes with one write and fsync
+        (see JSONStorage.apply_upvotes); returns how many were applied."""
+        with self._locked():
+            self._catch_up()
+            events, seen, ts = [], set(), _now()
+            predictions = {_prediction_id(p) for p in self._predictions}
+            for kind, email, target in votes:
+                user = self._users.get(email)
+                if user is None or (kind, email, target) in seen:
+                    continue
+                if kind == "issue":
+                    if target not in self._issues or target in user.get("upvoted_issues", []):
+                        continue
+                    event_type, fields = "issue_upvoted", {"id": target, "email": email}
+                else:
+                    if target not in predictions or prediction_key(*target) in user.get("upvoted_ai_predictions", []):
+                        continue
+                    event_type, fields = "prediction_upvoted", {"email": email, "predicted_issue": target[0],
+                                                                "pincode": target[1], "expected_date": target[2]}
+                seen.add((kind, email, target))
+                events.append({"seq": self._seq + len(events) + 1, "ts": ts, "type": event_type, "actor": email,
+                               **fields})
+            if events:
+                self._write_events(events)
+            return len(events)
+
+    def set_issue_status(self, issue_id, status, actor=None):
+        with self._locked():
+            self._catch_up()
+            if issue_id not in self._issues:
+                return False
+            self._append("issue_status", actor, id=issue_id, status=status)
+            return True
+
+    def raise_issue_upvotes(self, issue_id, upvotes):
+        """Sets the upvote count to `upvotes` if that is higher than the stored one."""
+        with self._locked():
+            self._catch_up()
+            issue = self._issues.get(issue_id)
+            if issue is None or issue.get("upvotes", 0) >= upvotes:
+                return False
+            self._append("issue_upvotes_raised", "reconcile", id=issue_id, upvotes=upvotes)
+            return True
+
+    def toggle_issue_status(self, issue_id, actor=None):
+        """Flips an issue between Pending and Resolved."""
+        with self._locked():
+            self._catch_up()
+            issue = self._issues.get(issue_id)
+            if issue is None:
+                return False
+            status = "Resolved" if issue.get("status") == "Pending" else "Pending"
+            self._append("issue_status", actor, id=issue_id, status=status)
+            return True
+
+    def rollups(self, group_by=(), **filters):
+        """Issue and upvote totals per `group_by` cell; a scan of the in-memory issues."""
+        return rollups_of(self.list_issues(), group_by, filters)
+
+    def _index_archive(self):
+        """Indexes archived segments not seen yet; each is read once per process."""
+        for path in sorted(glob.glob(os.path.join(self.directory, ARCHIVE_DIR, "events-*.log"))):
+            if path in self._archive_indexed:
+                continue
+            with open(path, "rb") as f:
+                first, offset = None, 0
+                for line in f:
+                    event = json.loads(line)
+                    first = event["seq"] if first is None else first
+                    self._index_history(event, first, offset)
+                    offset += len(line)
+            self._archive_indexed.add(path)
+
+    def _open_segment(self, first):
+        try:
+            return open(_archived(self.directory, first), "rb")
+        except FileNotFoundError:
+            pass
+        log = open(self.log_path, "rb")
+        if json.loads(log.readline())["seq"] == first:
+            return log
+        log.close()  # compacted since the check above: it is archived now
+        return open(_archived(self.directory, first), "rb")
+
+    def issue_history(self, issue_id):
+        """Audit trail of one issue: its report, upvotes and status changes, oldest first.
+
+        Reads only that issue's lines, so the cost follows its own event count.
+        """
+        with self._state:
+            self._catch_up()
+            self._index_archive()
+            located = sorted(self._history.get(issue_id, {}).items())
+        history, segments = [], {}
+        try:
+            for _, (first, offset) in located:
+                if first not in segments:
+                    segments[first] = self._open_segment(first)
+                segment = segments[first]
+                segment.seek(offset)
+                event = json.loads(segment.readline())
+                entry = {k: v for k, v in event.items() if k != "issue"}
+                if event["type"] == "issue_reported":
+                    entry.update(id=issue_id, status=event["issue"].get("status"))
+                history.append(entry)
+        finally:
+            for segment in segments.values():
+                segment.close()
+        return history
+
+    # AI predictions
+    def list_predictions(self):
+        self._catch_up()
+        return list(self._predictions)
+
+    def predictions_for_pincode(self, pincode):
+        return [p for p in self.list_predictions() if p.get("pincode") == pincode]
+
+    def replace_predictions(self, predictions):
+        with self._locked():
+            self._catch_up()
+            self._append("predictions_replaced", "train_ai", predictions=list(predictions))
+
+    def upvote_prediction(self, email, predicted_issue, pincode, expected_date):
+        """Adds one upvote from `email`; returns False if already voted or not found."""
+        with self._locked():
+            self._catch_up()
+            user = self._users.get(email)
+            key = (predicted_issue, pincode, expected_date)
+            if user is None or prediction_key(*key) in user.get("upvoted_ai_predictions", []):
+                return False
+            if not any(_prediction_id(p) == key for p in self._predictions):
+                return False
+            self._append("prediction_upvoted", email, email=email, predicted_issue=predicted_issue,
+                         pincode=pincode, expected_date=expected_date)
+            return True
+
+
+def _prediction_id(prediction):
+    return prediction.get("predicted_issue"), prediction.get("pincode"), prediction.get("expected_date")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixora event log tools")
+    parser.add_argument("--dir", default=LOG_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("compact", help="write a snapshot now and start a new log segment")
+    history = sub.add_parser("history", help="print the audit trail of one issue")
+    history.add_argument("issue_id")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        store = EventLogStorage(args.dir, seed=JSONStorage())
+        if store.compact():
+            print(f"✅ Snapshot written at event {store.version()} in {args.dir}")
+        else:
+            print("Another process compacted the log first; nothing to do")
+    elif args.command == "history":
+        for event in EventLogStorage(args.dir, seed=JSONStorage()).issue_history(args.issue_id):
+            detail = event.get("status") or event.get("email") or event.get("upvotes") or ""
+            print(f"{event['ts']}  #{event['seq']:<8} {event['type']:<22} {event['actor'] or '-':<28} {detail}")
@@ -0,0 +1,166 @@
+import json
+import os
+import queue
+import sys
+import threading
+from collections import deque
+
+HEARTBEAT_SECONDS = 15
+REPLAY_EVENTS = 256  # kept so reconnecting clients can catch up via Last-Event-ID
+SUBSCRIBER_QUEUE = 256  # a client this far behind is dropped and reconnects
+RETRY_MS = 3000
+# Open streams per process; each holds a server thread, so keep this below the
+# worker's thread count. Clients turned away poll instead
+MAX_STREAMS = int(os.environ.get("FIXORA_MAX_STREAMS", 4))
+POLL_SECONDS = int(os.environ.get("FIXORA_POLL_SECONDS", 5))
+
+
+class StreamLimitReached(RuntimeError):
+    """Raised by EventBus.subscribe when the process already holds max_subscribers streams."""
+
+
+class _Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = False
+
+
+class EventBus:
+    """In-process pub/sub of small change events for the dashboards.
+
+    Events are (id, type, data) with ids increasing per process. The last
+    REPLAY_EVENTS are kept so a client reconnecting with Last-Event-ID only
+    receives what it missed; one too far behind is told to resync instead.
+    At most `max_subscribers` streams are open at once; polling clients
+    read the same replay buffer through `since`.
+    """
+
+    def __init__(self, replay=REPLAY_EVENTS, maxsize=SUBSCRIBER_QUEUE, max_subscribers=MAX_STREAMS):
+        self.maxsize = maxsize
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = deque(maxlen=replay)
+        self._next_id = 1
+
+    def publish(self, type, data):
+        with self._lock:
+            event = (self._next_id, type, data)
+            self._next_id += 1
+            self._recent.append(event)
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    # Never block a request on a slow reader
+                    subscriber.dropped = True
+                    self._subscribers.discard(subscriber)
+        return event
+
+    def _since(self, last_event_id):
+        if last_event_id is None:
+            return []
+        oldest = self._recent[0][0] if self._recent else self._next_id
+        if not oldest - 1 <= last_event_id < self._next_id:
+            # Evicted from the replay buffer, or issued by an earlier process
+            return None
+        return [e for e in self._recent if e[0] > last_event_id]
+
+    def since(self, last_event_id=None):
+        """Returns (events after last_event_id, id of the latest event); events is None when the client must resync."""
+        with self._lock:
+            return self._since(last_event_id), self._next_id - 1
+
+    def subscribe(self, last_event_id=None):
+        """Returns (subscriber, backlog); backlog is None when the client must resync.
+
+        Raises StreamLimitReached when max_subscribers streams are already open.
+        """
+        subscriber = _Subscriber(self.maxsize)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise StreamLimitReached(f"{len(self._subscribers)} event streams are already open")
+            self._subscribers.add(subscriber)
+            return subscriber, self._since(last_event_id)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def close(self):
+        """Ends every open stream, e.g. before the process shuts down."""
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.dropped = True
+                try:
+                    subscriber.queue.put_nowait(None)  # wakes the stream's thread
+                except queue.Full:
+                    pass
+            self._subscribers.clear()
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _format(event_id, type, data):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def can_stream(environ):
+    """Whether a long-lived response can run without stalling the worker's only thread.
+
+    True for threaded servers and gevent-patched ones; a sync worker (one
+    request at a time) is left to polling.
+    """
+    if environ.get("wsgi.multithread"):
+        return True
+    monkey = sys.modules.get("gevent.monkey")
+    return bool(monkey and monkey.is_module_patched("socket"))
+
+
+def stream(bus, last_event_id=None, version=None, heartbeat=HEARTBEAT_SECONDS):
+    """Subscribes one client; returns (subscriber, text/event-stream chunks).
+
+    The chunks run until the client disconnects or falls behind, and the
+    subscriber is dropped when they end; unsubscribe it yourself if they are
+    never iterated. Raises StreamLimitReached as EventBus.subscribe does.
+
+    The bus only sees writes made by this process, so when `version` (e.g.
+    storage.version) is given it is checked on every heartbeat and a
+    `resync` event is sent if the data moved without an event: another
+    worker, the training job or a CLI wrote it.
+    """
+    subscriber, backlog = bus.subscribe(last_event_id)
+    return subscriber, _chunks(bus, subscriber, backlog, version, heartbeat)
+
+
+def _chunks(bus, subscriber, backlog, version, heartbeat):
+    seen = version() if version else None
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if backlog is None:
+            yield _format(None, "resync", {})
+        for event in backlog or ():
+            yield _format(*event)
+        while not subscriber.dropped:
+            try:
+                event = subscriber.queue.get(timeout=heartbeat)
+                if event is None:
+                    break  # the bus was closed
+            except queue.Empty:
+                current = version() if version else None
+                if current != seen:
+                    seen = current
+                    yield _format(None, "resync", {})
+                else:
+                    yield ": keepalive\n\n"
+                continue
+            if version:
+                seen = version()
+            yield _format(*event)
+    finally:
+        bus.unsubscribe(subscriber)
@@ -0,0 +1,99 @@
+import math
+from collections import defaultdict
+
+CELL_DEG = 0.01  # base grid resolution, roughly 1.1 km
+EARTH_RADIUS_M = 6_371_000
+CLUSTER_CELLS_PER_TILE = 4  # cluster cells per 256px map tile, i.e. ~64px each
+MAX_CLUSTER_ZOOM = 17  # at or beyond this zoom every issue is its own marker
+
+
+def parse_coords(location):
+    """Turns a {"lat": "..", "lng": ".."} dict of strings into floats, or None."""
+    if not location:
+        return None
+    try:
+        lat = float(location.get("lat"))
+        lng = float(location.get("lng"))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def distance_m(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, a)))
+
+
+def box_around(lat, lng, metres):
+    """(west, south, east, north) of a box containing the circle of `metres` around a point."""
+    dlat = math.degrees(metres / EARTH_RADIUS_M)
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return lng - dlng, lat - dlat, lng + dlng, lat + dlat
+
+
+class GridIndex:
+    """Buckets points into fixed-size lat/lng cells for bounding-box queries."""
+
+    def __init__(self, cell_deg=CELL_DEG):
+        self.cell_deg = cell_deg
+        self._cells = defaultdict(set)  # (x, y) cell -> ids
+        self._points = {}  # id -> (lat, lng)
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat, lng):
+        return math.floor(lng / self.cell_deg), math.floor(lat / self.cell_deg)
+
+    def add(self, item_id, lat, lng):
+        self.remove(item_id)
+        self._points[item_id] = (lat, lng)
+        self._cells[self._cell(lat, lng)].add(item_id)
+
+    def remove(self, item_id):
+        point = self._points.pop(item_id, None)
+        if point is not None:
+            cell = self._cell(*point)
+            self._cells[cell].discard(item_id)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def get(self, item_id):
+        return self._points.get(item_id)
+
+    def within(self, west, south, east, north):
+        """Yields (id, lat, lng) for every point inside the box."""
+        x0, y0 = self._cell(south, west)
+        x1, y1 = self._cell(north, east)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+            # Zoomed far out: walking the occupied cells is cheaper
+            cells = [c for c in self._cells if x0 <= c[0] <= x1 and y0 <= c[1] <= y1]
+        else:
+            cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) if (x, y) in self._cells]
+        for cell in cells:
+            for item_id in self._cells[cell]:
+                lat, lng = self._points[item_id]
+                if south <= lat <= north and west <= lng <= east:
+                    yield item_id, lat, lng
+
+
+def cluster(points, zoom):
+    """Groups (id, lat, lng) points into per-cell clusters sized for `zoom`.
+
+    Returns a list of {"lat", "lng", "count", "ids"} dicts, where lat/lng is
+    the mean position of the cluster's points.
+    """
+    cell = 360 / (2 ** zoom * CLUSTER_CELLS_PER_TILE)
+    groups = defaultdict(lambda: [0.0, 0.0, []])
+    for item_id, lat, lng in points:
+        group = groups[(math.floor(lng / cell), math.floor(lat / cell))]
+        group[0] += lat
+        group[1] += lng
+        group[2].append(item_id)
+    return [{"lat": lat_sum / len(ids), "lng": lng_sum / len(ids), "count": len(ids), "ids": ids}
+            for lat_sum, lng_sum, ids in groups.values()]
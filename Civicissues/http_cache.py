@@ -0,0 +1,94 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+CACHE_ENTRIES = 512
+MIN_COMPRESS_BYTES = 1024  # smaller bodies are not worth compressing
+
+
+class ResponseCache:
+    """Process-local LRU of serialized JSON responses, tagged with a data version.
+
+    An entry built at an older version is never served: every write to
+    issues, users or predictions bumps the storage version, so stale entries
+    simply miss and get rebuilt.
+    """
+
+    def __init__(self, maxsize=CACHE_ENTRIES):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (version, etag, last_modified, {encoding: body})
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, payload):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        etag = hashlib.sha1(repr((key, version)).encode()).hexdigest()
+        entry = (version, etag, time.time(), {"identity": body})
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def _encoding():
+    if brotli is not None and request.accept_encodings["br"]:
+        return "br"
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return "identity"
+
+
+def _encoded(bodies, encoding):
+    body = bodies.get(encoding)
+    if body is None:
+        raw = bodies["identity"]
+        body = brotli.compress(raw) if encoding == "br" else gzip.compress(raw, compresslevel=6)
+        bodies[encoding] = body  # racing threads produce identical bytes
+    return body
+
+
+def cached_json(cache, key, version, build):
+    """A conditional, compressed JSON response for `build()`'s payload.
+
+    `build` only runs when the cache has nothing for (key, version). Clients
+    get a weak ETag derived from the pair plus Last-Modified, and requests
+    carrying a matching If-None-Match / If-Modified-Since get a 304.
+    """
+    entry = cache.get(key, version) or cache.put(key, version, build())
+    _, etag, last_modified, bodies = entry
+    encoding = _encoding() if len(bodies["identity"]) >= MIN_COMPRESS_BYTES else "identity"
+    response = Response(_encoded(bodies, encoding), mimetype="application/json")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding, Cookie"
+    # Private: bodies can depend on who is logged in; no-cache: always revalidate
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    return response.make_conditional(request)
@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import PhaseTimer
+from storage import file_lock, get_storage, load_data, save_data
+
+TRAINING_STATUS_FILE = "training_status.json"
+JOB_TIMEOUT = 60 * 60  # a job silent for this long is assumed dead and may be replaced
+ACTIVE_STATES = ("queued", "running")
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        # A single worker: training jobs never run side by side
+        _pool = ProcessPoolExecutor(max_workers=1)
+    return _pool
+
+
+def training_status():
+    """The latest training job, e.g. {"id", "state", "phase", "started_at", ...}."""
+    return load_data(TRAINING_STATUS_FILE) or {"state": "idle"}
+
+
+if os.name == "nt":
+    import ctypes
+
+    _PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    _ERROR_ACCESS_DENIED = 5
+    _STILL_ACTIVE = 259
+
+    def _pid_alive(pid):
+        # Not os.kill(pid, 0): on Windows that sends CTRL_C_EVENT to the job
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.get_last_error() == _ERROR_ACCESS_DENIED  # it exists, but is not ours to query
+        try:
+            code = ctypes.c_ulong()
+            return not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)) or code.value == _STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+else:
+    def _pid_alive(pid):
+        try:
+            os.kill(pid, 0)  # signal 0 only checks that the process exists
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass  # e.g. no permission to signal it: it exists
+        return True
+
+
+def _is_active(status):
+    if status.get("state") not in ACTIVE_STATES:
+        return False
+    if status.get("pid") and not _pid_alive(status["pid"]):
+        return False  # the worker died mid-job
+    return time.time() - status.get("updated_at", 0) < JOB_TIMEOUT
+
+
+def _update_status(job_id, **fields):
+    """Merges `fields` into the status file, unless a newer job has taken it over."""
+    with file_lock(TRAINING_STATUS_FILE):
+        status = training_status()
+        if status.get("id") != job_id:
+            return
+        status.update(fields, updated_at=time.time())
+        save_data(TRAINING_STATUS_FILE, status)
+
+
+def _run_training(job_id, horizon_days):
+    """Runs in the worker process: train, then swap in the new predictions."""
+    from train_ai import train_and_predict
+
+    _update_status(job_id, state="running", phase="starting", pid=os.getpid())
+    # Seconds per phase are kept in the status, so the app's /metrics can report them
+    timer = PhaseTimer(lambda phase: _update_status(job_id, phase=phase))
+    try:
+        predictions = train_and_predict(horizon_days, progress=timer)
+        timer("storing")
+        # One transaction (SQLite) or one atomic rename (JSON): readers see the
+        # old predictions or the new ones, never a mix
+        get_storage().replace_predictions(predictions)
+    except Exception as e:
+        logger.exception("Training job %s failed", job_id)
+        _update_status(job_id, state="failed", phase=None, error=str(e), finished_at=time.time(),
+                       phase_seconds=timer.finish())
+        return
+    _update_status(job_id, state="succeeded", phase=None, predictions=len(predictions), finished_at=time.time(),
+                   phase_seconds=timer.finish())
+
+
+def start_training(horizon_days=None):
+    """Queues a training job unless one is already queued or running.
+
+    Returns (status, started); when a job is in flight its status is returned
+    with started=False, so concurrent triggers collapse into a single run.
+    """
+    global _pool
+    from train_ai import PREDICTION_HORIZON_DAYS
+
+    with file_lock(TRAINING_STATUS_FILE):
+        status = training_status()
+        if _is_active(status):
+            return status, False
+        now = time.time()
+        status = {"id": uuid.uuid4().hex, "state": "queued", "phase": None,
+                  "started_at": now, "updated_at": now}
+        save_data(TRAINING_STATUS_FILE, status)
+    try:
+        _executor().submit(_run_training, status["id"], horizon_days or PREDICTION_HORIZON_DAYS)
+    except BrokenProcessPool as e:
+        _pool = None  # the worker died; the next trigger starts a fresh one
+        _update_status(status["id"], state="failed", error=str(e), finished_at=time.time())
+        return training_status(), False
+    return status, True
+
+
+def schedule_training(interval):
+    """Triggers start_training every `interval` seconds from a daemon thread.
+
+    Safe to call from every app worker: triggers landing while a job is in
+    flight are absorbed by start_training's deduplication.
+    """
+    def tick():
+        try:
+            start_training()
+        except Exception:
+            logger.exception("Could not start a scheduled training job")
+        timer = threading.Timer(interval, tick)
+        timer.daemon = True
+        timer.start()
+
+    timer = threading.Timer(interval, tick)
+    timer.daemon = True
+    timer.start()
@@ -0,0 +1,264 @@
+import collections
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Off by default; FIXORA_METRICS=1 records request, template, storage and
+# training timings and serves them at /metrics
+ENABLED = os.environ.get("FIXORA_METRICS", "") not in ("", "0")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Requests slower than this have their sampled stacks saved; 0 keeps the profiler off
+PROFILE_SLOW_MS = float(os.environ.get("FIXORA_PROFILE_SLOW_MS", 0))
+PROFILE_INTERVAL = 0.005
+PROFILE_FILE = "slow_requests.folded"
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label combination."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), buckets
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for key, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {counts[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """A Prometheus counter with one series per label combination."""
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._series = collections.Counter()
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._series[tuple(labels[name] for name in self.labels)] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        lines.extend(f"{self.name}{_labels(self.labels, key)} {value}" for key, value in series)
+        return lines
+
+
+request_seconds = Histogram("fixora_request_seconds", "Request latency by route.",
+                            ("route", "method", "status"))
+template_seconds = Histogram("fixora_template_render_seconds", "Template render time.", ("template",))
+io_seconds = Histogram("fixora_storage_io_seconds", "load_data/save_data time per JSON file.",
+                       ("op", "file"))
+io_bytes = Counter("fixora_storage_io_bytes_total", "Bytes read by load_data and written by save_data.",
+                  ("op", "file"))
+training_phase_seconds = Histogram("fixora_training_phase_seconds",
+                                   "Training phase durations in this process.", ("phase",))
+
+
+def render(extra=()):
+    """The Prometheus text exposition of every metric, plus `extra` lines."""
+    lines = [line for metric in _registry for line in metric.render()]
+    return "\n".join(lines + list(extra)) + "\n"
+
+
+def gauge_lines(name, help, label, values):
+    """Exposition lines for a gauge with one sample per {label: value} item."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    lines.extend(f"{name}{_labels((label,), (key,))} {value}" for key, value in sorted(values.items()))
+    return lines
+
+
+# ------------------- Storage I/O ------------------- #
+class _IOSample:
+    __slots__ = ("bytes",)
+
+    def __init__(self):
+        self.bytes = 0
+
+
+@contextmanager
+def timed_io(op, file):
+    """Times a load/save of `file`; the caller sets `.bytes` on the yielded sample."""
+    sample = _IOSample()
+    if not ENABLED:
+        yield sample
+        return
+    start = time.perf_counter()
+    try:
+        yield sample
+    finally:
+        name = os.path.basename(file)
+        io_seconds.observe(time.perf_counter() - start, op=op, file=name)
+        io_bytes.inc(sample.bytes, op=op, file=name)
+
+
+# ------------------- Training Phases ------------------- #
+class PhaseTimer:
+    """A progress(phase) callback that times each phase until the next one starts.
+
+    Wraps an optional `progress` callback; `finish()` closes the last phase
+    and returns the seconds spent per phase.
+    """
+
+    def __init__(self, progress=None):
+        self.progress = progress
+        self.seconds = {}
+        self._phase = None
+        self._start = None
+
+    def __call__(self, phase):
+        self._stop()
+        self._phase, self._start = phase, time.perf_counter()
+        if self.progress:
+            self.progress(phase)
+
+    def _stop(self):
+        if self._phase is None:
+            return
+        elapsed = time.perf_counter() - self._start
+        self.seconds[self._phase] = round(self.seconds.get(self._phase, 0) + elapsed, 6)
+        if ENABLED:
+            training_phase_seconds.observe(elapsed, phase=self._phase)
+        self._phase = None
+
+    def finish(self):
+        self._stop()
+        return self.seconds
+
+
+# ------------------- Sampling Profiler ------------------- #
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads serving requests every `interval` seconds.
+
+    Requests slower than `slow_ms` have their samples appended to `path` in
+    the folded format ("root;frame;frame count" per line) that flamegraph.pl
+    and speedscope read. The route is the root frame, so one file holds a
+    flame graph per route. Setting `slow_ms` to 0 turns sampling off.
+    """
+
+    def __init__(self, slow_ms=PROFILE_SLOW_MS, interval=PROFILE_INTERVAL, path=PROFILE_FILE):
+        self.slow_ms = slow_ms
+        self.interval = interval
+        self.path = path
+        self._active = {}  # thread id -> (root label, Counter of folded stacks)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.slow_ms > 0
+
+    def begin(self, label):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="fixora-profiler", daemon=True)
+                self._thread.start()
+            self._active[threading.get_ident()] = (label, collections.Counter())
+
+    def end(self, elapsed):
+        with self._lock:
+            entry = self._active.pop(threading.get_ident(), None)
+        if entry is None or elapsed * 1000 < self.slow_ms or not entry[1]:
+            return
+        label, stacks = entry
+        lines = "".join(f"{label};{stack} {count}\n" for stack, count in stacks.items())
+        with self._lock, open(self.path, "a") as f:
+            f.write(lines)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, (_, stacks) in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != me:
+                        stacks[_fold(frame)] += 1
+
+
+profiler = SamplingProfiler()
+
+
+# ------------------- Flask ------------------- #
+def instrument(app):
+    """Times every request and template render of `app` (and samples slow ones)."""
+    from flask import before_render_template, g, request, template_rendered
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        profiler.begin(request.endpoint or "unmatched")
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            profiler.end(elapsed)
+            if ENABLED:
+                request_seconds.observe(elapsed, route=request.endpoint or "unmatched",
+                                        method=request.method, status=response.status_code)
+        return response
+
+    # Renders can nest (includes are part of the outer render), so keep a stack
+    def _render_started(sender, template, context, **extra):
+        if ENABLED:
+            g.setdefault("metrics_renders", []).append(time.perf_counter())
+
+    def _render_finished(sender, template, context, **extra):
+        starts = g.get("metrics_renders") if ENABLED else None
+        if starts:
+            template_seconds.observe(time.perf_counter() - starts.pop(), template=template.name)
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
@@ -0,0 +1,86 @@
+import sys
+from collections.abc import Mapping
+
+from geo import parse_coords
+
+# Values shared by many issues; interned, so each record holds a pointer to
+# one shared string instead of its own copy
+INTERNED_FIELDS = ("username", "pincode", "category", "priority", "status", "month", "date", "time")
+FIELDS = ("id", "title", "description", "photo", "anonymous", "upvotes") + INTERNED_FIELDS
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class IssueRecord(Mapping):
+    """Compact, read-only issue held by the repository instead of the backend's dict.
+
+    Fields live in __slots__ (no per-issue dict), repeated strings are
+    interned and the coordinates are parsed once into floats; `location`
+    is rebuilt on access. It reads like the dict it came from (`get`, `[]`,
+    `dict(record)`, attribute access in templates), except that fields
+    holding None are left out, as if missing. Keys the record does not know
+    are kept in `extra`.
+    """
+
+    __slots__ = FIELDS + ("lat", "lng", "extra")
+
+    def __init__(self, issue):
+        self.update_from(issue)
+
+    def update_from(self, issue):
+        """Replaces every field with those of `issue` (a dict); the record stays the same object."""
+        get = issue.get
+        self.id, self.title, self.description = get("id"), get("title"), get("description")
+        self.photo, self.anonymous, self.upvotes = get("photo"), get("anonymous"), get("upvotes")
+        self.username, self.pincode = _intern(get("username")), _intern(get("pincode"))
+        self.category, self.priority = _intern(get("category")), _intern(get("priority"))
+        self.status, self.month = _intern(get("status")), _intern(get("month"))
+        self.date, self.time = _intern(get("date")), _intern(get("time"))
+        unknown = issue.keys() - _KNOWN
+        extra = {k: issue[k] for k in unknown if issue[k] is not None} if unknown else None
+        coords = parse_coords(issue.get("location"))
+        if coords is None:
+            self.lat = self.lng = None
+            if issue.get("location") is not None:
+                extra = dict(extra or (), location=issue["location"])  # kept as is if it does not parse
+        else:
+            self.lat, self.lng = coords
+        self.extra = extra or None
+
+    @property
+    def location(self):
+        if self.lat is None:
+            return self.extra.get("location") if self.extra else None
+        return {"lat": repr(self.lat), "lng": repr(self.lng)}
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            value = getattr(self, key)
+        elif key == "location":
+            value = self.location
+        else:
+            value = self.extra.get(key) if self.extra else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for field in FIELDS:
+            if getattr(self, field) is not None:
+                yield field
+        if self.lat is not None:
+            yield "location"
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"IssueRecord({dict(self)!r})"
+
+
+_FIELD_SET = frozenset(FIELDS)
+_KNOWN = _FIELD_SET | {"location"}
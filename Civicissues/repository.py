@@ -0,0 +1,280 @@
+import base64
+import bisect
+import heapq
+import json
+import os
+import threading
+from collections import defaultdict
+
+from geo import MAX_CLUSTER_ZOOM, GridIndex, box_around, cluster, distance_m
+from records import IssueRecord
+from similarity import text_signature, similarity
+
+# Fields the issues API can filter on with an exact match
+FILTER_FIELDS = ("category", "status", "priority", "pincode")
+# A new report is a likely duplicate of an open issue of the same category
+# this close by whose title and description are at least this similar
+DUPLICATE_RADIUS_M = float(os.environ.get("FIXORA_DUPLICATE_METRES", 50))
+DUPLICATE_SIMILARITY = float(os.environ.get("FIXORA_DUPLICATE_SIMILARITY", 0.2))
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns the sort key a cursor points after; raises ValueError if malformed."""
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _date_key(issue):
+    return (issue.get("date") or "", issue.get("time") or "", issue["id"])
+
+
+def _upvotes_key(issue):
+    return (int(issue.get("upvotes") or 0), issue["id"])
+
+
+SORT_KEYS = {"date": _date_key, "upvotes": _upvotes_key}
+
+
+class Repository:
+    """Data-access layer that answers user and issue lookups from hash indexes.
+
+    Indexes: email -> user, issue id -> issue, pincode -> issues and
+    username -> issues, plus id sets per category/status/priority/pincode
+    a date-sorted list for the paginated issues API, and a lat/lng grid for
+    the map (coordinates are parsed once, when an issue is indexed). A user's
+    upvoted_issues/upvoted_ai_predictions are held as sets so "has this user
+    voted" is a constant-time check.
+
+    Before every read the repository asks the backend for rows written since
+    its last version stamp and applies them in place, so writes from this
+    worker or any other are picked up in O(changes). The JSON backend has no
+    row revisions and falls back to a full reload.
+
+    Issues are held as compact IssueRecords (see records.py) rather than the
+    backend's dicts. Returned issues and users are shared with the indexes
+    and must be treated as read-only; anything not answered here is
+    delegated to the backend.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.RLock()
+        self._version = None
+        self._reset()
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def _reset(self):
+        self._users = {}
+        self._issues = {}  # issue id -> issue
+        self._by_pincode = defaultdict(list)
+        self._by_username = defaultdict(list)
+        self._by_field = {field: defaultdict(set) for field in FILTER_FIELDS}
+        self._by_date = []  # sorted _date_key tuples
+        self._grid = GridIndex()
+        self._signatures = {}  # issue id -> MinHash of title + description, computed on first use
+
+    def _index_issue(self, issue, sort=True):
+        """Adds a new issue to every index; with sort=False the caller sorts _by_date afterwards."""
+        self._issues[issue["id"]] = issue
+        self._by_pincode[issue.get("pincode")].append(issue)
+        self._by_username[(issue.get("username") or "").lower()].append(issue)
+        for field, index in self._by_field.items():
+            index[issue.get(field)].add(issue["id"])
+        if sort:
+            bisect.insort(self._by_date, _date_key(issue))
+        else:
+            self._by_date.append(_date_key(issue))
+        if issue.lat is not None:
+            self._grid.add(issue["id"], issue.lat, issue.lng)
+
+    def _update_issue(self, existing, issue):
+        # Owner, title, pincode, category, priority and date never change, so
+        # only the status index needs moving; every other index already
+        # points at this record, which is updated in place
+        if existing.get("status") != issue.get("status"):
+            self._by_field["status"][existing.get("status")].discard(existing["id"])
+            self._by_field["status"][issue.get("status")].add(existing["id"])
+        existing.update_from(issue)
+
+    def refresh(self):
+        with self._lock:
+            version, users, issues, full = self.storage.changes_since(self._version)
+            if full:
+                self._reset()
+            for user in users:
+                user["upvoted_issues"] = set(user.get("upvoted_issues", ()))
+                user["upvoted_ai_predictions"] = set(user.get("upvoted_ai_predictions", ()))
+                self._users[user["email"]] = user
+            for issue in issues:
+                existing = self._issues.get(issue["id"])
+                if existing is None:
+                    # A full reload sorts the date index once, not per issue
+                    self._index_issue(IssueRecord(issue), sort=not full)
+                else:
+                    self._update_issue(existing, issue)
+            if full:
+                self._by_date.sort()
+            self._version = version
+
+    # Users
+    def get_user(self, email):
+        self.refresh()
+        return self._users.get(email)
+
+    def list_users(self):
+        self.refresh()
+        return list(self._users.values())
+
+    # Issues
+    def list_issues(self):
+        self.refresh()
+        return list(self._issues.values())
+
+    def get_issue(self, issue_id):
+        self.refresh()
+        return self._issues.get(issue_id)
+
+    def issues_for_user(self, username):
+        self.refresh()
+        return list(self._by_username.get(username.lower(), ()))
+
+    def issues_for_pincode(self, pincode):
+        self.refresh()
+        return list(self._by_pincode.get(pincode, ()))
+
+    def markers_in_bbox(self, west, south, east, north, zoom):
+        """Issues located inside the box, clustered for the given map zoom.
+
+        Returns (clusters, singles): clusters are {"lat", "lng", "count"}
+        dicts for cells holding more than one issue, singles are
+        (issue, lat, lng) tuples. From MAX_CLUSTER_ZOOM on nothing is grouped.
+        """
+        self.refresh()
+        with self._lock:
+            points = self._grid.within(west, south, east, north)
+            if zoom >= MAX_CLUSTER_ZOOM:
+                return [], [(self._issues[i], lat, lng) for i, lat, lng in points]
+            clusters, singles = [], []
+            for group in cluster(points, zoom):
+                if group["count"] == 1:
+                    issue_id = group["ids"][0]
+                    singles.append((self._issues[issue_id], group["lat"], group["lng"]))
+                else:
+                    clusters.append({"lat": group["lat"], "lng": group["lng"], "count": group["count"]})
+            return clusters, singles
+
+    def find_duplicates(self, category, lat, lng, text, radius_m=DUPLICATE_RADIUS_M,
+                        min_similarity=DUPLICATE_SIMILARITY, limit=3):
+        """Open issues of `category` within `radius_m` of a point whose text resembles `text`.
+
+        Only the grid cells around the point are visited, so the cost depends
+        on how many issues are nearby, not on the total. Returns
+        (issue, metres, similarity) tuples, most similar first.
+        """
+        signature = text_signature(text)
+        if signature is None:
+            return []
+        self.refresh()
+        matches = []
+        with self._lock:
+            for issue_id, issue_lat, issue_lng in self._grid.within(*box_around(lat, lng, radius_m)):
+                issue = self._issues[issue_id]
+                if issue.get("category") != category or issue.get("status") == "Resolved":
+                    continue
+                metres = distance_m(lat, lng, issue_lat, issue_lng)
+                if metres > radius_m:
+                    continue
+                # Titles and descriptions never change, so signatures stay valid
+                other = self._signatures.get(issue_id)
+                if other is None:
+                    other = self._signatures[issue_id] = text_signature(
+                        f"{issue.get('title') or ''} {issue.get('description') or ''}")
+                score = similarity(signature, other)
+                if score >= min_similarity:
+                    matches.append((issue, metres, score))
+        matches.sort(key=lambda m: (-m[2], m[1]))
+        return matches[:limit]
+
+    def _matching_ids(self, filters):
+        """Intersects the id sets of the given exact-match filters, smallest first.
+
+        Returns None when no filter is set (i.e. every issue matches).
+        """
+        sets = [self._by_field[field].get(value, set()) for field, value in filters.items() if value]
+        if not sets:
+            return None
+        sets.sort(key=len)
+        smallest, rest = sets[0], sets[1:]
+        return [i for i in smallest if all(i in s for s in rest)]
+
+    def count_issues(self, **filters):
+        self.refresh()
+        with self._lock:
+            ids = self._matching_ids(filters)
+            return len(self._issues) if ids is None else len(ids)
+
+    def query_issues(self, sort="date", descending=True, after=None, limit=50,
+                     date_from=None, date_to=None, **filters):
+        """One page of issues matching `filters` (see FILTER_FIELDS).
+
+        `after` is the sort key of the previous page's last issue (see
+        encode_cursor). Returns (issues, key of the last issue or None when
+        there are no more pages).
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        self.refresh()
+        key = SORT_KEYS[sort]
+        with self._lock:
+            ids = self._matching_ids(filters)
+            if ids is None and sort == "date":
+                return self._page_by_date(descending, after, limit, date_from, date_to)
+
+            if ids is None:
+                lo, hi = self._date_bounds(date_from, date_to)
+                candidates = (self._issues[k[2]] for k in self._by_date[lo:hi])
+            else:
+                candidates = (self._issues[i] for i in ids)
+                if date_from or date_to:
+                    candidates = (i for i in candidates if (not date_from or (i.get("date") or "") >= date_from)
+                                  and (not date_to or (i.get("date") or "") <= date_to))
+            if after is not None:
+                after = tuple(after)
+                candidates = (i for i in candidates if (key(i) < after if descending else key(i) > after))
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            page = pick(limit + 1, candidates, key=key)
+
+        has_more = len(page) > limit
+        page = page[:limit]
+        return page, (key(page[-1]) if has_more else None)
+
+    def _date_bounds(self, date_from, date_to):
+        lo = bisect.bisect_left(self._by_date, (date_from,)) if date_from else 0
+        # "\uffff" sorts after any time/id, so the whole of date_to is included
+        hi = bisect.bisect_right(self._by_date, (date_to, "\uffff")) if date_to else len(self._by_date)
+        return lo, hi
+
+    def _page_by_date(self, descending, after, limit, date_from, date_to):
+        """Unfiltered date-sorted page, walked straight off the sorted date index."""
+        lo, hi = self._date_bounds(date_from, date_to)
+        if after is not None:
+            after = tuple(after)
+            if descending:
+                hi = min(hi, bisect.bisect_left(self._by_date, after))
+            else:
+                lo = max(lo, bisect.bisect_right(self._by_date, after))
+        if descending:
+            keys = self._by_date[max(lo, hi - limit - 1):hi][::-1]
+        else:
+            keys = self._by_date[lo:min(hi, lo + limit + 1)]
+        has_more = len(keys) > limit
+        keys = keys[:limit]
+        return [self._issues[k[2]] for k in keys], (keys[-1] if has_more else None)
@@ -0,0 +1,503 @@
+import argparse
+import os
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from storage import (AI_PREDICTIONS_FILE, OFFICIALS_FILE, USERS_FILE, FlatFileStorage, JSONStorage, _as_list,
+                     _by_email, _by_pincode, _stat, file_lock, load_data, new_issue_id, read_cache, rollups_of, save_data)
+
+SHARD_DIR = os.environ.get("FIXORA_SHARD_DIR", "shards")
+SHARD_BUCKETS = int(os.environ.get("FIXORA_SHARD_BUCKETS", 64))  # fixed when the shards are first written
+# A pincode with more issues than this moves out of its shared bucket into a shard of its own
+HOT_PINCODE_ISSUES = int(os.environ.get("FIXORA_HOT_PINCODE_ISSUES", 20_000))
+MANIFEST_FILE = "manifest.json"
+CHANGES_FILE = "changes.log"
+
+
+# Views cached by read_cache next to each parsed shard
+def _manifest_view(data):
+    manifest = data if isinstance(data, dict) else {}
+    return {"buckets": manifest.get("buckets", SHARD_BUCKETS), "dedicated": manifest.get("dedicated", {})}
+
+
+def _shard_by_pincode(data):
+    return _by_pincode(_as_list(data))
+
+
+def _shard_by_id(data):
+    return {i.get("id"): i for i in _as_list(data)}
+
+
+def _shard_ids(data):
+    return frozenset(i.get("id") for i in _as_list(data))
+
+
+def _votes_by_user(data):
+    """{email: [issue ids]} from a shard's {issue id: [voter emails]} votes file."""
+    by_user = defaultdict(list)
+    for issue_id, voters in (data if isinstance(data, dict) else {}).items():
+        for email in voters:
+            by_user[email].append(issue_id)
+    return dict(by_user)
+
+
+class ShardedStorage(FlatFileStorage):
+    """JSON backend with the issues partitioned by pincode into shard files.
+
+    shards/manifest.json maps pincodes to shards: every pincode hashes into
+    one of `buckets` shared shards, unless it grew hot and was moved into a
+    dedicated one (see `rebalance`). A pincode query parses one shard, and
+    each shard has its own lock, so reports, upvotes and status changes in
+    different areas never wait on each other. Users, officials and
+    predictions stay in the flat JSON files. Issue upvotes are recorded next
+    to the shard (`{shard}.votes.json`, issue id -> voters) and merged into
+    the users' upvoted_issues when they are read; votes cast before sharding
+    stay in users.json. Across areas that list is not in voting order.
+
+    Every write appends the shard's name to changes.log, whose size is the
+    version: `version` is three stats, and `changes_since` and the issue id
+    map read only the lines written since they last looked.
+
+    The first shards are copied from `seed`, which is only read: issues it
+    has without an id get one in the shards alone, so votes recorded by
+    title no longer match them. `migrate_json_to_shards` ids them first.
+    """
+
+    def __init__(self, directory=SHARD_DIR, users_file=USERS_FILE, officials_file=OFFICIALS_FILE,
+                 predictions_file=AI_PREDICTIONS_FILE, seed=None):
+        super().__init__(users_file, officials_file, predictions_file)  # _locked() guards these; issues lock per shard
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.changes_path = os.path.join(directory, CHANGES_FILE)
+        # Issue id -> shard name and shard name -> {email: issue ids}, followed
+        # through changes.log up to byte _followed; built on first use
+        self._id_shards = None
+        self._votes = None
+        self._followed = 0
+        self._follow_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if _stat(self.manifest_path) is None:
+            with file_lock(self.manifest_path):
+                if _stat(self.manifest_path) is not None:
+                    return  # another process imported first
+                self._import(seed.list_issues() if seed is not None else [])
+            self.rebalance()
+
+    # ------------------- Shard Layout ------------------- #
+    def _manifest(self):
+        return read_cache.get(self.manifest_path, _manifest_view)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _shard_name(self, pincode, manifest=None):
+        manifest = manifest or self._manifest()
+        pincode = str(pincode or "")
+        return manifest["dedicated"].get(pincode) or f"bucket-{zlib.crc32(pincode.encode()) % manifest['buckets']:03d}"
+
+    def shard_names(self):
+        manifest = self._manifest()
+        return ([f"bucket-{b:03d}" for b in range(manifest["buckets"])] +
+                sorted(set(manifest["dedicated"].values())))
+
+    def _votes_path(self, name):
+        return os.path.join(self.directory, f"{name}.votes.json")
+
+    def _load_shard(self, name):
+        return _as_list(load_data(self._path(name)))
+
+    def _load_votes(self, name):
+        data = load_data(self._votes_path(name))
+        return data if isinstance(data, dict) else {}
+
+    # ------------------- Changes Log ------------------- #
+    def _changed(self, names, votes=False):
+        """Records that shards `names` (and their votes) were rewritten; call after saving them."""
+        data = "".join(f"{name}{' votes' if votes else ''}\n" for name in names).encode()
+        fd = os.open(self.changes_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)  # one O_APPEND write: lines from concurrent writers never interleave
+        finally:
+            os.close(fd)
+
+    def _changes_size(self):
+        st = _stat(self.changes_path)
+        return st.st_size if st else 0
+
+    def _changes_since(self, offset):
+        """(shards rewritten, shards whose votes changed, end offset) for the log after `offset`."""
+        try:
+            with open(self.changes_path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return set(), set(), offset
+        end = data.rfind(b"\n") + 1  # a line without its newline is still being written
+        names, votes = set(), set()
+        for line in data[:end].decode().splitlines():
+            name, _, kind = line.partition(" ")
+            names.add(name)
+            if kind == "votes":
+                votes.add(name)
+        return names, votes, offset + end
+
+    def _follow(self):
+        """Brings the id map and vote views up to date; reads only the shards changed since the last call."""
+        with self._follow_lock:
+            if self._id_shards is None:
+                self._followed = self._changes_size()  # before reading, so no write is missed
+                names = self.shard_names()
+                self._id_shards = {i: n for n in names for i in read_cache.get(self._path(n), _shard_ids)}
+                self._votes = {n: read_cache.get(self._votes_path(n), _votes_by_user) for n in names}
+                return
+            names, votes, self._followed = self._changes_since(self._followed)
+            for name in names:
+                self._id_shards.update(dict.fromkeys(read_cache.get(self._path(name), _shard_ids), name))
+            for name in votes:
+                self._votes[name] = read_cache.get(self._votes_path(name), _votes_by_user)
+
+    def _with_votes(self, user, votes_by_user):
+        """`user` with the issue votes recorded in the shards added to its upvoted_issues."""
+        voted = [i for votes in votes_by_user for i in votes.get(user["email"], ())]
+        if not voted:
+            return user
+        legacy = user.get("upvoted_issues", [])
+        return dict(user, upvoted_issues=legacy + [i for i in voted if i not in legacy])
+
+    def _import(self, issues):
+        """Writes the first set of shards from copies of `issues`; the manifest goes last, marking them complete."""
+        manifest = {"buckets": SHARD_BUCKETS, "dedicated": {}}
+        shards = {}
+        for issue in issues:
+            issue = dict(issue)
+            issue.setdefault("id", new_issue_id())
+            shards.setdefault(self._shard_name(issue.get("pincode"), manifest), []).append(issue)
+        for name, shard in shards.items():
+            save_data(self._path(name), shard)
+        save_data(self.manifest_path, manifest)
+
+    @contextmanager
+    def _shard_locked(self, pincode):
+        """Locks the shard holding `pincode` and yields its name, following a rebalance that moved it meanwhile."""
+        while True:
+            name = self._shard_name(pincode)
+            with file_lock(self._path(name)):
+                if self._shard_name(pincode) == name:
+                    yield name
+                    return
+
+    def _split_out(self, name, issues, pincode):
+        """Moves `pincode` from bucket `name` (locked by the caller) to a dedicated shard.
+
+        Returns the issues left in the bucket. Until the bucket is rewritten
+        a full scan can see the moved issues twice; pincode queries never do.
+        """
+        dedicated = "pin-" + re.sub(r"[^0-9A-Za-z_-]", "_", pincode)
+        moving = [i for i in issues if str(i.get("pincode") or "") == pincode]
+        moving_ids = {i.get("id") for i in moving}
+        votes = self._load_votes(name)
+        moving_votes = {i: voters for i, voters in votes.items() if i in moving_ids}
+        with file_lock(self._path(dedicated)):
+            if moving_votes:
+                save_data(self._votes_path(dedicated), {**self._load_votes(dedicated), **moving_votes})
+            save_data(self._path(dedicated), self._load_shard(dedicated) + moving)
+        with file_lock(self.manifest_path):
+            manifest = _manifest_view(load_data(self.manifest_path))
+            manifest["dedicated"][pincode] = dedicated
+            save_data(self.manifest_path, manifest)
+        remaining = [i for i in issues if str(i.get("pincode") or "") != pincode]
+        save_data(self._path(name), remaining)
+        if moving_votes:
+            save_data(self._votes_path(name), {i: v for i, v in votes.items() if i not in moving_ids})
+        self._changed([dedicated, name], votes=bool(moving_votes))
+        return remaining
+
+    def rebalance(self, hot=HOT_PINCODE_ISSUES):
+        """Moves every pincode with more than `hot` issues out of its shared bucket; returns them."""
+        moved = []
+        for name in self.shard_names():
+            if not name.startswith("bucket-"):
+                continue
+            with file_lock(self._path(name)):
+                issues = self._load_shard(name)
+                for pincode, count in Counter(str(i.get("pincode") or "") for i in issues).items():
+                    if count > hot:
+                        issues = self._split_out(name, issues, pincode)
+                        moved.append(pincode)
+        return moved
+
+    def shard_stats(self):
+        """(name, pincodes, issues, bytes) per shard, largest first."""
+        stats = []
+        for name in self.shard_names():
+            st = _stat(self._path(name))
+            by_pincode = read_cache.get(self._path(name), _shard_by_pincode)
+            stats.append((name, len(by_pincode), sum(map(len, by_pincode.values())), st.st_size if st else 0))
+        return sorted(stats, key=lambda s: -s[2])
+
+    def _locate(self, issue_id):
+        """Name of the shard holding `issue_id`, or None.
+
+        A miss only reads the shards changes.log names since the last look,
+        so an unknown id costs a stat when nothing was written.
+        """
+        if self._id_shards is not None:
+            name = self._id_shards.get(issue_id)
+            if name is not None and issue_id in read_cache.get(self._path(name), _shard_ids):
+                return name
+        # Added by another process or moved by a rebalance since the map was updated
+        self._follow()
+        return self._id_shards.get(issue_id)
+
+    def _modify_issue(self, issue_id, change):
+        """Applies `change(issue)` under the lock of the issue's shard and saves it
+        if that returns True; False if the issue is not found or the change declined."""
+        for _ in range(3):
+            name = self._locate(issue_id)
+            if name is None:
+                return False
+            with file_lock(self._path(name)):
+                issues = self._load_shard(name)
+                issue = next((i for i in issues if i.get("id") == issue_id), None)
+                if issue is None:
+                    continue  # moved by a rebalance since it was located
+                if not change(issue):
+                    return False
+                save_data(self._path(name), issues)
+                self._changed([name])
+                return True
+        return False
+
+    # ------------------- Storage Interface ------------------- #
+    def version(self):
+        """Size and mtime of the users and predictions files, and the size of changes.log."""
+        stamps = []
+        for f in (self.users_file, self.predictions_file):
+            st = _stat(f)
+            stamps.append((st.st_mtime_ns, st.st_size) if st else None)
+        return stamps[0], stamps[1], self._changes_size()
+
+    def _fresh_users(self):
+        """Newly parsed users with their shard votes, for a caller that may mutate them."""
+        self._follow()
+        return [self._with_votes(u, self._votes.values()) for u in self._load_users()]
+
+    def changes_since(self, version):
+        """Reloads only the shards changes.log names since `version`; a moved issue is simply re-sent."""
+        if version is None:
+            current = self.version()
+            return current, self._fresh_users(), [i for n in self.shard_names() for i in self._load_shard(n)], True
+        names, votes, end = self._changes_since(version[2])
+        current = self.version()[:2] + (end,)
+        users = self._fresh_users() if current[0] != version[0] or votes else []
+        return current, users, [i for n in sorted(names) for i in self._load_shard(n)], False
+
+    # Users, with the issue votes kept in the shards
+    def list_users(self):
+        self._follow()
+        return [self._with_votes(u, self._votes.values()) for u in super().list_users()]
+
+    def get_user(self, email):
+        user = super().get_user(email)
+        if user is None:
+            return None
+        self._follow()
+        return self._with_votes(user, self._votes.values())
+
+    def list_issues(self):
+        return [i for n in self.shard_names() for i in _as_list(read_cache.get(self._path(n)))]
+
+    def issues_for_user(self, username):
+        return [i for i in self.list_issues() if (i.get("username") or "").lower() == username.lower()]
+
+    def issues_for_pincode(self, pincode):
+        shard = read_cache.get(self._path(self._shard_name(pincode)), _shard_by_pincode)
+        return list(shard.get(pincode, []))
+
+    def get_issue(self, issue_id):
+        name = self._locate(issue_id)
+        return read_cache.get(self._path(name), _shard_by_id).get(issue_id) if name else None
+
+    def add_issue(self, issue):
+        issue.setdefault("id", new_issue_id())
+        pincode = str(issue.get("pincode") or "")
+        with self._shard_locked(pincode) as name:
+            issues = self._load_shard(name)
+            issues.append(issue)
+            if name.startswith("bucket-") and sum(str(i.get("pincode") or "") == pincode
+                                                  for i in issues) > HOT_PINCODE_ISSUES:
+                self._split_out(name, issues, pincode)
+            else:
+                save_data(self._path(name), issues)
+                self._changed([name])
+                if self._id_shards is not None:
+                    self._id_shards[issue["id"]] = name
+            return issue
+
+    def add_issues(self, issues):
+        """Adds a batch with one rewrite per shard touched, skipping ids already stored;
+        returns how many were added."""
+        self._follow()
+        known = set()
+        batch = []
+        for issue in issues:
+            issue.setdefault("id", new_issue_id())
+            if issue["id"] not in known and issue["id"] not in self._id_shards:
+                known.add(issue["id"])
+                batch.append(issue)
+        added = 0
+        while batch:
+            groups = {}
+            for issue in batch:
+                groups.setdefault(self._shard_name(issue.get("pincode")), []).append(issue)
+            batch = []
+            for name, group in groups.items():
+                with file_lock(self._path(name)):
+                    shard = self._load_shard(name)
+                    stored = {i.get("id") for i in shard}  # also catches another process adding the same issue
+                    for issue in group:
+                        if self._shard_name(issue.get("pincode")) != name:
+                            batch.append(issue)  # its pincode was rebalanced meanwhile; regrouped next round
+                        elif issue["id"] not in stored:
+                            stored.add(issue["id"])
+                            shard.append(issue)
+                            added += 1
+                    save_data(self._path(name), shard)
+                    self._changed([name])
+                    if name.startswith("bucket-"):
+                        counts = Counter(str(i.get("pincode") or "") for i in shard)
+                        for pincode in {str(i.get("pincode") or "") for i in group}:
+                            if counts[pincode] > HOT_PINCODE_ISSUES:
+                                shard = self._split_out(name, shard, pincode)
+        return added
+
+    def backfill_issue_ids(self):
+        """Issues get an id when the shards are first written; nothing to do."""
+
+    def upvote_issue(self, email, issue_id):
+        """Adds one upvote from `email` under the lock of the issue's shard alone;
+        returns False if already voted or not found."""
+        return self._add_issue_votes([(email, issue_id)]) == 1
+
+    def _add_issue_votes(self, votes):
+        """Records (email, issue id) votes with one rewrite per shard touched; returns how many were new.
+
+        Only the shards' locks are taken: the voters are kept next to the
+        shard, and users.json (votes from before sharding) is only read.
+        """
+        users = read_cache.get(self.users_file, _by_email)
+        pending = {}
+        for email, issue_id in votes:
+            user = users.get(email)
+            if user is not None and issue_id not in user.get("upvoted_issues", []):
+                pending.setdefault(issue_id, []).append(email)
+        applied = 0
+        for _ in range(3):
+            groups = defaultdict(dict)
+            for issue_id, emails in pending.items():
+                name = self._locate(issue_id)
+                if name is not None:
+                    groups[name][issue_id] = emails
+            pending = {}
+            for name, group in groups.items():
+                with file_lock(self._path(name)):
+                    issues = self._load_shard(name)
+                    shard_votes = self._load_votes(name)
+                    added = 0
+                    for issue in issues:
+                        for email in group.pop(issue.get("id"), ()):
+                            voters = shard_votes.setdefault(issue["id"], [])
+                            if email not in voters:
+                                voters.append(email)
+                                issue["upvotes"] = issue.get("upvotes", 0) + 1
+                                added += 1
+                    if added:
+                        # Voters first: a crash in between loses a count, never lets anyone vote twice
+                        save_data(self._votes_path(name), shard_votes)
+                        save_data(self._path(name), issues)
+                        self._changed([name], votes=True)
+                applied += added
+                pending.update(group)  # moved by a rebalance since it was located
+            if not pending:
+                break
+        return applied
+
+    def apply_upvotes(self, votes):
+        """Applies a batch of upvotes (see FlatFileStorage.apply_upvotes); issue votes
+        take only their shards' locks."""
+        issue_votes = [(email, target) for kind, email, target in votes if kind == "issue"]
+        other_votes = [v for v in votes if v[0] != "issue"]
+        applied = super().apply_upvotes(other_votes) if other_votes else 0
+        return applied + (self._add_issue_votes(issue_votes) if issue_votes else 0)
+
+    def set_issue_status(self, issue_id, status, actor=None):
+        """`actor` (who made the change) is only kept by the event log backend."""
+        def set_status(issue):
+            issue["status"] = status
+            return True
+
+        return self._modify_issue(issue_id, set_status)
+
+    def raise_issue_upvotes(self, issue_id, upvotes):
+        """Sets the upvote count to `upvotes` if that is higher than the stored one."""
+        def raise_count(issue):
+            if issue.get("upvotes", 0) >= upvotes:
+                return False
+            issue["upvotes"] = upvotes
+            return True
+
+        return self._modify_issue(issue_id, raise_count)
+
+    def toggle_issue_status(self, issue_id, actor=None):
+        """Flips an issue between Pending and Resolved."""
+        def toggle(issue):
+            issue["status"] = "Resolved" if issue.get("status") == "Pending" else "Pending"
+            return True
+
+        return self._modify_issue(issue_id, toggle)
+
+    def rollups(self, group_by=(), **filters):
+        """Issue and upvote totals per `group_by` cell, restricted to `filters`.
+
+        The shards keep no counters, so this is a scan of every issue.
+        """
+        return rollups_of(self.list_issues(), group_by, filters)
+
+
+# ------------------- Migration ------------------- #
+def migrate_json_to_shards(source, directory=SHARD_DIR):
+    """Gives the issues in a JSONStorage ids (rewriting title-based upvotes to use
+    them), then writes the first shards from them; returns the ShardedStorage."""
+    if _stat(os.path.join(directory, MANIFEST_FILE)) is not None:
+        raise RuntimeError(f"{directory} already holds shards; refusing to migrate twice")
+    source.backfill_issue_ids()
+    return ShardedStorage(directory, source.users_file, source.officials_file, source.predictions_file, seed=source)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixora issue shards")
+    parser.add_argument("--dir", default=SHARD_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="give the JSON files' issues ids, then write the first shards from them")
+    sub.add_parser("stats", help="issues, pincodes and size per shard")
+    rebalance = sub.add_parser("rebalance", help="move hot pincodes into dedicated shards")
+    rebalance.add_argument("--hot", type=int, default=HOT_PINCODE_ISSUES,
+                           help="issues above which a pincode gets its own shard")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        store = migrate_json_to_shards(JSONStorage(), args.dir)
+        print(f"✅ Migrated {len(store.list_issues())} issues into {args.dir}")
+        raise SystemExit
+    store = ShardedStorage(args.dir, seed=JSONStorage())
+    if args.command == "stats":
+        print(f"{'shard':<16} {'pincodes':>9} {'issues':>9} {'KB':>9}")
+        for name, pincodes, issues, size in store.shard_stats():
+            if issues:
+                print(f"{name:<16} {pincodes:>9} {issues:>9} {size / 1024:>9.1f}")
+    elif args.command == "rebalance":
+        moved = store.rebalance(args.hot)
+        print(f"✅ Moved {len(moved)} hot pincode(s) into their own shards: {', '.join(moved) or 'none'}")
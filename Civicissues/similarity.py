@@ -0,0 +1,32 @@
+import random
+import re
+import zlib
+
+SHINGLE_SIZE = 3  # characters per shingle; short civic titles need small shingles
+NUM_HASHES = 32  # signature length; the similarity estimate is within ~0.09 of the true Jaccard
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20250101)  # fixed, so signatures are comparable across processes
+_HASHES = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_HASHES)]
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Character shingles of `text` with case, punctuation and spacing normalized."""
+    normalized = " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def text_signature(text):
+    """MinHash signature of `text`'s shingles, or None for empty text."""
+    hashed = [zlib.crc32(s.encode()) for s in shingles(text)]
+    if not hashed:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashed) for a, b in _HASHES)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the texts behind two signatures (0.0 to 1.0)."""
+    if a is None or b is None:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
@@ -0,0 +1,41 @@
+// Live dashboard updates: the /events stream (Server-Sent Events), or, when
+// the server has no stream to spare (503), a short poll of /events/poll.
+// Returns an EventTarget that fires the same event types either way.
+function openLiveEvents(streamUrl, pollUrl) {
+    const target = new EventTarget();
+    const types = ['issue_created', 'issue_upvoted', 'issue_status', 'prediction_upvoted', 'resync'];
+    const fire = (type, data) => target.dispatchEvent(new MessageEvent(type, { data: JSON.stringify(data) }));
+    let after = null, version = null, opened = false;
+
+    async function poll() {
+        let delay = 5000;
+        const params = new URLSearchParams();
+        if (after !== null) params.set('after', after);
+        if (version !== null) params.set('version', version);
+        try {
+            const response = await fetch(`${pollUrl}?${params}`, { headers: { 'Accept': 'application/json' } });
+            if (response.ok) {
+                const reply = await response.json();
+                // Coming from a stream that dropped: whatever happened in between is unknown
+                if (reply.resync || (after === null && opened)) fire('resync', {});
+                reply.events.forEach(event => fire(event.type, event.data));
+                after = reply.last_id;
+                version = reply.version;
+                delay = reply.retry_ms;
+            }
+        } catch (error) {
+            console.error('Polling for live updates failed:', error);
+        }
+        setTimeout(poll, delay);
+    }
+
+    const source = new EventSource(streamUrl);
+    source.addEventListener('open', () => { opened = true; });
+    types.forEach(type => source.addEventListener(type, event =>
+        target.dispatchEvent(new MessageEvent(type, { data: event.data }))));
+    // A refused stream is not retried by the browser; it closes for good
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) poll();
+    });
+    return target;
+}
@@ -0,0 +1,1246 @@
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+USERS_FILE = "users.json"
+OFFICIALS_FILE = "officials.json"
+ISSUES_FILE = "all_issues.json"
+AI_PREDICTIONS_FILE = "ai_predictions.json"
+
+# "sqlite" (default) or "json" for the legacy flat files
+STORAGE_BACKEND = os.environ.get("FIXORA_STORAGE", "sqlite")
+DB_FILE = os.environ.get("FIXORA_DB", "fixora.db")
+# Per-process budget for parsed JSON files, measured by their size on disk
+READ_CACHE_BYTES = int(os.environ.get("FIXORA_READ_CACHE_MB", 64)) * 2 ** 20
+
+ISSUE_FIELDS = ("id", "title", "description", "pincode", "category", "priority", "photo",
+                "anonymous", "upvotes", "date", "time", "month", "username", "status")
+PREDICTION_FIELDS = ("pincode", "predicted_issue", "expected_date", "description", "priority", "upvotes")
+# Dimensions of the dashboard rollups; month is "YYYY-MM" taken from the issue date
+ROLLUP_FIELDS = ("category", "pincode", "status", "priority", "month")
+
+
+def new_issue_id():
+    return uuid.uuid4().hex
+
+
+def issue_key(title, pincode, username):
+    """Pre-ID identifier that old upvoted_issues lists still contain."""
+    return f"{title}__{pincode}__{username}"
+
+
+def prediction_key(predicted_issue, pincode, expected_date):
+    """Identifier stored in a user's upvoted_ai_predictions list."""
+    return f"{predicted_issue}__{pincode}__{expected_date}"
+
+
+def rollup_dims(issue):
+    """The rollup cell an issue counts towards (missing values become "")."""
+    return {
+        "category": issue.get("category") or "",
+        "pincode": issue.get("pincode") or "",
+        "status": issue.get("status") or "Pending",
+        "priority": (issue.get("priority") or "").capitalize(),  # "high" and "HIGH" count as "High"
+        "month": (issue.get("date") or "")[:7],
+    }
+
+
+def _check_rollup_args(group_by, filters):
+    unknown = set(group_by).union(filters) - set(ROLLUP_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown rollup field(s): {', '.join(sorted(unknown))}")
+
+
+def rollup_filters(filters):
+    """`filters` without the None values, with priority in the case rollup_dims gives it."""
+    filters = {f: v for f, v in filters.items() if v is not None}
+    if "priority" in filters:
+        filters["priority"] = filters["priority"].capitalize()
+    return filters
+
+
+def rollups_of(issues, group_by=(), filters=None):
+    """Rollup cells computed by scanning `issues`, for backends without counters."""
+    filters = filters or {}
+    _check_rollup_args(group_by, filters)
+    filters = rollup_filters(filters)
+    totals = {}
+    for issue in issues:
+        dims = rollup_dims(issue)
+        if any(dims[f] != v for f, v in filters.items()):
+            continue
+        key = tuple(dims[f] for f in group_by)
+        cell = totals.setdefault(key, {**dict(zip(group_by, key)), "issues": 0, "upvotes": 0})
+        cell["issues"] += 1
+        cell["upvotes"] += int(issue.get("upvotes") or 0)
+    if not group_by and not totals:
+        return [{"issues": 0, "upvotes": 0}]
+    return sorted(totals.values(), key=lambda c: tuple(c[f] for f in group_by))
+
+
+class CorruptDataError(ValueError):
+    """Raised when a JSON file cannot be parsed, instead of treating it as empty."""
+
+
+# ------------------- JSON Helpers ------------------- #
+@contextmanager
+def file_lock(path, shared=False):
+    """Exclusive cross-process lock held on `path`.lock for the duration of the block;
+    `shared` locks may be held by many at once (on Windows they are exclusive too)."""
+    with open(f"{path}.lock", "a+") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def load_data(file):
+    if os.path.exists(file):
+        with open(file, "r") as f, metrics.timed_io("load", file) as io:
+            io.bytes = os.fstat(f.fileno()).st_size
+            try:
+                # Use a specific check for AI predictions file
+                if file == AI_PREDICTIONS_FILE:
+                    data = json.load(f)
+                    return data if isinstance(data, list) else []
+                # Original logic for other files
+                data = json.load(f)
+                if file == ISSUES_FILE:
+                    return data if isinstance(data, dict) else {}
+                else:
+                    return data if data else []
+            except json.JSONDecodeError as e:
+                # Returning an empty structure here would let the next save wipe the file
+                raise CorruptDataError(f"{file} is not valid JSON: {e}") from e
+
+    # Return appropriate empty data structure if file doesn't exist
+    return [] if file == AI_PREDICTIONS_FILE else {} if file == ISSUES_FILE else []
+
+
+def save_data(file, data):
+    """Writes to a temp file and renames it over `file`, so readers never see half a file."""
+    directory = os.path.dirname(os.path.abspath(file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f, metrics.timed_io("save", file) as io:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+            io.bytes = os.fstat(f.fileno()).st_size
+        os.replace(tmp_path, file)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+class ReadCache:
+    """Parsed JSON files, and structures derived from them, kept per process.
+
+    Every lookup stats the file and reuses the entry only if its mtime and
+    size are unchanged, so writes from any process (always a rename, see
+    save_data) are picked up by the next read. Entries are evicted least
+    recently used first once their files add up to `max_bytes`.
+
+    Cached values are shared between callers and must not be mutated;
+    read-modify-write paths call load_data directly.
+    """
+
+    def __init__(self, max_bytes=READ_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (path, view) -> (stamp, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, file, view=None):
+        """load_data(file), or `view(load_data(file))` when a view is given."""
+        st = _stat(file)
+        stamp = (st.st_mtime_ns, st.st_size) if st else None
+        key = (os.path.abspath(file), view)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # Parse outside the lock; if the file changes meanwhile the stamp
+        # no longer matches and the next lookup parses again
+        data = load_data(file)
+        value = view(data) if view else data
+        size = st.st_size if st else 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (stamp, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes}
+
+
+read_cache = ReadCache()
+
+
+# Views over the parsed files, cached by ReadCache next to the parse itself
+def _as_list(data):
+    return data if isinstance(data, list) else []
+
+
+def _by_email(records):
+    return {r["email"]: r for r in _as_list(records)}
+
+
+def _flatten_issue_lists(all_issues):
+    issues = []
+    if isinstance(all_issues, dict):
+        for issues_list in all_issues.values():
+            if isinstance(issues_list, list):
+                issues.extend(i for i in issues_list if isinstance(i, dict))
+    return issues
+
+
+def _issue_lists_by_user(all_issues):
+    lists = {}
+    if isinstance(all_issues, dict):
+        for key, issues_list in all_issues.items():
+            lists.setdefault(key.lower(), issues_list if isinstance(issues_list, list) else [])
+    return lists
+
+
+def _by_pincode(records):
+    grouped = {}
+    for r in records:
+        grouped.setdefault(r.get("pincode"), []).append(r)
+    return grouped
+
+
+def _issues_by_pincode(all_issues):
+    return _by_pincode(_flatten_issue_lists(all_issues))
+
+
+def _issues_by_id(all_issues):
+    return {i.get("id"): i for i in _flatten_issue_lists(all_issues)}
+
+
+def _predictions_by_pincode(predictions):
+    return _by_pincode(_as_list(predictions))
+
+
+# ------------------- Legacy JSON Backend ------------------- #
+class FlatFileStorage:
+    """Users, officials and AI predictions in the original flat JSON files.
+
+    The part of the JSON backends that does not depend on where issues are
+    kept; subclasses add the issues, including `_add_issue_upvotes` for
+    `apply_upvotes`. Writes parse and rewrite a whole file under
+    `_locked()`; reads are served from `read_cache` and return shared,
+    read-only records.
+    """
+
+    def __init__(self, users_file=USERS_FILE, officials_file=OFFICIALS_FILE, predictions_file=AI_PREDICTIONS_FILE):
+        self.users_file = users_file
+        self.officials_file = officials_file
+        self.predictions_file = predictions_file
+
+    def _locked(self):
+        return file_lock(self.users_file)
+
+    def _load_predictions(self):
+        data = load_data(self.predictions_file)
+        return data if isinstance(data, list) else []
+
+    def _load_users(self):
+        return _as_list(load_data(self.users_file))
+
+    def _load_officials(self):
+        return _as_list(load_data(self.officials_file))
+
+    # Users
+    def list_users(self):
+        return list(read_cache.get(self.users_file, _as_list))
+
+    def get_user(self, email):
+        return read_cache.get(self.users_file, _by_email).get(email)
+
+    def add_user(self, user):
+        with self._locked():
+            users = self._load_users()
+            if any(u["email"] == user["email"] for u in users):
+                return False
+            users.append(user)
+            save_data(self.users_file, users)
+            return True
+
+    # Officials
+    def list_officials(self):
+        return list(read_cache.get(self.officials_file, _as_list))
+
+    def get_official(self, email):
+        return read_cache.get(self.officials_file, _by_email).get(email)
+
+    def add_official(self, official):
+        with self._locked():
+            officials = self._load_officials()
+            if any(o["email"] == official["email"] for o in officials):
+                return False
+            officials.append(official)
+            save_data(self.officials_file, officials)
+            return True
+
+    # AI predictions
+    def list_predictions(self):
+        return list(read_cache.get(self.predictions_file, _as_list))
+
+    def predictions_for_pincode(self, pincode):
+        return list(read_cache.get(self.predictions_file, _predictions_by_pincode).get(pincode, []))
+
+    def replace_predictions(self, predictions):
+        with self._locked():
+            save_data(self.predictions_file, list(predictions))
+
+    def upvote_prediction(self, email, predicted_issue, pincode, expected_date):
+        """Adds one upvote from `email`; returns False if already voted or not found."""
+        with self._locked():
+            users = self._load_users()
+            user = next((u for u in users if u["email"] == email), None)
+            key = prediction_key(predicted_issue, pincode, expected_date)
+            if user is None or key in user.setdefault("upvoted_ai_predictions", []):
+                return False
+            predictions = self._load_predictions()
+            for p in predictions:
+                if (p.get("predicted_issue") == predicted_issue and
+                        p.get("pincode") == pincode and
+                        p.get("expected_date") == expected_date):
+                    p["upvotes"] = int(p.get("upvotes", 0)) + 1
+                    break
+            else:
+                return False
+            save_data(self.predictions_file, predictions)
+            user["upvoted_ai_predictions"].append(key)
+            save_data(self.users_file, users)
+            return True
+
+    def apply_upvotes(self, votes):
+        """Applies a batch of upvotes with one rewrite of each file touched.
+
+        `votes` are (kind, email, target) tuples: kind "issue" with an issue
+        id, or "prediction" with (predicted_issue, pincode, expected_date).
+        Votes already recorded, or whose user or target is gone, are skipped;
+        returns how many were applied.
+        """
+        with self._locked():
+            users = self._load_users()
+            by_email = {u["email"]: u for u in users}
+            accepted, seen = [], set()
+            for kind, email, target in votes:
+                user = by_email.get(email)
+                field, key = _vote_field(kind, target)
+                if user is None or (email, field, key) in seen or key in user.get(field, []):
+                    continue
+                seen.add((email, field, key))
+                accepted.append((user, field, key, kind, target))
+            issue_counts = Counter(t for *_, k, t in accepted if k == "issue")
+            found = {"issue": self._add_issue_upvotes(issue_counts) if issue_counts else set(), "prediction": set()}
+            prediction_counts = Counter(t for *_, k, t in accepted if k == "prediction")
+            if prediction_counts:
+                predictions = self._load_predictions()
+                for p in predictions:
+                    key = (p.get("predicted_issue"), p.get("pincode"), p.get("expected_date"))
+                    if key in prediction_counts and key not in found["prediction"]:
+                        p["upvotes"] = int(p.get("upvotes", 0)) + prediction_counts[key]
+                        found["prediction"].add(key)
+                if found["prediction"]:
+                    save_data(self.predictions_file, predictions)
+            applied = 0
+            for user, field, key, kind, target in accepted:
+                if target in found[kind]:
+                    user.setdefault(field, []).append(key)
+                    applied += 1
+            if applied:
+                save_data(self.users_file, users)
+            return applied
+
+
+class JSONStorage(FlatFileStorage):
+    """Keeps everything in the original flat JSON files.
+
+    Every write parses and rewrites a whole file, so this adapter is only
+    meant for small deployments and as the source for `migrate`. Writes hold
+    a lock file next to the issues file so concurrent workers serialize their
+    read-modify-write cycles. Reads are served from `read_cache` and return
+    shared, read-only records.
+    """
+
+    def __init__(self, users_file=USERS_FILE, officials_file=OFFICIALS_FILE,
+                 issues_file=ISSUES_FILE, predictions_file=AI_PREDICTIONS_FILE):
+        super().__init__(users_file, officials_file, predictions_file)
+        self.issues_file = issues_file
+
+    def _locked(self):
+        return file_lock(self.issues_file)
+
+    def version(self):
+        """Size and mtime of the users, issues and predictions files."""
+        stamps = []
+        for f in (self.users_file, self.issues_file, self.predictions_file):
+            st = _stat(f)
+            stamps.append((st.st_mtime_ns, st.st_size) if st else None)
+        return tuple(stamps)
+
+    def changes_since(self, version):
+        """The flat files carry no row revisions, so any change means a full reload."""
+        current = self.version()
+        if version is not None and current[:2] == version[:2]:  # predictions are not indexed
+            return current, [], [], False
+        # Fresh copies: the repository takes ownership of (and mutates) these
+        return current, self._load_users(), _flatten_issue_lists(self._load_issues()), True
+
+    def _load_issues(self):
+        data = load_data(self.issues_file)
+        return data if isinstance(data, dict) else {}
+
+    # Issues
+    def list_issues(self):
+        return list(read_cache.get(self.issues_file, _flatten_issue_lists))
+
+    def issues_for_user(self, username):
+        return list(read_cache.get(self.issues_file, _issue_lists_by_user).get(f"{username.lower()}_issues", []))
+
+    def issues_for_pincode(self, pincode):
+        return list(read_cache.get(self.issues_file, _issues_by_pincode).get(pincode, []))
+
+    def get_issue(self, issue_id):
+        return read_cache.get(self.issues_file, _issues_by_id).get(issue_id)
+
+    def add_issue(self, issue):
+        issue.setdefault("id", new_issue_id())
+        with self._locked():
+            all_issues = self._load_issues()
+            all_issues.setdefault(f"{issue['username']}_issues", []).append(issue)
+            save_data(self.issues_file, all_issues)
+            return issue
+
+    def add_issues(self, issues):
+        """Adds a batch with one rewrite of the file, skipping ids already stored; returns how many were added."""
+        with self._locked():
+            all_issues = self._load_issues()
+            known = {i.get("id") for i in _flatten_issue_lists(all_issues)}
+            added = 0
+            for issue in issues:
+                issue.setdefault("id", new_issue_id())
+                if issue["id"] in known:
+                    continue
+                known.add(issue["id"])
+                all_issues.setdefault(f"{issue['username']}_issues", []).append(issue)
+                added += 1
+            if added:
+                save_data(self.issues_file, all_issues)
+            return added
+
+    def _find_issue(self, all_issues, issue_id):
+        for issues_list in all_issues.values():
+            if isinstance(issues_list, list):
+                for issue in issues_list:
+                    if issue.get("id") == issue_id:
+                        return issue
+        return None
+
+    def backfill_issue_ids(self):
+        """Gives pre-ID issues a generated id and rewrites title-based upvotes to use it."""
+        with self._locked():
+            all_issues = self._load_issues()
+            legacy = {}
+            changed = False
+            for issues_list in all_issues.values():
+                if isinstance(issues_list, list):
+                    for issue in issues_list:
+                        if not issue.get("id"):
+                            issue["id"] = new_issue_id()
+                            changed = True
+                        legacy.setdefault(issue_key(issue.get("title"), issue.get("pincode"),
+                                                    issue.get("username")), issue["id"])
+            if changed:
+                save_data(self.issues_file, all_issues)
+
+            users = self._load_users()
+            users_changed = False
+            for user in users:
+                upvoted = user.get("upvoted_issues", [])
+                converted = list(dict.fromkeys(legacy.get(k, k) for k in upvoted))
+                if converted != upvoted:
+                    user["upvoted_issues"] = converted
+                    users_changed = True
+            if users_changed:
+                save_data(self.users_file, users)
+
+    def upvote_issue(self, email, issue_id):
+        """Adds one upvote from `email`; returns False if already voted or not found."""
+        with self._locked():
+            users = self._load_users()
+            user = next((u for u in users if u["email"] == email), None)
+            if user is None or issue_id in user.setdefault("upvoted_issues", []):
+                return False
+            all_issues = self._load_issues()
+            issue = self._find_issue(all_issues, issue_id)
+            if issue is None:
+                return False
+            issue["upvotes"] = issue.get("upvotes", 0) + 1
+            save_data(self.issues_file, all_issues)
+            user["upvoted_issues"].append(issue_id)
+            save_data(self.users_file, users)
+            return True
+
+    def set_issue_status(self, issue_id, status, actor=None):
+        """`actor` (who made the change) is only kept by the event log backend."""
+        with self._locked():
+            all_issues = self._load_issues()
+            issue = self._find_issue(all_issues, issue_id)
+            if issue is None:
+                return False
+            issue["status"] = status
+            save_data(self.issues_file, all_issues)
+            return True
+
+    def raise_issue_upvotes(self, issue_id, upvotes):
+        """Sets the upvote count to `upvotes` if that is higher than the stored one."""
+        with self._locked():
+            all_issues = self._load_issues()
+            issue = self._find_issue(all_issues, issue_id)
+            if issue is None or issue.get("upvotes", 0) >= upvotes:
+                return False
+            issue["upvotes"] = upvotes
+            save_data(self.issues_file, all_issues)
+            return True
+
+    def toggle_issue_status(self, issue_id, actor=None):
+        """Flips an issue between Pending and Resolved."""
+        with self._locked():
+            all_issues = self._load_issues()
+            issue = self._find_issue(all_issues, issue_id)
+            if issue is None:
+                return False
+            issue["status"] = "Resolved" if issue.get("status") == "Pending" else "Pending"
+            save_data(self.issues_file, all_issues)
+            return True
+
+    def rollups(self, group_by=(), **filters):
+        """Issue and upvote totals per `group_by` cell, restricted to `filters`.
+
+        The JSON files keep no counters, so this is a scan of every issue.
+        """
+        return rollups_of(self.list_issues(), group_by, filters)
+
+    def _add_issue_upvotes(self, counts):
+        """Adds `counts` (issue id -> votes) with one rewrite; returns the ids found."""
+        all_issues = self._load_issues()
+        found = set()
+        for issue in _flatten_issue_lists(all_issues):
+            if issue.get("id") in counts and issue["id"] not in found:
+                issue["upvotes"] = issue.get("upvotes", 0) + counts[issue["id"]]
+                found.add(issue["id"])
+        if found:
+            save_data(self.issues_file, all_issues)
+        return found
+
+
+def _vote_field(kind, target):
+    """The user field a vote is recorded in, and the value recorded there."""
+    if kind == "issue":
+        return "upvoted_issues", target
+    return "upvoted_ai_predictions", prediction_key(*target)
+
+
+# ------------------- SQLite Backend ------------------- #
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    password TEXT NOT NULL,
+    pincode TEXT,
+    rev INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS officials (
+    email TEXT PRIMARY KEY,
+    dept TEXT,
+    name TEXT,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT,
+    username TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    pincode TEXT,
+    lat TEXT,
+    lng TEXT,
+    category TEXT,
+    priority TEXT,
+    photo TEXT,
+    anonymous INTEGER NOT NULL DEFAULT 0,
+    upvotes INTEGER NOT NULL DEFAULT 0,
+    date TEXT,
+    time TEXT,
+    month TEXT,
+    status TEXT NOT NULL DEFAULT 'Pending',
+    rev INTEGER NOT NULL DEFAULT 0
+);
+-- issue_key holds the issue's uid (older rows held title__pincode__username)
+CREATE TABLE IF NOT EXISTS issue_votes (
+    email TEXT NOT NULL,
+    issue_key TEXT NOT NULL,
+    PRIMARY KEY (email, issue_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pincode TEXT,
+    predicted_issue TEXT,
+    expected_date TEXT,
+    description TEXT,
+    priority TEXT,
+    upvotes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS prediction_votes (
+    email TEXT NOT NULL,
+    prediction_key TEXT NOT NULL,
+    PRIMARY KEY (email, prediction_key)
+) WITHOUT ROWID;
+-- Dashboard counters, kept in step with issues by the triggers in ROLLUP_TRIGGERS
+CREATE TABLE IF NOT EXISTS rollups (
+    category TEXT NOT NULL,
+    pincode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    month TEXT NOT NULL,
+    issues INTEGER NOT NULL DEFAULT 0,
+    upvotes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, pincode, status, priority, month)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+# Columns added after the first release; older databases get them via ALTER TABLE
+UPGRADE_COLUMNS = {
+    "users": {"rev": "INTEGER NOT NULL DEFAULT 0"},
+    "issues": {"rev": "INTEGER NOT NULL DEFAULT 0", "uid": "TEXT"},
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_users_rev ON users (rev);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_issues_uid ON issues (uid);
+CREATE INDEX IF NOT EXISTS idx_issues_owner ON issues (username, title, pincode);
+CREATE INDEX IF NOT EXISTS idx_issues_pincode ON issues (pincode);
+CREATE INDEX IF NOT EXISTS idx_issues_title ON issues (title);
+CREATE INDEX IF NOT EXISTS idx_issues_rev ON issues (rev);
+CREATE INDEX IF NOT EXISTS idx_predictions_lookup ON predictions (pincode, predicted_issue, expected_date);
+"""
+
+# Run inside whatever statement touches `issues`, so the counters commit or
+# roll back together with the issue row itself. Cells match rollup_dims
+_ROLLUP_CELL = ("coalesce({r}.category, ''), coalesce({r}.pincode, ''), {r}.status, "
+                "upper(substr(coalesce({r}.priority, ''), 1, 1)) || lower(substr(coalesce({r}.priority, ''), 2)), "
+                "coalesce(substr({r}.date, 1, 7), '')")
+_ROLLUP_ADD = f"""
+    INSERT INTO rollups (category, pincode, status, priority, month, issues, upvotes)
+    VALUES ({_ROLLUP_CELL.format(r="NEW")}, 1, NEW.upvotes)
+    ON CONFLICT (category, pincode, status, priority, month) DO UPDATE SET issues = issues + 1, upvotes = upvotes + excluded.upvotes;"""
+_ROLLUP_SUBTRACT = f"""
+    UPDATE rollups SET issues = issues - 1, upvotes = upvotes - OLD.upvotes
+    WHERE (category, pincode, status, priority, month) = ({_ROLLUP_CELL.format(r="OLD")});
+    DELETE FROM rollups WHERE issues = 0;"""
+ROLLUP_TRIGGERS = {
+    "rollups_issue_insert": f"AFTER INSERT ON issues BEGIN{_ROLLUP_ADD}\nEND",
+    "rollups_issue_update": "AFTER UPDATE OF category, pincode, status, priority, date, upvotes ON issues "
+                            f"BEGIN{_ROLLUP_SUBTRACT}{_ROLLUP_ADD}\nEND",
+    "rollups_issue_delete": f"AFTER DELETE ON issues BEGIN{_ROLLUP_SUBTRACT}\nEND",
+}
+# Bumped whenever _ROLLUP_CELL changes: older databases get new triggers and rebuilt counters
+ROLLUP_FORMAT = 2
+
+ISSUE_COLUMNS = ("uid", "username", "title", "description", "pincode", "lat", "lng", "category", "priority",
+                 "photo", "anonymous", "upvotes", "date", "time", "month", "status")
+
+
+def _issue_row(issue):
+    location = issue.get("location") or {}
+    row = {f: issue.get(f) for f in ISSUE_COLUMNS if f not in ("uid", "lat", "lng")}
+    row["uid"] = issue.get("id")
+    row["lat"] = location.get("lat")
+    row["lng"] = location.get("lng")
+    row["anonymous"] = int(bool(row["anonymous"]))
+    row["upvotes"] = int(row["upvotes"] or 0)
+    row["status"] = row["status"] or "Pending"
+    return row
+
+
+def _issue_dict(row):
+    """Rebuilds the legacy issue dict (nested location, bool anonymous)."""
+    issue = {f: row[f] for f in ISSUE_FIELDS if f != "id"}
+    issue["id"] = row["uid"]
+    issue["location"] = {"lat": row["lat"], "lng": row["lng"]}
+    issue["anonymous"] = bool(row["anonymous"])
+    return issue
+
+
+class SQLiteStorage:
+    """Row-level storage in a single SQLite database running in WAL mode.
+
+    Each worker thread gets its own connection; writes run inside
+    `BEGIN IMMEDIATE` transactions so a read-modify-write never interleaves
+    with another writer. Every write bumps a global version counter and
+    stamps the touched users/issues rows with it (`rev`), which lets
+    `changes_since` hand out deltas to in-process indexes.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        db = self._connect()
+        db.executescript(SCHEMA)
+        for table, columns in UPGRADE_COLUMNS.items():
+            existing = {r["name"] for r in db.execute(f"PRAGMA table_info({table})")}
+            for name, decl in columns.items():
+                if name not in existing:
+                    db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+        db.executescript(INDEXES)
+        with self._transaction() as db:
+            stored = db.execute("SELECT value FROM meta WHERE key = 'rollup_format'").fetchone()
+            outdated = stored is None or stored[0] != ROLLUP_FORMAT  # or predates the rollups table
+            for name, body in ROLLUP_TRIGGERS.items():
+                if outdated:
+                    db.execute(f"DROP TRIGGER IF EXISTS {name}")
+                db.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+            if outdated:
+                self._rebuild_rollups(db)
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rollup_format', ?)", (ROLLUP_FORMAT,))
+        if db.execute("SELECT 1 FROM issues WHERE uid IS NULL LIMIT 1").fetchone():
+            self.backfill_issue_ids()
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    def _bump(self, db):
+        """Advances the version counter inside the current transaction."""
+        return db.execute("UPDATE meta SET value = value + 1 WHERE key = 'version' RETURNING value").fetchone()[0]
+
+    def version(self):
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def changes_since(self, version):
+        """Returns (version, users, issues, full) for rows written after `version`."""
+        since = -1 if version is None else version
+        db = self._connect()
+        db.execute("BEGIN")  # one read snapshot for the counter and both tables
+        try:
+            current = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            users = [self._user_dict(db, r) for r in db.execute(
+                "SELECT * FROM users WHERE rev > ? ORDER BY rowid", (since,))]
+            issues = [_issue_dict(r) for r in db.execute(
+                "SELECT * FROM issues WHERE rev > ? ORDER BY id", (since,))]
+        finally:
+            db.execute("COMMIT")
+        return current, users, issues, version is None
+
+    def is_empty(self):
+        db = self._connect()
+        return not any(
+            db.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+            for table in ("users", "officials", "issues", "predictions")
+        )
+
+    # Users
+    def _user_dict(self, db, row):
+        user = {f: row[f] for f in ("email", "username", "password", "pincode")}
+        user["upvoted_issues"] = [r[0] for r in db.execute(
+            "SELECT issue_key FROM issue_votes WHERE email = ?", (row["email"],))]
+        user["upvoted_ai_predictions"] = [r[0] for r in db.execute(
+            "SELECT prediction_key FROM prediction_votes WHERE email = ?", (row["email"],))]
+        return user
+
+    def list_users(self):
+        db = self._connect()
+        return [self._user_dict(db, row) for row in db.execute("SELECT * FROM users ORDER BY rowid")]
+
+    def get_user(self, email):
+        db = self._connect()
+        row = db.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+        return self._user_dict(db, row) if row else None
+
+    def add_user(self, user):
+        with self._transaction() as db:
+            cur = db.execute(
+                "INSERT OR IGNORE INTO users (email, username, password, pincode) VALUES (?, ?, ?, ?)",
+                (user["email"], user["username"], user["password"], user.get("pincode", "")))
+            if cur.rowcount == 0:
+                return False
+            db.execute("UPDATE users SET rev = ? WHERE email = ?", (self._bump(db), user["email"]))
+            db.executemany("INSERT OR IGNORE INTO issue_votes VALUES (?, ?)",
+                           [(user["email"], k) for k in user.get("upvoted_issues", [])])
+            db.executemany("INSERT OR IGNORE INTO prediction_votes VALUES (?, ?)",
+                           [(user["email"], k) for k in user.get("upvoted_ai_predictions", [])])
+        return True
+
+    # Officials
+    def list_officials(self):
+        return [dict(row) for row in self._connect().execute("SELECT * FROM officials ORDER BY rowid")]
+
+    def get_official(self, email):
+        row = self._connect().execute("SELECT * FROM officials WHERE email = ?", (email,)).fetchone()
+        return dict(row) if row else None
+
+    def add_official(self, official):
+        with self._transaction() as db:
+            cur = db.execute(
+                "INSERT OR IGNORE INTO officials (email, dept, name, password) VALUES (?, ?, ?, ?)",
+                (official["email"], official.get("dept"), official.get("name"), official["password"]))
+        return cur.rowcount > 0
+
+    # Issues
+    def list_issues(self):
+        return [_issue_dict(r) for r in self._connect().execute("SELECT * FROM issues ORDER BY id")]
+
+    def issues_for_user(self, username):
+        return [_issue_dict(r) for r in self._connect().execute(
+            "SELECT * FROM issues WHERE username = ? COLLATE NOCASE ORDER BY id", (username,))]
+
+    def issues_for_pincode(self, pincode):
+        return [_issue_dict(r) for r in self._connect().execute(
+            "SELECT * FROM issues WHERE pincode = ? ORDER BY id", (pincode,))]
+
+    def get_issue(self, issue_id):
+        row = self._connect().execute("SELECT * FROM issues WHERE uid = ?", (issue_id,)).fetchone()
+        return _issue_dict(row) if row else None
+
+    def add_issue(self, issue):
+        issue.setdefault("id", new_issue_id())
+        row = _issue_row(issue)
+        with self._transaction() as db:
+            row["rev"] = self._bump(db)
+            db.execute(
+                f"INSERT INTO issues ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                tuple(row.values()))
+        return issue
+
+    def add_issues(self, issues):
+        """Adds a batch in one transaction, skipping ids already stored; returns how many were added."""
+        added = 0
+        with self._transaction() as db:
+            rev = self._bump(db)
+            for issue in issues:
+                issue.setdefault("id", new_issue_id())
+                row = dict(_issue_row(issue), rev=rev)
+                added += db.execute(
+                    f"INSERT OR IGNORE INTO issues ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                    tuple(row.values())).rowcount
+        return added
+
+    def iter_issues(self, pincode=None, date_from=None, date_to=None):
+        """Issues matching the filters, oldest first, streamed from a cursor."""
+        clauses = [(c, v) for c, v in (("pincode = ?", pincode), ("date >= ?", date_from), ("date <= ?", date_to))
+                   if v]
+        where = f" WHERE {' AND '.join(c for c, _ in clauses)}" if clauses else ""
+        rows = self._connect().execute(f"SELECT * FROM issues{where} ORDER BY date, time, uid",
+                                       tuple(v for _, v in clauses))
+        for row in rows:
+            yield _issue_dict(row)
+
+    def backfill_issue_ids(self):
+        """Gives pre-ID issues a generated uid and rewrites title-based votes to use it."""
+        with self._transaction() as db:
+            rev = self._bump(db)
+            missing = db.execute("SELECT id FROM issues WHERE uid IS NULL").fetchall()
+            db.executemany("UPDATE issues SET uid = ?, rev = ? WHERE id = ?",
+                           [(new_issue_id(), rev, r["id"]) for r in missing])
+            legacy = {}
+            for r in db.execute("SELECT uid, title, pincode, username FROM issues ORDER BY id"):
+                legacy.setdefault(issue_key(r["title"], r["pincode"], r["username"]), r["uid"])
+            for vote in db.execute("SELECT email, issue_key FROM issue_votes").fetchall():
+                uid = legacy.get(vote["issue_key"])
+                if uid is not None:
+                    db.execute("DELETE FROM issue_votes WHERE email = ? AND issue_key = ?",
+                               (vote["email"], vote["issue_key"]))
+                    db.execute("INSERT OR IGNORE INTO issue_votes (email, issue_key) VALUES (?, ?)",
+                               (vote["email"], uid))
+                    db.execute("UPDATE users SET rev = ? WHERE email = ?", (rev, vote["email"]))
+
+    def upvote_issue(self, email, issue_id):
+        """Adds one upvote from `email`; returns False if already voted or not found."""
+        with self._transaction() as db:
+            if db.execute("SELECT 1 FROM issues WHERE uid = ?", (issue_id,)).fetchone() is None:
+                return False
+            cur = db.execute("INSERT OR IGNORE INTO issue_votes (email, issue_key) "
+                             "SELECT email, ? FROM users WHERE email = ?", (issue_id, email))
+            if cur.rowcount == 0:
+                return False
+            rev = self._bump(db)
+            db.execute("UPDATE issues SET upvotes = upvotes + 1, rev = ? WHERE uid = ?", (rev, issue_id))
+            db.execute("UPDATE users SET rev = ? WHERE email = ?", (rev, email))
+        return True
+
+    def set_issue_status(self, issue_id, status, actor=None):
+        """`actor` (who made the change) is only kept by the event log backend."""
+        with self._transaction() as db:
+            cur = db.execute("UPDATE issues SET status = ?, rev = ? WHERE uid = ?",
+                             (status, self._bump(db), issue_id))
+        return cur.rowcount > 0
+
+    def raise_issue_upvotes(self, issue_id, upvotes):
+        """Sets the upvote count to `upvotes` if that is higher than the stored one."""
+        with self._transaction() as db:
+            cur = db.execute("UPDATE issues SET upvotes = ?, rev = ? WHERE uid = ? AND upvotes < ?",
+                             (upvotes, self._bump(db), issue_id, upvotes))
+        return cur.rowcount > 0
+
+    def toggle_issue_status(self, issue_id, actor=None):
+        """Flips an issue between Pending and Resolved."""
+        with self._transaction() as db:
+            cur = db.execute(
+                "UPDATE issues SET status = CASE status WHEN 'Pending' THEN 'Resolved' ELSE 'Pending' END, rev = ? "
+                "WHERE uid = ?", (self._bump(db), issue_id))
+        return cur.rowcount > 0
+
+    def rollups(self, group_by=(), **filters):
+        """Issue and upvote totals per `group_by` cell, restricted to `filters`.
+
+        Reads only the rollups table, so the cost depends on the number of
+        distinct cells, not on the number of issues.
+        """
+        _check_rollup_args(group_by, filters)
+        filters = rollup_filters(filters)
+        columns = ", ".join(group_by)
+        sql = f"SELECT {columns + ', ' if columns else ''}SUM(issues) AS issues, SUM(upvotes) AS upvotes FROM rollups"
+        if filters:
+            sql += " WHERE " + " AND ".join(f"{f} = ?" for f in filters)
+        if columns:
+            sql += f" GROUP BY {columns} ORDER BY {columns}"
+        rows = self._connect().execute(sql, tuple(filters.values()))
+        return [{**{f: r[f] for f in group_by}, "issues": r["issues"] or 0, "upvotes": r["upvotes"] or 0}
+                for r in rows]
+
+    def rebuild_rollups(self):
+        """Recomputes the rollups table from the issues table; returns the cell count."""
+        with self._transaction() as db:
+            return self._rebuild_rollups(db)
+
+    def _rebuild_rollups(self, db):
+        db.execute("DELETE FROM rollups")
+        db.execute(
+            "INSERT INTO rollups (category, pincode, status, priority, month, issues, upvotes) "
+            f"SELECT {_ROLLUP_CELL.format(r='issues')}, COUNT(*), SUM(upvotes) FROM issues "
+            "GROUP BY 1, 2, 3, 4, 5")
+        return db.execute("SELECT COUNT(*) FROM rollups").fetchone()[0]
+
+    # AI predictions
+    def list_predictions(self):
+        return [{f: r[f] for f in PREDICTION_FIELDS}
+                for r in self._connect().execute("SELECT * FROM predictions ORDER BY id")]
+
+    def predictions_for_pincode(self, pincode):
+        return [{f: r[f] for f in PREDICTION_FIELDS} for r in self._connect().execute(
+            "SELECT * FROM predictions WHERE pincode = ? ORDER BY id", (pincode,))]
+
+    def replace_predictions(self, predictions):
+        with self._transaction() as db:
+            self._bump(db)  # so cached responses that include predictions are invalidated
+            db.execute("DELETE FROM predictions")
+            db.executemany(
+                f"INSERT INTO predictions ({', '.join(PREDICTION_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                [tuple(int(p.get(f) or 0) if f == "upvotes" else p.get(f) for f in PREDICTION_FIELDS)
+                 for p in predictions])
+
+    def upvote_prediction(self, email, predicted_issue, pincode, expected_date):
+        """Adds one upvote from `email`; returns False if already voted or not found."""
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT id FROM predictions WHERE pincode = ? AND predicted_issue = ? AND expected_date = ? "
+                "ORDER BY id LIMIT 1", (pincode, predicted_issue, expected_date)).fetchone()
+            if row is None:
+                return False
+            cur = db.execute("INSERT OR IGNORE INTO prediction_votes (email, prediction_key) "
+                             "SELECT email, ? FROM users WHERE email = ?",
+                             (prediction_key(predicted_issue, pincode, expected_date), email))
+            if cur.rowcount == 0:
+                return False
+            db.execute("UPDATE predictions SET upvotes = upvotes + 1 WHERE id = ?", (row["id"],))
+            db.execute("UPDATE users SET rev = ? WHERE email = ?", (self._bump(db), email))
+        return True
+
+    def apply_upvotes(self, votes):
+        """Applies a batch of (kind, email, target) upvotes in one transaction (see
+        JSONStorage.apply_upvotes); returns how many were applied."""
+        applied = 0
+        with self._transaction() as db:
+            rev = self._bump(db)
+            for kind, email, target in votes:
+                if kind == "issue":
+                    if db.execute("SELECT 1 FROM issues WHERE uid = ?", (target,)).fetchone() is None:
+                        continue
+                    if not db.execute("INSERT OR IGNORE INTO issue_votes (email, issue_key) "
+                                      "SELECT email, ? FROM users WHERE email = ?", (target, email)).rowcount:
+                        continue
+                    db.execute("UPDATE issues SET upvotes = upvotes + 1, rev = ? WHERE uid = ?", (rev, target))
+                else:
+                    row = db.execute(
+                        "SELECT id FROM predictions WHERE pincode = ? AND predicted_issue = ? AND expected_date = ? "
+                        "ORDER BY id LIMIT 1", (target[1], target[0], target[2])).fetchone()
+                    if row is None or not db.execute(
+                            "INSERT OR IGNORE INTO prediction_votes (email, prediction_key) "
+                            "SELECT email, ? FROM users WHERE email = ?", (prediction_key(*target), email)).rowcount:
+                        continue
+                    db.execute("UPDATE predictions SET upvotes = upvotes + 1 WHERE id = ?", (row["id"],))
+                db.execute("UPDATE users SET rev = ? WHERE email = ?", (rev, email))
+                applied += 1
+        return applied
+
+
+# ------------------- Migration ------------------- #
+def migrate_json_to_sqlite(source, target):
+    """Copies every record from a JSONStorage into an empty SQLiteStorage."""
+    if not target.is_empty():
+        raise RuntimeError(f"{target.path} already contains data; refusing to migrate twice")
+    for user in source.list_users():
+        target.add_user(user)
+    for official in source.list_officials():
+        target.add_official(official)
+    rows = [_issue_row(i) for i in source.list_issues()]
+    with target._transaction() as db:
+        db.executemany(
+            f"INSERT INTO issues ({', '.join(ISSUE_COLUMNS)}) VALUES ({', '.join('?' * len(ISSUE_COLUMNS))})",
+            [tuple(r[c] for c in ISSUE_COLUMNS) for r in rows])
+    target.replace_predictions(source.list_predictions())
+    target.backfill_issue_ids()
+    return len(rows)
+
+
+def get_storage(backend=STORAGE_BACKEND, path=DB_FILE):
+    """Returns the configured backend, seeding a new database from the JSON files."""
+    if backend == "json":
+        storage = JSONStorage()
+        storage.backfill_issue_ids()
+        return storage
+    if backend == "eventlog":
+        from eventlog import LOG_DIR, EventLogStorage
+        return EventLogStorage(LOG_DIR, seed=JSONStorage())
+    if backend == "sharded":
+        from shards import SHARD_DIR, ShardedStorage
+        return ShardedStorage(SHARD_DIR, seed=JSONStorage())
+    if backend != "sqlite":
+        raise ValueError(f"Unknown storage backend: {backend}")
+    storage = SQLiteStorage(path)
+    if storage.is_empty():
+        migrate_json_to_sqlite(JSONStorage(), storage)
+    return storage
+
+
+def reconcile_user_files(storage, directory="."):
+    """Merges leftover {username}_issues.json files into `storage`.
+
+    Older versions wrote every issue both to the central store and to a
+    per-user file, and upvotes could reach one copy but not the other. An
+    issue found in both keeps the higher upvote count; one found only in the
+    per-user file is added. Merged files are renamed to *.merged.
+    Returns (added, updated, files).
+    """
+    added = updated = files = 0
+    central = os.path.abspath(os.path.join(directory, ISSUES_FILE))
+    for path in sorted(glob.glob(os.path.join(directory, "*_issues.json"))):
+        if os.path.abspath(path) == central:
+            continue
+        username = os.path.basename(path)[:-len("_issues.json")]
+        own_issues = load_data(path)
+        if not isinstance(own_issues, list):
+            continue
+        existing = storage.issues_for_user(username)
+        for own in own_issues:
+            if not isinstance(own, dict):
+                continue
+            match = next((i for i in existing if (own.get("id") and i.get("id") == own["id"]) or (
+                i.get("title") == own.get("title") and i.get("pincode") == own.get("pincode") and
+                i.get("date") == own.get("date") and i.get("time") == own.get("time"))), None)
+            if match is None:
+                issue = dict(own)
+                issue["username"] = username
+                issue.setdefault("status", "Pending")
+                storage.add_issue(issue)
+                existing.append(issue)
+                added += 1
+            elif storage.raise_issue_upvotes(match["id"], int(own.get("upvotes") or 0)):
+                updated += 1
+        os.replace(path, f"{path}.merged")
+        files += 1
+    return added, updated, files
+
+
+# ------------------- Concurrency Stress Check ------------------- #
+_stress_storage = None
+
+
+def _open_storage(backend, directory):
+    if backend == "json":
+        return JSONStorage(*(os.path.join(directory, f) for f in
+                             (USERS_FILE, OFFICIALS_FILE, ISSUES_FILE, AI_PREDICTIONS_FILE)))
+    if backend == "eventlog":
+        from eventlog import EventLogStorage
+        return EventLogStorage(os.path.join(directory, "eventlog"))
+    if backend == "sharded":
+        from shards import ShardedStorage
+        return ShardedStorage(os.path.join(directory, "shards"), *(os.path.join(directory, f) for f in
+                                                                   (USERS_FILE, OFFICIALS_FILE, AI_PREDICTIONS_FILE)))
+    return SQLiteStorage(os.path.join(directory, DB_FILE))
+
+
+def _stress_vote(args):
+    global _stress_storage
+    backend, directory, voters, buffered = args
+    if _stress_storage is None:
+        _stress_storage = _open_storage(backend, directory)
+        if buffered:
+            from upvotes import UpvoteBuffer
+            # Flushed by hand below, so no worker exits in the middle of writing a batch
+            _stress_storage = UpvoteBuffer(_stress_storage, os.path.join(directory, "upvote_journal"),
+                                           interval=3600, max_votes=float("inf"))
+    accepted = sum(_stress_storage.upvote_issue(f"voter{voter}@example.com", "stress-issue") for voter in voters)
+    if buffered:
+        _stress_storage.flush()
+    return accepted
+
+
+def stress_upvotes(backend, workers=8, votes=2000, buffered=False):
+    """Fires `votes` distinct upvotes at one issue from `workers` processes,
+    through an UpvoteBuffer (as the app does) when `buffered`.
+
+    Returns (accepted, final_count); any difference means a lost update.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        store = _open_storage(backend, directory)
+        issue = {"id": "stress-issue", "title": "Pothole", "description": "stress", "pincode": "500001",
+                 "location": {"lat": "17.4", "lng": "78.4"}, "category": "Potholes",
+                 "priority": "High", "photo": None, "anonymous": False, "upvotes": 0,
+                 "date": "2025-01-01", "time": "00:00:00", "month": "January",
+                 "username": "stress", "status": "Pending"}
+        voters = [{"email": f"voter{i}@example.com", "username": f"voter{i}", "password": "x",
+                   "pincode": "500001", "upvoted_issues": [], "upvoted_ai_predictions": []}
+                  for i in range(votes)]
+        if backend in ("json", "sharded"):
+            save_data(store.users_file, voters)
+        else:
+            for voter in voters:
+                store.add_user(voter)
+            if backend == "sqlite":
+                store.close()
+        store.add_issue(issue)
+        if backend == "sqlite":
+            store.close()
+
+        # Every voter votes twice; the second attempt must be rejected
+        voters = list(range(votes)) * 2
+        step = max(1, len(voters) // (workers * 8))
+        tasks = [(backend, directory, voters[i:i + step], buffered) for i in range(0, len(voters), step)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            accepted = sum(pool.map(_stress_vote, tasks))
+
+        final = store.issues_for_pincode("500001")[0]["upvotes"]
+        return accepted, final
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixora storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="one-shot copy of the JSON files into SQLite")
+    migrate.add_argument("--db", default=DB_FILE)
+    reconcile = sub.add_parser("reconcile", help="merge leftover {username}_issues.json files into storage")
+    reconcile.add_argument("--dir", default=".")
+    rollups = sub.add_parser("rebuild-rollups", help="recompute the dashboard counters from the issues table")
+    rollups.add_argument("--db", default=DB_FILE)
+    stress = sub.add_parser("stress", help="parallel upvotes against a scratch copy; checks none are lost")
+    stress.add_argument("--backend", choices=("sqlite", "json", "eventlog", "sharded"), default=STORAGE_BACKEND)
+    stress.add_argument("--workers", type=int, default=8)
+    stress.add_argument("--votes", type=int, default=2000)
+    stress.add_argument("--buffered", action="store_true", help="vote through the upvote buffer, as the app does")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        count = migrate_json_to_sqlite(JSONStorage(), SQLiteStorage(args.db))
+        print(f"✅ Migrated {count} issues into {args.db}")
+    elif args.command == "reconcile":
+        added, updated, files = reconcile_user_files(get_storage(), args.dir)
+        print(f"✅ Reconciled {files} per-user files: {added} issues added, {updated} upvote counts raised")
+    elif args.command == "rebuild-rollups":
+        cells = SQLiteStorage(args.db).rebuild_rollups()
+        print(f"✅ Rebuilt {cells} rollup cells in {args.db}")
+    elif args.command == "stress":
+        accepted, final = stress_upvotes(args.backend, args.workers, args.votes, args.buffered)
+        print(f"{args.backend}: {accepted} upvotes accepted, issue shows {final}")
+        if accepted != args.votes or final != args.votes:
+            raise SystemExit("❌ Lost or duplicated upvotes detected")
+        print("✅ No upvotes lost")
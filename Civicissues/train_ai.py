@@ -1,15 +1,48 @@
+import argparse
+import joblib
+import numpy as np
 import pandas as pd
 import json
 import os
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from itertools import chain, islice
+from pandas.api.types import union_categoricals
+
+from metrics import PhaseTimer
+from eventlog import replay_reported_issues
+from storage import STORAGE_BACKEND, get_storage, save_data  # atomic write-and-rename
 
 # File paths
-ISSUES_FILE = "issues.json"  # Ensure this matches your data file
 AI_PREDICTIONS_FILE = "ai_predictions.json"
 MIN_ISSUES_FOR_PREDICTION = 10  # Minimum issues per pincode to make a prediction
+PREPROCESS_CHUNK_ROWS = 100_000  # Issues turned into a frame at a time, bounding peak memory
+FEATURE_CATEGORIES = ('pincode', 'category', 'priority')  # Feature columns held as categoricals
+PREDICTION_HORIZON_DAYS = int(os.environ.get("FIXORA_PREDICTION_DAYS", 3))  # Days ahead to forecast
+
+# Fitted model, pincode codes and feature cache, reused by the next run
+MODEL_FILE = "ai_model.joblib"
+MODEL_ARTIFACT_VERSION = 2
+WARM_START_TREES = 10  # Trees grown per run that brings new issues
+MAX_TREES = 300  # Past this the forest is refit from scratch to keep it small
+
+# RandomForestClassifier settings; FIXORA_MODEL_PARAMS takes a JSON object of
+# overrides, e.g. '{"n_jobs": 4, "max_depth": 12}'. A saved forest keeps its
+# settings until the next from-scratch fit (train_ai.py --full)
+MODEL_PARAMS = {
+    "n_estimators": 100,
+    "random_state": 42,
+    "n_jobs": None,
+    **json.loads(os.environ.get("FIXORA_MODEL_PARAMS", "{}")),
+}
+
+# Partitioned mode: fit one model per group of neighbouring pincodes, in
+# parallel. 1 keeps the single city-wide model
+TRAIN_PARTITIONS = int(os.environ.get("FIXORA_TRAIN_PARTITIONS", 1))
+TRAIN_WORKERS = int(os.environ.get("FIXORA_TRAIN_WORKERS", os.cpu_count() or 1))
 
 # Map categories to human-friendly messages
 CATEGORY_MESSAGES = {
@@ -24,130 +57,278 @@ CATEGORY_MESSAGES = {
 }
 
 # ------------------- Helper Functions ------------------- #
-def load_data(file):
-    if os.path.exists(file):
-        with open(file, 'r') as f:
-            try:
-                data = json.load(f)
-                return data
-            except json.JSONDecodeError:
-                return {}
-    return {}
-
-def save_data(file, data):
-    with open(file, 'w') as f:
-        json.dump(data, f, indent=4)
+def load_issue_history():
+    """{username}_issues lists to train on, read from the app's storage so scheduled
+    retraining sees live reports; with the event log backend they are replayed
+    from the log's issue_reported events instead."""
+    if STORAGE_BACKEND == "eventlog":
+        return replay_reported_issues()
+    all_issues = {}
+    for issue in get_storage().list_issues():
+        all_issues.setdefault(f"{issue.get('username')}_issues", []).append(issue)
+    return all_issues
 
 def flatten_issues(all_issues_data):
-    """Flattens the dictionary of issues into a single list."""
-    flattened = []
-    if isinstance(all_issues_data, dict):
-        for issues_list in all_issues_data.values():
-            if isinstance(issues_list, list):
-                flattened.extend(issues_list)
-    return flattened
+    """Chains the per-user issue lists into a single iterable, without copying them."""
+    if not isinstance(all_issues_data, dict):
+        return iter(())
+    return chain.from_iterable(issues_list for issues_list in all_issues_data.values()
+                               if isinstance(issues_list, list))
+
+def _preprocess_chunk(issues):
+    raw = pd.DataFrame.from_records(issues, columns=['pincode', 'category', 'date', 'priority'])
+    present = (raw.notna() & raw.ne("")).all(axis=1)
+    dates = pd.to_datetime(raw['date'].where(present), format="%Y-%m-%d", errors='coerce')
+    valid = dates.notna().to_numpy()
+    dates = dates[valid].dt
+    return pd.DataFrame({
+        'pincode': raw['pincode'][valid].astype('category'),
+        'day_of_week': dates.weekday.astype('int8'),
+        'month': dates.month.astype('int8'),
+        'category': raw['category'][valid].astype('category'),
+        'priority': raw['priority'][valid].astype('category'),
+    }).reset_index(drop=True)
+
+def concat_features(frames):
+    """Stacks feature frames, merging the categorical columns without a detour through strings."""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return _preprocess_chunk([])
+    if len(frames) == 1:
+        return frames[0]
+    return pd.DataFrame({
+        column: union_categoricals([f[column] for f in frames]) if column in FEATURE_CATEGORIES
+        else np.concatenate([f[column].to_numpy() for f in frames])
+        for column in frames[0].columns
+    })
 
 def preprocess_data(issues):
-    """Prepares the data for the AI model."""
-    data = []
-    for issue in issues:
-        if issue.get("pincode") and issue.get("category") and issue.get("date") and issue.get("priority"):
-            try:
-                date_obj = datetime.strptime(issue["date"], "%Y-%m-%d")
-                data.append({
-                    'pincode': issue['pincode'],
-                    'day_of_week': date_obj.weekday(),
-                    'month': date_obj.month,
-                    'category': issue['category'],
-                    'priority': issue['priority']
-                })
-            except ValueError:
-                continue
-    return pd.DataFrame(data)
+    """Prepares the data for the AI model.
+
+    Builds the feature frame column-wise, PREPROCESS_CHUNK_ROWS issues at a
+    time: dates are parsed by pd.to_datetime with an explicit format and
+    pincode/category/priority are stored as categoricals. Issues missing any
+    of those fields, or with an unparseable date, are skipped.
+    """
+    issues = (issue for issue in issues if isinstance(issue, dict))
+    chunks = iter(lambda: list(islice(issues, PREPROCESS_CHUNK_ROWS)), [])
+    return concat_features([_preprocess_chunk(chunk) for chunk in chunks])
+
+def priority_modes(df):
+    """Most frequent priority per (pincode, category); ties go to the first seen."""
+    counts = df.groupby(['pincode', 'category', 'priority'], sort=False, observed=True).size().reset_index(name='count')
+    modes = counts.sort_values('count', ascending=False, kind='stable').drop_duplicates(['pincode', 'category'])
+    return modes.set_index(['pincode', 'category'])['priority']
+
+def predict_upcoming(model, df, pincode_mapping, horizon_days=PREDICTION_HORIZON_DAYS, today=None):
+    """Scores every (pincode, future day) pair in a single predict call."""
+    today = today or datetime.now()
+    future_dates = [today + timedelta(days=i) for i in range(1, horizon_days + 1)]
+    codes = list(pincode_mapping)
+
+    # One feature row per pincode x day, pincode-major like the output order
+    future = pd.DataFrame({
+        'pincode_code': np.repeat(codes, horizon_days),
+        'day_of_week': np.tile([d.weekday() for d in future_dates], len(codes)),
+        'month': np.tile([d.month for d in future_dates], len(codes)),
+    })
+    if future.empty:
+        return []
+    future['predicted_issue'] = model.predict(future[['pincode_code', 'day_of_week', 'month']])
+    future['pincode'] = future['pincode_code'].map(pincode_mapping)
+    future['expected_date'] = np.tile([d.strftime("%Y-%m-%d") for d in future_dates], len(codes))
+
+    # Determine priority based on past data
+    modes = priority_modes(df)
+    future['priority'] = modes.reindex(pd.MultiIndex.from_arrays(
+        [future['pincode'], future['predicted_issue']])).fillna("Low").to_numpy()
+
+    # Get human-friendly description
+    future['description'] = [CATEGORY_MESSAGES.get(c, f"{c} may occur due to past trends.")
+                             for c in future['predicted_issue']]
+    future['upvotes'] = 0
+    return future[["pincode", "predicted_issue", "expected_date", "description", "priority", "upvotes"]] \
+        .to_dict(orient='records')
+
+# ------------------- Model Artifact ------------------- #
+def watermark(all_issues_data):
+    """Issue count and last issue id per user list; the lists are append-only, so this marks what was seen."""
+    return {key: (len(issues_list), issues_list[-1].get("id") if issues_list else None)
+            for key, issues_list in all_issues_data.items() if isinstance(issues_list, list)}
+
+def issues_since(all_issues_data, mark):
+    """Issues appended after `mark`, or None if the data was rewritten or reordered underneath it."""
+    current = watermark(all_issues_data)
+    for key, (seen, last_id) in mark.items():
+        if current.get(key, (0, None))[0] < seen or (seen and all_issues_data[key][seen - 1].get("id") != last_id):
+            return None
+    new_issues = []
+    for key, (count, _) in current.items():
+        new_issues.extend(all_issues_data[key][mark.get(key, (0, None))[0]:count])
+    return new_issues
+
+def load_artifact():
+    try:
+        artifact = joblib.load(MODEL_FILE)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # unreadable or from another sklearn version: retrain
+        print(f"Ignoring unusable model artifact {MODEL_FILE}: {e}")
+        return None
+    if not isinstance(artifact, dict) or artifact.get("version") != MODEL_ARTIFACT_VERSION:
+        return None
+    return artifact
+
+def save_artifact(artifact):
+    tmp_file = f"{MODEL_FILE}.tmp-{os.getpid()}"
+    joblib.dump(artifact, tmp_file)
+    os.replace(tmp_file, MODEL_FILE)
+
+def model_features(df, pincodes):
+    """The model's input columns; a pincode's code is its position in `pincodes`."""
+    codes = {pincode: code for code, pincode in enumerate(pincodes)}
+    return pd.DataFrame({
+        'pincode_code': df['pincode'].map(codes).astype('int64'),
+        'day_of_week': df['day_of_week'],
+        'month': df['month'],
+    })
+
+def fit_model(df, artifact=None):
+    """Returns (model, pincodes), growing the artifact's forest when possible.
+
+    Warm starts keep existing pincode codes (new pincodes are appended) and
+    add WARM_START_TREES trees fit on the cached plus new rows. A new
+    category, or a forest past MAX_TREES, means a full refit.
+    """
+    if artifact is not None and artifact["model"] is not None:
+        model, pincodes = artifact["model"], list(artifact["pincodes"])
+        if set(df['category']) == set(model.classes_) and model.n_estimators + WARM_START_TREES <= MAX_TREES:
+            pincodes += sorted(set(df['pincode']) - set(pincodes))
+            model.n_estimators += WARM_START_TREES
+            model.fit(model_features(df, pincodes), df['category'])
+            return model, pincodes
+
+    pincodes = sorted(df['pincode'].unique())
+    # warm_start is how later runs grow this forest, whatever FIXORA_MODEL_PARAMS says
+    model = RandomForestClassifier(**{**MODEL_PARAMS, "warm_start": True})
+    model.fit(model_features(df, pincodes), df['category'])
+    return model, pincodes
+
+# ------------------- Partitioned Forecasting ------------------- #
+def partition_pincodes(pincodes, partitions):
+    """Splits the sorted pincodes into contiguous groups, so each holds neighbouring areas."""
+    groups = np.array_split(np.array(sorted(pincodes), dtype=object), min(partitions, len(pincodes)))
+    return [list(group) for group in groups]
+
+def _forecast_partition(args):
+    df, horizon_days, today = args
+    model, pincodes = fit_model(df)
+    return predict_upcoming(model, df, dict(enumerate(pincodes)), horizon_days, today)
+
+def predict_partitioned(df, horizon_days=PREDICTION_HORIZON_DAYS, partitions=TRAIN_PARTITIONS,
+                        workers=TRAIN_WORKERS, today=None):
+    """Fits and forecasts each pincode group in its own process.
+
+    Partitions come back in pincode order whatever order they finish in, so
+    the merged predictions are deterministic.
+    """
+    today = today or datetime.now()
+    tasks = [(df[df['pincode'].isin(group)], horizon_days, today)
+             for group in partition_pincodes(df['pincode'].unique(), partitions)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        return [p for predictions in pool.map(_forecast_partition, tasks) for p in predictions]
 
 # ------------------- Main Training and Prediction Function ------------------- #
-def train_and_predict():
-    """Trains the model and generates future predictions."""
+def train_and_predict(horizon_days=PREDICTION_HORIZON_DAYS, progress=None, full=False,
+                      partitions=TRAIN_PARTITIONS, workers=TRAIN_WORKERS):
+    """Trains the model and generates predictions for the next `horizon_days` days.
+
+    Only issues added since the saved artifact's watermark are preprocessed;
+    with none, the saved model is reused as is. `full` ignores the artifact.
+    With `partitions` > 1 a model per pincode group is fit from scratch on
+    `workers` processes instead (the feature cache is still reused).
+    `progress`, if given, is called with the name of each phase as it starts.
+    """
+    progress = progress or (lambda phase: None)
     print("Starting AI model training and prediction...")
-    all_issues_data = load_data(ISSUES_FILE)
-    issues = flatten_issues(all_issues_data)
+    progress("loading")
+    all_issues_data = load_issue_history()
+    if not isinstance(all_issues_data, dict):
+        all_issues_data = {}
+    mark = watermark(all_issues_data)
 
-    if not issues:
+    if not any(count for count, _ in mark.values()):
         print("No issues found to train the model.")
         save_data(AI_PREDICTIONS_FILE, [])
         return []
 
-    df = preprocess_data(issues)
+    progress("preprocessing")
+    artifact = None if full else load_artifact()
+    new_issues = issues_since(all_issues_data, artifact["watermark"]) if artifact else None
+    if new_issues is None:
+        artifact = None
+        features = preprocess_data(flatten_issues(all_issues_data))
+    else:
+        features = concat_features([artifact["features"], preprocess_data(new_issues)])
 
-    if df.empty:
+    if features.empty:
         print("No valid data for training after preprocessing.")
         save_data(AI_PREDICTIONS_FILE, [])
         return []
 
     # Get a list of pincodes with enough issues to be relevant
-    pincode_counts = df['pincode'].value_counts()
-    relevant_pincodes = pincode_counts[pincode_counts >= MIN_ISSUES_FOR_PREDICTION].index.tolist()
-    df = df[df['pincode'].isin(relevant_pincodes)]
+    pincode_counts = features['pincode'].value_counts()
+    relevant_pincodes = pincode_counts[pincode_counts >= MIN_ISSUES_FOR_PREDICTION].index
+    df = features[features['pincode'].isin(relevant_pincodes)]
     
     if df.empty:
         print(f"Not enough issues found (min={MIN_ISSUES_FOR_PREDICTION}) to train the model.")
         save_data(AI_PREDICTIONS_FILE, [])
         return []
 
-    # Prepare data for the model
-    X = df[['pincode', 'day_of_week', 'month']].copy()
-    y = df['category']
-    
-    # Convert categorical pincode to numerical representation
-    X['pincode_code'] = X['pincode'].astype('category').cat.codes
-    pincode_mapping = dict(enumerate(X['pincode'].astype('category').cat.categories))
-    
-    X = X[['pincode_code', 'day_of_week', 'month']]
-    
-    # Train the RandomForestClassifier model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X, y)
+    if partitions > 1:
+        progress("training")
+        upcoming_predictions = predict_partitioned(df, horizon_days, partitions, workers)
+        print(f"Trained {min(partitions, df['pincode'].nunique())} partition models on {len(df)} issues.")
+        progress("saving")
+        save_artifact({"version": MODEL_ARTIFACT_VERSION, "model": None, "pincodes": [],
+                       "features": features, "watermark": mark})
+        save_data(AI_PREDICTIONS_FILE, upcoming_predictions)
+        print(f"✅ AI predictions updated! {len(upcoming_predictions)} predictions generated.")
+        return upcoming_predictions
 
-    # Generate predictions for the next 3 days
-    upcoming_predictions = []
-    today = datetime.now()
-    
-    for pincode_code, pincode_str in pincode_mapping.items():
-        pincode_issues = df[df['pincode'] == pincode_str]
-
-        # Generate predictions for the next 3 days for this pincode
-        for i in range(1, 4):  # Predict for the next 3 days
-            future_date = today + timedelta(days=i)
-            future_data = pd.DataFrame([{
-                'pincode_code': pincode_code,
-                'day_of_week': future_date.weekday(),
-                'month': future_date.month
-            }])
-            
-            # Predict the category
-            predicted_category = model.predict(future_data)[0]
-            
-            # Determine priority based on past data
-            priority_counts = pincode_issues[pincode_issues['category'] == predicted_category]['priority'].value_counts()
-            predicted_priority = priority_counts.idxmax() if not priority_counts.empty else "Low"
-
-            # Get human-friendly description
-            description = CATEGORY_MESSAGES.get(predicted_category, f"{predicted_category} may occur due to past trends.")
-
-            # Append the prediction to the list
-            upcoming_predictions.append({
-                "pincode": pincode_str,
-                "predicted_issue": predicted_category,
-                "expected_date": future_date.strftime("%Y-%m-%d"),
-                "description": description,
-                "priority": predicted_priority,
-                "upvotes": 0
-            })
+    progress("training")
+    if artifact is not None and artifact["model"] is not None and len(features) == len(artifact["features"]):
+        print("No new issues since the last run; reusing the saved model.")
+        model, pincodes = artifact["model"], artifact["pincodes"]
+    else:
+        model, pincodes = fit_model(df, artifact)
+        warm = artifact is not None and model is artifact["model"]
+        print(f"Model trained on {len(df)} issues ({model.n_estimators} trees, "
+              f"{'warm start' if warm else 'from scratch'}).")
+    if artifact is None or model is not artifact["model"] or mark != artifact["watermark"]:
+        save_artifact({"version": MODEL_ARTIFACT_VERSION, "model": model, "pincodes": pincodes,
+                       "features": features, "watermark": mark})
+
+    progress("predicting")
+    relevant = set(relevant_pincodes)
+    pincode_mapping = {code: pincode for code, pincode in enumerate(pincodes) if pincode in relevant}
+    upcoming_predictions = predict_upcoming(model, df, pincode_mapping, horizon_days)
     
     # Save the new predictions
+    progress("saving")
     save_data(AI_PREDICTIONS_FILE, upcoming_predictions)
     print(f"✅ AI predictions updated! {len(upcoming_predictions)} predictions generated.")
     return upcoming_predictions
 
 if __name__ == "__main__":
-    train_and_predict()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the issue model and refresh AI predictions")
+    parser.add_argument("--full", action="store_true", help="ignore the saved model and retrain from scratch")
+    parser.add_argument("--days", type=int, default=PREDICTION_HORIZON_DAYS, help="prediction horizon in days")
+    parser.add_argument("--partitions", type=int, default=TRAIN_PARTITIONS,
+                        help="fit one model per group of pincodes (1 = a single city-wide model)")
+    parser.add_argument("--workers", type=int, default=TRAIN_WORKERS, help="processes for partitioned training")
+    args = parser.parse_args()
+    timer = PhaseTimer()
+    train_and_predict(args.days, progress=timer, full=args.full, partitions=args.partitions, workers=args.workers)
+    print("Phase timings: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timer.finish().items()))
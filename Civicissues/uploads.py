@@ -0,0 +1,128 @@
+import argparse
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # thumbnails are optional; pages fall back to the original photo
+    Image = None
+
+UPLOAD_DIR = "static/uploads"
+THUMBNAIL_DIR = f"{UPLOAD_DIR}/thumbs"
+MAX_UPLOAD_BYTES = int(os.environ.get("FIXORA_MAX_UPLOAD_MB", 10)) * 2 ** 20
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+CHUNK_SIZE = 64 * 1024
+THUMBNAIL_SIZE = (320, 320)  # bounding box; aspect ratio is kept
+THUMBNAIL_WORKERS = int(os.environ.get("FIXORA_THUMBNAIL_WORKERS", 2))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+class UploadError(ValueError):
+    """Raised for an upload that is rejected (too large or not an image)."""
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+    return _pool
+
+
+# ------------------- Originals ------------------- #
+def save_upload(file, upload_dir=UPLOAD_DIR, max_bytes=MAX_UPLOAD_BYTES):
+    """Streams an uploaded file to `upload_dir` under its SHA-256 and returns the path.
+
+    The bytes are hashed while they are copied in CHUNK_SIZE pieces, so the
+    file is never held in memory; identical photos share one stored copy.
+    """
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise UploadError(f"Photos must be one of: {', '.join(sorted(ALLOWED_EXTENSIONS))}")
+
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f"Photos can be at most {max_bytes // 2 ** 20} MB")
+                digest.update(chunk)
+                out.write(chunk)
+        path = f"{upload_dir}/{digest.hexdigest()}{extension}"
+        if os.path.exists(path):
+            os.remove(tmp_path)  # same bytes already stored
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+# ------------------- Thumbnails ------------------- #
+def thumbnail_path(photo):
+    return f"{THUMBNAIL_DIR}/{os.path.basename(photo)}.webp"
+
+
+def thumbnail_for(photo):
+    """The photo's thumbnail if it has been generated yet, else the photo itself."""
+    if not photo:
+        return photo
+    thumb = thumbnail_path(photo)
+    return thumb if os.path.exists(thumb) else photo
+
+
+def make_thumbnail(photo):
+    """Writes a THUMBNAIL_SIZE WebP of `photo`; returns its path, or None if it cannot."""
+    thumb = thumbnail_path(photo)
+    if Image is None or os.path.exists(thumb):
+        return None if Image is None else thumb
+    os.makedirs(os.path.dirname(thumb), exist_ok=True)
+    tmp = f"{thumb}.tmp-{os.getpid()}"
+    try:
+        with Image.open(photo) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(THUMBNAIL_SIZE)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            image.save(tmp, "WEBP", quality=80)
+        os.replace(tmp, thumb)
+    except (OSError, ValueError) as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        logger.warning("Could not make a thumbnail of %s: %s", photo, e)
+        return None
+    return thumb
+
+
+def queue_thumbnail(photo):
+    """Generates the thumbnail in the background worker pool."""
+    if Image is not None and not os.path.exists(thumbnail_path(photo)):
+        _executor().submit(make_thumbnail, photo)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixora upload tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("thumbnails", help="generate missing thumbnails for every stored photo")
+    args = parser.parse_args()
+
+    if args.command == "thumbnails":
+        if Image is None:
+            raise SystemExit("❌ Pillow is not installed (pip install pillow)")
+        photos = [p for p in glob.glob(os.path.join(UPLOAD_DIR, "*"))
+                  if os.path.splitext(p)[1].lower() in ALLOWED_EXTENSIONS]
+        with ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS) as pool:
+            made = sum(1 for thumb in pool.map(make_thumbnail, photos) if thumb)
+        print(f"✅ {made} of {len(photos)} photos have thumbnails in {THUMBNAIL_DIR}")
@@ -0,0 +1,359 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from storage import _vote_field, file_lock, get_storage, rollup_dims, rollup_filters
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.environ.get("FIXORA_UPVOTE_JOURNAL", "upvote_journal")
+# Buffered upvotes are written to storage once the oldest has waited this long, or as soon
+# as this many are waiting; FIXORA_UPVOTE_FLUSH_MS=0 turns the buffer off and every
+# upvote is written straight through
+FLUSH_MS = int(os.environ.get("FIXORA_UPVOTE_FLUSH_MS", 250))
+FLUSH_VOTES = int(os.environ.get("FIXORA_UPVOTE_FLUSH_VOTES", 500))
+
+_start_lock = threading.Lock()
+
+
+def read_journal(path, offset=0):
+    """The (kind, email, target, time) votes on the complete lines of a journal segment
+    after byte `offset`, and the offset just past them. A line torn by a crash is skipped."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    votes = []
+    for line in data[:end].splitlines():
+        try:
+            kind, email, target, at = json.loads(line)
+        except ValueError:
+            continue
+        votes.append((kind, email, tuple(target) if isinstance(target, list) else target, at))
+    return votes, offset + end
+
+
+class UpvoteBuffer:
+    """Storage wrapper that coalesces upvotes into batched writes.
+
+    Every process appends its upvotes to one shared journal in `directory`
+    (numbered `votes-*.journal` segments, written under a file lock and
+    fsynced) and reads the other processes' appends back, so all of them
+    hold the same buffered votes. A vote is checked against the backend and
+    against those before it is appended, so a second vote for the same
+    target is rejected even before the first is stored.
+
+    A background thread in each process hands the buffered votes to the
+    backend's `apply_upvotes` once the oldest has waited `interval`
+    seconds, or once `max_votes` are waiting, so a burst costs one write
+    per batch instead of one per vote. A flush stores every segment, starts
+    a new one and deletes the old ones under the journal lock, so no reader
+    sees a vote both buffered and stored, and votes journaled by a process
+    that died are stored by the next flush anywhere. Replays are safe: a
+    vote the user already has on record is skipped.
+
+    Reads merge the buffered votes in: changes_since adds them to the users
+    and issues it returns (and re-sends those they touch), and predictions
+    and rollups include them. Everything else is delegated to the backend.
+    """
+
+    def __init__(self, storage, directory=JOURNAL_DIR, interval=FLUSH_MS / 1000, max_votes=FLUSH_VOTES):
+        self.storage = storage
+        self.directory = directory
+        self.interval = interval
+        self.max_votes = max_votes
+        self._journal_lock = os.path.join(directory, "journal")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None  # the process whose flusher thread is running
+        self._offsets = {}  # segment number -> bytes read from it
+        self._by_segment = defaultdict(list)  # segment number -> votes read from it
+        self._oldest = {}  # segment number -> time of its first vote
+        self._pending = {}  # every buffered (kind, email, target) -> its segment number
+        self._counts = Counter()  # (kind, target) -> buffered votes
+        self._by_user = defaultdict(set)  # email -> buffered (kind, target)
+        self._gen = 0
+        self._touched = {}  # ("user", email) / ("issue", id) -> gen it last changed at
+        self._horizon = 0  # changes_since answers deltas only from this gen on
+        os.makedirs(directory, exist_ok=True)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def _start(self):
+        """Starts this process's flusher thread, again after a fork (the child has no threads)."""
+        if self._pid == os.getpid():
+            return
+        with _start_lock:
+            if self._pid == os.getpid():
+                return
+            self._lock = threading.Lock()  # the parent may have held it at the fork
+            self._wake = threading.Event()
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="fixora-upvotes", daemon=True).start()
+            atexit.register(self.close)
+
+    # ------------------- Journal ------------------- #
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"votes-{number:012d}.journal")
+
+    def _sync(self):
+        """Catches up with the journal; call with the journal lock and self._lock held."""
+        numbers = sorted(int(name[len("votes-"):-len(".journal")]) for name in os.listdir(self.directory)
+                         if name.startswith("votes-") and name.endswith(".journal"))
+        for number in set(self._offsets) - set(numbers):
+            self._drop(number)  # stored by a flush
+        for number in numbers:
+            path = self._segment_path(number)
+            offset = self._offsets.get(number, 0)
+            if number in self._offsets and os.path.getsize(path) <= offset:
+                continue
+            votes, self._offsets[number] = read_journal(path, offset)
+            for vote in votes:
+                self._hold(number, vote)
+
+    def _hold(self, number, vote):
+        kind, email, target, at = vote
+        vote = (kind, email, target)
+        self._by_segment[number].append(vote)
+        self._oldest.setdefault(number, at)
+        if vote in self._pending:
+            return
+        self._pending[vote] = number
+        self._counts[kind, target] += 1
+        self._by_user[email].add((kind, target))
+        self._touch(("user", email), *([("issue", target)] if kind == "issue" else []))
+
+    def _drop(self, number):
+        for vote in self._by_segment.pop(number, ()):
+            if self._pending.get(vote) != number:
+                continue
+            kind, email, target = vote
+            del self._pending[vote]
+            self._counts[kind, target] -= 1
+            if not self._counts[kind, target]:
+                del self._counts[kind, target]
+            self._by_user[email].discard((kind, target))
+            if not self._by_user[email]:
+                del self._by_user[email]
+            # Re-sent from storage, which now holds the vote (or dropped it as a duplicate)
+            self._touch(("user", email), *([("issue", target)] if kind == "issue" else []))
+        del self._offsets[number]
+        self._oldest.pop(number, None)
+
+    def _touch(self, *keys):
+        self._gen += 1
+        for key in keys:
+            self._touched[key] = self._gen
+
+    def _valid(self, kind, email, target):
+        user = self.storage.get_user(email)
+        field, key = _vote_field(kind, target)
+        if user is None or key in user.get(field, ()):
+            return False
+        if kind == "issue":
+            return self.storage.get_issue(target) is not None
+        return any((p.get("predicted_issue"), p.get("pincode"), p.get("expected_date")) == target
+                   for p in self.storage.predictions_for_pincode(target[1]))
+
+    def _add(self, kind, email, target):
+        """Journals one vote unless it is stored or buffered already, or its target is gone."""
+        self._start()
+        with file_lock(self._journal_lock):
+            with self._lock:
+                self._sync()
+                if (kind, email, target) in self._pending:
+                    return False
+            if not self._valid(kind, email, target):
+                return False
+            with self._lock:
+                number = max(self._offsets, default=1)
+                path = self._segment_path(number)
+                # Bytes past the last complete line are a line torn by a crash: end it first
+                torn = number in self._offsets and os.path.getsize(path) > self._offsets[number]
+                line = json.dumps([kind, email, target, time.time()], separators=(",", ":")) + "\n"
+                with open(path, "ab") as f:
+                    f.write((b"\n" if torn else b"") + line.encode())
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._sync()
+                if len(self._pending) >= self.max_votes:
+                    self._wake.set()
+        return True
+
+    # ------------------- Flushing ------------------- #
+    def _due(self):
+        with file_lock(self._journal_lock, shared=True), self._lock:
+            self._sync()
+            return len(self._pending) >= self.max_votes or any(
+                at <= time.time() - self.interval for at in self._oldest.values())
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._pid != pid:
+                break  # closed: close() writes what is left
+            try:
+                if self._due():
+                    self.flush()
+            except Exception:
+                logger.exception("Could not write buffered upvotes; they stay journaled and are retried")
+
+    def flush(self):
+        """Writes every journaled vote, from any process, to storage as one batch;
+        returns how many were applied."""
+        with file_lock(self._journal_lock):
+            with self._lock:
+                self._sync()
+                segments = sorted(self._offsets)
+                votes = [vote for number in segments for vote in self._by_segment[number]]
+            if not votes:
+                return 0
+            applied = self.storage.apply_upvotes(votes)
+            # The newest segment is only deleted once a newer one exists, so numbers are never reused
+            open(self._segment_path(segments[-1] + 1), "ab").close()
+            for number in segments:
+                os.unlink(self._segment_path(number))
+            with self._lock:
+                self._sync()
+            return applied
+
+    def close(self):
+        """Stops this process's flusher and writes what is journaled."""
+        if self._pid != os.getpid():
+            return
+        self._pid = None
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not write buffered upvotes; they stay journaled for the next flush")
+
+    # ------------------- Storage Interface ------------------- #
+    def upvote_issue(self, email, issue_id):
+        """Buffers one upvote from `email`; returns False if already voted or not found."""
+        return self._add("issue", email, issue_id)
+
+    def upvote_prediction(self, email, predicted_issue, pincode, expected_date):
+        """Buffers one upvote from `email`; returns False if already voted or not found."""
+        return self._add("prediction", email, (predicted_issue, pincode, expected_date))
+
+    def version(self):
+        """The backend's version and how far each journal segment has been read; both are
+        shared, so every process reports the same version for the same data."""
+        self._start()
+        with file_lock(self._journal_lock, shared=True):
+            with self._lock:
+                self._sync()
+                offsets = tuple(sorted(self._offsets.items()))
+            return self.storage.version(), offsets
+
+    def changes_since(self, version):
+        """The backend's changes plus the users and issues buffered votes touched since
+        `version`, all with the buffered votes merged in.
+
+        The versions returned here are cursors into this object's own change
+        log, meant for one consumer (the app's Repository): each answer
+        prunes the log up to the version asked about, so a version older
+        than the last one asked about gets a full reload instead.
+        """
+        self._start()
+        base, gen = version if version is not None else (None, None)
+        with file_lock(self._journal_lock, shared=True):
+            with self._lock:
+                self._sync()
+                current_gen = self._gen
+                if gen is None or gen < self._horizon:
+                    touched, base = None, None
+                else:
+                    touched = [key for key, g in self._touched.items() if g > gen]
+                    self._touched = {key: g for key, g in self._touched.items() if g > gen}
+                    self._horizon = gen
+            current, users, issues, full = self.storage.changes_since(base)
+            if touched:
+                have = {("user", u["email"]) for u in users} | {("issue", i["id"]) for i in issues}
+                for kind, key in touched:
+                    if (kind, key) in have:
+                        continue
+                    record = self.storage.get_user(key) if kind == "user" else self.storage.get_issue(key)
+                    if record is not None:
+                        (users if kind == "user" else issues).append(dict(record))
+            with self._lock:
+                users = [self._merge_user(u) for u in users]
+                issues = [self._merge_count("issue", i["id"], i) for i in issues]
+        return (current, current_gen), users, issues, full
+
+    def _merge_user(self, user):
+        votes = self._by_user.get(user["email"])
+        if not votes:
+            return user
+        user = dict(user)
+        for kind, target in votes:
+            field, key = _vote_field(kind, target)
+            if key not in user.get(field, ()):
+                user[field] = list(user.get(field, ())) + [key]
+        return user
+
+    def _merge_count(self, kind, target, record):
+        votes = self._counts.get((kind, target))
+        return dict(record, upvotes=int(record.get("upvotes") or 0) + votes) if votes else record
+
+    def _merged_predictions(self, read):
+        with file_lock(self._journal_lock, shared=True):
+            predictions = read()
+            with self._lock:
+                self._sync()
+                return [self._merge_count("prediction", (p.get("predicted_issue"), p.get("pincode"),
+                                                         p.get("expected_date")), p) for p in predictions]
+
+    def list_predictions(self):
+        return self._merged_predictions(self.storage.list_predictions)
+
+    def predictions_for_pincode(self, pincode):
+        return self._merged_predictions(lambda: self.storage.predictions_for_pincode(pincode))
+
+    def rollups(self, group_by=(), **filters):
+        with file_lock(self._journal_lock, shared=True):
+            cells = self.storage.rollups(group_by, **filters)
+            with self._lock:
+                self._sync()
+                pending = [(target, votes) for (kind, target), votes in self._counts.items() if kind == "issue"]
+            by_key = {tuple(c[f] for f in group_by): c for c in cells}
+            for issue_id, votes in pending:
+                issue = self.storage.get_issue(issue_id)
+                dims = rollup_dims(issue) if issue else None
+                if dims is None or any(dims[f] != v for f, v in rollup_filters(filters).items()):
+                    continue
+                cell = by_key.get(tuple(dims[f] for f in group_by))
+                if cell is not None:
+                    cell["upvotes"] += votes
+        return cells
+
+
+def buffer_upvotes(storage):
+    """`storage` behind an UpvoteBuffer, once votes journaled by processes that exited
+    before writing them are stored; `storage` itself when FIXORA_UPVOTE_FLUSH_MS is 0."""
+    if FLUSH_MS <= 0:
+        return storage
+    buffered = UpvoteBuffer(storage)
+    buffered.flush()
+    return buffered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixora upvote journal tools")
+    parser.add_argument("--dir", default=JOURNAL_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("flush", help="store every journaled upvote now, e.g. those left by an app process that crashed")
+    args = parser.parse_args()
+
+    if args.command == "flush":
+        applied = UpvoteBuffer(get_storage(), args.dir).flush()
+        print(f"✅ Stored {applied} upvotes from {args.dir}")
@@ -0,0 +1,39 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Civicissues")
+sys.path.insert(0, APP_DIR)  # the app's modules import each other by their flat names
+
+SEED_FILES = ("users.json", "officials.json", "all_issues.json", "ai_predictions.json", "issues.json")
+
+
+def _seed(directory):
+    for name in SEED_FILES:
+        shutil.copy(os.path.join(APP_DIR, name), directory)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A scratch copy of the app's JSON data, made the working directory
+    (file names in the modules are relative to it)."""
+    _seed(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(scope="module")
+def fixora(tmp_path_factory):
+    """The app module, imported in a scratch data directory that stays the
+    working directory for the whole test module (the app opens its files lazily)."""
+    directory = tmp_path_factory.mktemp("app")
+    _seed(directory)
+    previous = os.getcwd()
+    os.chdir(directory)
+    import app
+    yield app
+    app.events.close()  # streams left open would keep calling into the app after the directory is gone
+    app.storage.close()  # writes buffered upvotes while their journal is still reachable
+    os.chdir(previous)
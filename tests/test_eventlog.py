@@ -0,0 +1,79 @@
+import logging
+
+import pytest
+
+import eventlog
+from eventlog import EventLogStorage, iter_events
+
+
+def _issue(n):
+    return {"id": f"issue-{n}", "title": "Pothole", "description": "test", "pincode": "500001",
+            "location": {"lat": "17.4", "lng": "78.4"}, "category": "Potholes", "priority": "High",
+            "photo": None, "anonymous": False, "upvotes": 0, "date": "2025-01-01", "time": "00:00:00",
+            "month": "January", "username": "reporter", "status": "Pending"}
+
+
+def _user(n):
+    return {"email": f"voter{n}@example.com", "username": f"voter{n}", "password": "x", "pincode": "500001",
+            "upvoted_issues": [], "upvoted_ai_predictions": []}
+
+
+def _full_scan_history(directory, issue_id):
+    """issue_history as a scan of every event, the reference the index must agree with."""
+    history = []
+    for event in iter_events(directory):
+        if eventlog._issue_of(event) == issue_id:
+            entry = {k: v for k, v in event.items() if k != "issue"}
+            if event["type"] == "issue_reported":
+                entry.update(id=issue_id, status=event["issue"].get("status"))
+            history.append(entry)
+    return history
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventLogStorage(str(tmp_path / "eventlog"))
+    for n in range(5):
+        store.add_user(_user(n))
+    store.add_issues([_issue(n) for n in range(3)])
+    return store
+
+
+def test_history_is_read_through_the_index_across_compactions(store, tmp_path, monkeypatch):
+    directory = str(tmp_path / "eventlog")
+    other = EventLogStorage(directory)  # another process, following the same log
+    for round in range(3):
+        for n in range(5):
+            store.upvote_issue(f"voter{n}@example.com", f"issue-{round}")
+        other.set_issue_status(f"issue-{round}", "In Progress")
+        (store if round % 2 else other).compact()
+        store.set_issue_status("issue-0", "Resolved" if round == 2 else "Pending")
+    expected = {n: _full_scan_history(directory, f"issue-{n}") for n in range(3)}
+    assert len(expected[0]) == 10
+
+    monkeypatch.setattr(eventlog, "iter_events", lambda *args: pytest.fail("history scanned the whole log"))
+    fresh = EventLogStorage(directory)  # starts from the snapshot, so the archive is indexed on demand
+    for reader in (store, other, fresh):
+        assert {n: reader.issue_history(f"issue-{n}") for n in range(3)} == expected
+    assert fresh.issue_history("no-such-issue") == []
+
+
+def test_votes_are_appended_in_place_and_survive_a_snapshot(store, tmp_path):
+    caller_user = _user(99)
+    store.add_user(caller_user)
+    for n in range(3):
+        assert store.upvote_issue("voter99@example.com", f"issue-{n}")
+    assert caller_user["upvoted_issues"] == []  # the stored user has lists of its own
+    store.compact()
+    store.upvote_issue("voter0@example.com", "issue-0")
+    reloaded = EventLogStorage(str(tmp_path / "eventlog"))
+    assert reloaded.get_user("voter99@example.com")["upvoted_issues"] == ["issue-0", "issue-1", "issue-2"]
+    assert reloaded.get_user("voter0@example.com")["upvoted_issues"] == ["issue-0"]
+    assert reloaded.get_issue("issue-0")["upvotes"] == 2
+
+
+def test_background_compaction_errors_are_logged(store, monkeypatch, caplog):
+    monkeypatch.setattr(store, "compact", lambda: 1 / 0)
+    with caplog.at_level(logging.ERROR, logger="eventlog"):
+        store._background_compact()
+    assert "ZeroDivisionError" in caplog.text and not store._compacting
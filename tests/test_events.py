@@ -0,0 +1,93 @@
+import http.client
+import json
+import threading
+import urllib.parse
+
+import pytest
+from werkzeug.serving import make_server
+
+from events import EventBus, StreamLimitReached, stream
+
+SEED_LOGIN = {"email": "rishika@gmail.com", "password": "rishika@123"}
+
+
+def test_the_bus_refuses_streams_past_its_limit():
+    bus = EventBus(max_subscribers=1)
+    subscriber, _ = bus.subscribe()
+    with pytest.raises(StreamLimitReached):
+        bus.subscribe()
+    bus.unsubscribe(subscriber)
+    bus.subscribe()
+
+
+def test_since_replays_or_asks_for_a_resync():
+    bus = EventBus(replay=2)
+    assert bus.since() == ([], 0)
+    for n in range(3):
+        bus.publish("issue_upvoted", {"n": n})
+    assert bus.since(2) == ([(3, "issue_upvoted", {"n": 2})], 3)
+    assert bus.since(3) == ([], 3)
+    assert bus.since(0) == (None, 3)  # event 1 was evicted
+
+
+def test_closing_the_bus_ends_open_streams():
+    bus = EventBus()
+    _, chunks = stream(bus, heartbeat=60)
+    assert next(chunks).startswith("retry:")
+    bus.close()
+    assert list(chunks) == [] and bus.subscriber_count() == 0
+
+
+@pytest.fixture
+def serve(fixora):
+    """Starts the app on a real server; returns a function making logged-in requests to it."""
+    servers = []
+
+    def serve(threaded):
+        server = make_server("127.0.0.1", 0, fixora.app, threaded=threaded)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        def connect():
+            return http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+
+        login = connect()
+        login.request("POST", "/user_login", urllib.parse.urlencode(SEED_LOGIN),
+                      {"Content-Type": "application/x-www-form-urlencoded"})
+        reply = login.getresponse()
+        cookie = reply.getheader("Set-Cookie").split(";")[0]
+        reply.read()
+
+        def get(path):
+            conn = connect()
+            conn.request("GET", path, headers={"Cookie": cookie, "Accept": "application/json"})
+            return conn.getresponse()
+        return get
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+
+def test_requests_are_served_while_a_stream_is_open(fixora, serve, monkeypatch):
+    monkeypatch.setattr(fixora.events, "max_subscribers", 1)
+    get = serve(threaded=True)
+    live = get("/events")
+    assert live.status == 200 and live.readline().startswith(b"retry:")
+
+    assert get("/").status == 200
+    refused = get("/events")
+    assert refused.status == 503 and json.load(refused)["poll"] == "/events/poll"
+    first = json.load(get("/events/poll"))
+    fixora.events.publish("issue_status", {"id": "x", "status": "Resolved"})
+    query = urllib.parse.urlencode({"after": first["last_id"], "version": first["version"]})
+    polled = json.load(get(f"/events/poll?{query}"))
+    assert [e["data"] for e in polled["events"]] == [{"id": "x", "status": "Resolved"}]
+    assert not polled["resync"]
+    live.close()
+
+
+def test_a_single_threaded_server_polls_instead_of_streaming(serve):
+    get = serve(threaded=False)
+    assert get("/events").status == 503
+    assert get("/").status == 200
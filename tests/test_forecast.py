@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import train_ai
+from benchmark import fit, predict_upcoming_per_row, synthetic_training_frame
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    df = synthetic_training_frame(12)
+    return (df, *fit(df))
+
+
+@pytest.mark.parametrize("today", (datetime(2025, 9, 20), datetime(2025, 12, 30), datetime(2024, 2, 27)))
+@pytest.mark.parametrize("horizon_days", (0, 1, 3, 10))
+def test_batched_forecast_matches_the_per_row_one(fitted, today, horizon_days):
+    df, model, mapping = fitted
+    assert train_ai.predict_upcoming(model, df, mapping, horizon_days, today) == \
+        predict_upcoming_per_row(model, df, mapping, horizon_days, today)
+
+
+def test_priority_ties_and_unseen_categories_agree(fitted):
+    _, model, mapping = fitted
+    # Every priority once per pincode and category: the tie goes to the first seen.
+    # Pincodes without any rows fall back to "Low"
+    rows = [{"pincode": pincode, "day_of_week": 0, "month": 1, "category": category, "priority": priority}
+            for pincode in list(mapping.values())[::2]
+            for category in train_ai.CATEGORY_MESSAGES
+            for priority in ("Medium", "High", "Low")]
+    df = pd.DataFrame(rows)
+    today = datetime(2025, 9, 20)
+    batched = train_ai.predict_upcoming(model, df, mapping, 3, today)
+    assert batched == predict_upcoming_per_row(model, df, mapping, 3, today)
+    assert {p["priority"] for p in batched} == {"Medium", "Low"}
+
+
+def test_categorical_frames_forecast_like_plain_ones(fitted):
+    df, model, mapping = fitted
+    today = datetime(2025, 9, 20)
+    categorical = df.astype({column: "category" for column in train_ai.FEATURE_CATEGORIES})
+    assert train_ai.predict_upcoming(model, categorical, mapping, 3, today) == \
+        predict_upcoming_per_row(model, df, mapping, 3, today)
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+import time
+
+import jobs
+
+
+def test_pid_alive_tells_running_from_exited_processes():
+    assert jobs._pid_alive(os.getpid())
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    assert not jobs._pid_alive(child.pid)
+
+
+def test_a_job_whose_worker_died_is_not_active(workdir):
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    status = {"id": "job", "state": "running", "pid": child.pid, "updated_at": time.time()}
+    assert not jobs._is_active(status)
+    assert jobs._is_active(dict(status, pid=os.getpid()))
@@ -0,0 +1,57 @@
+import pytest
+
+import train_ai
+from benchmark import preprocess_data_per_row, synthetic_issues
+
+VALID = {"pincode": "500001", "category": "Potholes", "priority": "High", "date": "2025-01-05"}
+EDGE_CASES = [
+    VALID,
+    dict(VALID, date="2025-1-5"),  # strptime takes unpadded fields
+    dict(VALID, date="2024-02-29"),
+    dict(VALID, date="2025-02-30"),
+    dict(VALID, date=" 2025-01-05"),
+    dict(VALID, date="2025-01-05 10:00"),
+    dict(VALID, date="20250105"),
+    dict(VALID, date="n/a"),
+    dict(VALID, date="0001-01-01"),
+    dict(VALID, date="9999-12-31"),
+    dict(VALID, pincode=""),
+    dict(VALID, category=None),
+    {k: v for k, v in VALID.items() if k != "priority"},
+    dict(VALID, pincode="500002", category="Drainage", priority="Low", date="2025-12-31"),
+]
+
+
+def _records(df):
+    return df.astype(object).to_dict("records")
+
+
+def _assert_same(issues):
+    reference = preprocess_data_per_row(issues)
+    columnar = train_ai.preprocess_data(issues)
+    assert _records(columnar) == _records(reference)
+    assert list(columnar.columns) == ["pincode", "day_of_week", "month", "category", "priority"]
+
+
+def test_columnar_preprocessing_matches_the_per_row_one():
+    _assert_same(synthetic_issues(5000))
+
+
+def test_edge_cases_are_kept_or_skipped_like_the_per_row_one():
+    _assert_same(EDGE_CASES)
+
+
+@pytest.mark.parametrize("chunk_rows", (1, 3, 7, 1000))
+def test_chunks_are_stitched_back_in_order(monkeypatch, chunk_rows):
+    monkeypatch.setattr(train_ai, "PREPROCESS_CHUNK_ROWS", chunk_rows)
+    _assert_same(EDGE_CASES * 3 + synthetic_issues(200))
+
+
+def test_nothing_usable_gives_an_empty_frame():
+    assert train_ai.preprocess_data([dict(VALID, date="n/a")]).empty
+    assert train_ai.preprocess_data(iter([])).empty
+
+
+def test_entries_that_are_not_issues_are_ignored():
+    assert _records(train_ai.preprocess_data([VALID, "stray", None, VALID])) == \
+        _records(preprocess_data_per_row([VALID, VALID]))
@@ -0,0 +1,63 @@
+import pytest
+
+from benchmark import synthetic_issues
+from records import IssueRecord
+
+
+def _expected(issue):
+    """The dict an IssueRecord should read as: None fields dropped, coordinates as float reprs."""
+    expected = {k: v for k, v in issue.items() if v is not None}
+    location = issue.get("location")
+    if location is not None:
+        expected["location"] = {"lat": repr(float(location["lat"])), "lng": repr(float(location["lng"]))}
+    return expected
+
+
+def test_records_read_like_the_dicts_they_came_from():
+    for issue in synthetic_issues(2000):
+        record = IssueRecord(issue)
+        assert dict(record) == _expected(issue)
+        assert len(record) == len(_expected(issue))
+        assert dict(IssueRecord(dict(record))) == dict(record)  # a second round trip changes nothing
+
+
+def test_none_fields_read_as_missing():
+    issue = dict(synthetic_issues(1)[0], photo=None, title=None, location=None)
+    record = IssueRecord(issue)
+    for key in ("photo", "title", "location"):
+        assert key not in record and record.get(key) is None
+        with pytest.raises(KeyError):
+            record[key]
+    assert dict(record) == _expected(issue)
+
+
+def test_falsy_values_that_are_not_none_are_kept():
+    issue = dict(synthetic_issues(1)[0], anonymous=False, upvotes=0, description="")
+    record = IssueRecord(issue)
+    assert (record["anonymous"], record["upvotes"], record["description"]) == (False, 0, "")
+
+
+@pytest.mark.parametrize("lat, lng", [("17.400000", "78.4"), ("17.385044", "78.486671"), ("1e-3", "-0"),
+                                      ("90", "-180"), ("17.38504400000000012", "78.4867")])
+def test_coordinates_come_back_as_the_shortest_float_repr(lat, lng):
+    record = IssueRecord(dict(synthetic_issues(1)[0], location={"lat": lat, "lng": lng}))
+    location = record["location"]
+    assert location == {"lat": repr(float(lat)), "lng": repr(float(lng))}
+    assert (float(location["lat"]), float(location["lng"])) == (float(lat), float(lng))
+
+
+@pytest.mark.parametrize("location", [{"lat": "north", "lng": "78.4"}, {"lat": "95", "lng": "78.4"}, {"lat": "17.4"},
+                                      {}])
+def test_unparseable_locations_are_kept_as_they_were(location):
+    record = IssueRecord(dict(synthetic_issues(1)[0], location=location))
+    assert (record.lat, record.lng) == (None, None)
+    assert record["location"] == location and list(record).count("location") == 1
+
+
+def test_unknown_keys_and_updates_round_trip():
+    issue = dict(synthetic_issues(1)[0], reviewed_by="official@example.com", tags=["night"])
+    record = IssueRecord(issue)
+    assert dict(record) == _expected(issue)
+    updated = dict(issue, status="Resolved", upvotes=5, tags=None, reviewed_by=None)
+    record.update_from(updated)
+    assert dict(record) == _expected(updated)
@@ -0,0 +1,22 @@
+import bisect
+
+import repository
+from benchmark import synthetic_issues
+from repository import Repository, _date_key
+from storage import JSONStorage
+
+
+def test_a_full_reload_sorts_the_date_index_once(workdir, monkeypatch):
+    store = JSONStorage()
+    store.backfill_issue_ids()
+    store.add_issues([dict(i, username="reporter") for i in synthetic_issues(500)])  # id order, not date order
+    calls = []
+    monkeypatch.setattr(repository.bisect, "insort", lambda *args: calls.append(args))
+    repo = Repository(store)
+    issues = repo.list_issues()
+    assert not calls
+    assert repo._by_date == sorted(_date_key(i) for i in issues)
+
+    monkeypatch.setattr(repository.bisect, "insort", bisect.insort)
+    page, _ = repo.query_issues(limit=10)
+    assert [_date_key(i) for i in page] == sorted(map(_date_key, issues), reverse=True)[:10]
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from storage import DB_FILE, SQLiteStorage, _open_storage
+
+PRIORITIES = ("High", "high", "HIGH", "Low")
+
+
+def _issue(n, priority):
+    return {"id": f"issue-{n}", "title": "Pothole", "description": "test", "pincode": "500001",
+            "location": {"lat": "17.4", "lng": "78.4"}, "category": "Potholes", "priority": priority,
+            "photo": None, "anonymous": False, "upvotes": n, "date": "2025-01-01", "time": "00:00:00",
+            "month": "January", "username": "reporter", "status": "Pending"}
+
+
+@pytest.mark.parametrize("backend", ("sqlite", "json", "eventlog", "sharded"))
+def test_priority_is_counted_case_insensitively(backend, tmp_path):
+    store = _open_storage(backend, str(tmp_path))
+    store.add_issues([_issue(n, priority) for n, priority in enumerate(PRIORITIES)])
+    for asked in ("High", "high"):
+        assert store.rollups(priority=asked) == [{"issues": 3, "upvotes": 3}]
+    assert sorted(store.rollups(("priority",)), key=lambda c: c["priority"]) == [
+        {"priority": "High", "issues": 3, "upvotes": 3}, {"priority": "Low", "issues": 1, "upvotes": 3}]
+
+
+def test_older_rollup_cells_are_rebuilt_on_open(tmp_path):
+    store = SQLiteStorage(str(tmp_path / DB_FILE))
+    store.add_issues([_issue(n, priority) for n, priority in enumerate(PRIORITIES)])
+    with sqlite3.connect(tmp_path / DB_FILE) as db:
+        # What a database written before priorities were normalized looks like
+        db.execute("UPDATE rollups SET priority = 'high' WHERE priority = 'High'")
+        db.execute("DELETE FROM meta WHERE key = 'rollup_format'")
+    db.close()
+    reopened = SQLiteStorage(str(tmp_path / DB_FILE))
+    assert reopened.rollups(priority="High") == [{"issues": 3, "upvotes": 3}]
+    reopened.set_issue_status("issue-2", "Resolved")
+    assert sorted(reopened.rollups(("status",), priority="high"), key=lambda c: c["status"]) == [
+        {"status": "Pending", "issues": 2, "upvotes": 1},
+        {"status": "Resolved", "issues": 1, "upvotes": 2}]
+
+
+def test_a_duplicate_user_leaves_the_version_alone(tmp_path):
+    store = SQLiteStorage(str(tmp_path / DB_FILE))
+    user = {"email": "a@example.com", "username": "a", "password": "x", "pincode": "500001"}
+    assert store.add_user(dict(user))
+    version = store.version()
+    assert not store.add_user(dict(user, username="again"))
+    assert store.version() == version
+    assert store.changes_since(version - 1)[1] == [store.get_user("a@example.com")]
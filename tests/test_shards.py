@@ -0,0 +1,169 @@
+import copy
+import filecmp
+import os
+import shutil
+import uuid
+
+import pytest
+
+from shards import ShardedStorage, migrate_json_to_shards
+from storage import JSONStorage
+
+GROUPINGS = ((), ("status",), ("pincode", "category"), ("month", "priority"))
+
+
+def _by_id(issues):
+    return sorted(issues, key=lambda i: i["id"])
+
+
+def _snapshot(store):
+    """Everything the read methods return, in an order both backends agree on."""
+    issues = _by_id(store.list_issues())
+    users = store.list_users()
+    pincodes = sorted({i.get("pincode") for i in issues} | {"000000"})
+    usernames = sorted({i.get("username") for i in issues} | {"nobody"})
+    return {
+        "users": users,
+        "user": [store.get_user(u["email"]) for u in users] + [store.get_user("nobody@example.com")],
+        "officials": store.list_officials(),
+        "official": [store.get_official(o["email"]) for o in store.list_officials()],
+        "issues": issues,
+        "issue": [store.get_issue(i["id"]) for i in issues] + [store.get_issue("no-such-issue")],
+        "for_user": {u: _by_id(store.issues_for_user(u)) for u in usernames},
+        "for_pincode": {p: _by_id(store.issues_for_pincode(p)) for p in pincodes},
+        "rollups": [store.rollups(g) for g in GROUPINGS] + [store.rollups(("status",), pincode=pincodes[0])],
+        "predictions": store.list_predictions(),
+        "for_pincode_predictions": {p: store.predictions_for_pincode(p) for p in pincodes},
+    }
+
+
+def _issue(**fields):
+    return dict({"id": uuid.uuid4().hex, "title": "Broken streetlight", "description": "dark all night",
+                 "pincode": "500001", "location": {"lat": "17.4", "lng": "78.4"},
+                 "category": "Streetlight / Broken", "priority": "Medium", "photo": None, "anonymous": False,
+                 "upvotes": 0, "date": "2025-03-01", "time": "20:00:00", "month": "March",
+                 "username": "rishika", "status": "Pending"}, **fields)
+
+
+@pytest.fixture
+def stores(workdir):
+    """The seed data as a JSONStorage and, in a copy, as a ShardedStorage."""
+    json_store = JSONStorage()
+    json_store.backfill_issue_ids()
+    sharded_dir = workdir / "sharded"
+    sharded_dir.mkdir()
+    for name in ("users.json", "officials.json", "ai_predictions.json"):
+        shutil.copy(workdir / name, sharded_dir)
+    sharded = ShardedStorage(str(sharded_dir / "shards"), *(str(sharded_dir / name) for name in
+                                                            ("users.json", "officials.json", "ai_predictions.json")),
+                             seed=json_store)
+    return json_store, sharded
+
+
+def test_every_method_matches_the_json_backend(stores):
+    json_store, sharded = stores
+    assert _snapshot(sharded) == _snapshot(json_store)
+    first = json_store.list_issues()[0]["id"]
+    user = json_store.list_users()[0]["email"]
+    predictions = [{"pincode": "500001", "predicted_issue": "Pollution", "expected_date": "2025-04-01",
+                    "description": "Pollution levels might rise", "priority": "Low", "upvotes": 0}]
+    batch = [_issue(), _issue(pincode="500002", priority="High"), _issue(id=first)]
+    steps = [
+        ("add_user", {"email": "new@example.com", "username": "new", "password": "x", "pincode": "500001",
+                      "upvoted_issues": [], "upvoted_ai_predictions": []}),
+        ("add_user", {"email": user, "username": "again", "password": "x", "pincode": "500001"}),
+        ("add_official", {"email": "new-official@example.com", "password": "x", "department": "Roads"}),
+        ("add_issue", _issue(id="issue-a")),
+        ("add_issues", batch),
+        ("add_issues", batch),
+        ("upvote_issue", user, "issue-a"),
+        ("upvote_issue", user, "issue-a"),
+        ("upvote_issue", user, "no-such-issue"),
+        ("set_issue_status", "issue-a", "In Progress"),
+        ("set_issue_status", "no-such-issue", "Resolved"),
+        ("toggle_issue_status", first),
+        ("raise_issue_upvotes", first, 40),
+        ("raise_issue_upvotes", first, 3),
+        ("replace_predictions", predictions),
+        ("upvote_prediction", user, "Pollution", "500001", "2025-04-01"),
+        ("upvote_prediction", user, "Pollution", "500001", "2025-04-01"),
+        ("apply_upvotes", [("issue", "new@example.com", "issue-a"), ("issue", "new@example.com", "issue-a"),
+                           ("issue", "new@example.com", first), ("issue", user, "issue-a"),
+                           ("prediction", "new@example.com", ("Pollution", "500001", "2025-04-01"))]),
+    ]
+    for name, *args in steps:
+        assert getattr(sharded, name)(*copy.deepcopy(args)) == getattr(json_store, name)(*copy.deepcopy(args)), name
+        assert _snapshot(sharded) == _snapshot(json_store), name
+
+
+def test_seeding_leaves_the_json_files_alone(workdir):
+    before = workdir / "before"
+    before.mkdir()
+    for name in ("users.json", "all_issues.json"):
+        shutil.copy(workdir / name, before)
+    seeded = ShardedStorage(str(workdir / "shards"), seed=JSONStorage())
+    assert len(seeded.list_issues()) == len(JSONStorage().list_issues())
+    assert all(filecmp.cmp(before / name, workdir / name, shallow=False) for name in ("users.json", "all_issues.json"))
+
+
+def test_migrate_gives_ids_and_keeps_title_votes(workdir):
+    store = migrate_json_to_shards(JSONStorage(), str(workdir / "shards"))
+    ids = {i["id"] for i in store.list_issues()}
+    assert ids == {i["id"] for i in JSONStorage().list_issues()}
+    votes = [v for u in store.list_users() for v in u.get("upvoted_issues", [])]
+    assert votes and set(votes) <= ids
+    with pytest.raises(RuntimeError):
+        migrate_json_to_shards(JSONStorage(), str(workdir / "shards"))
+
+
+def test_add_issues_counts_only_new_issues_when_a_pincode_moves(workdir, monkeypatch):
+    store = ShardedStorage(str(workdir / "shards"))
+    assert store.add_issues([_issue()]) == 1
+    bucket = store._shard_name("500001")
+    store.rebalance(hot=0)
+    issue, other = _issue(), ShardedStorage(str(workdir / "shards"))
+
+    def stale_lookup(pincode, manifest=None):
+        # The batch is grouped by the layout before the rebalance, and another
+        # worker stores the same issue in the pincode's new shard meanwhile
+        monkeypatch.undo()
+        other.add_issue(dict(issue))
+        return bucket
+
+    monkeypatch.setattr(store, "_shard_name", stale_lookup)
+    assert store.add_issues([dict(issue)]) == 0
+    assert len(store.issues_for_pincode("500001")) == 2
+    assert os.path.exists(store._path("pin-500001"))
+
+
+def test_upvotes_take_only_the_shard_lock_and_follow_a_rebalance(stores, monkeypatch):
+    _, store = stores
+    user = store.list_users()[0]["email"]
+    issue = store.add_issue(_issue())
+    users_file = open(store.users_file, "rb").read()
+    monkeypatch.setattr(store, "_locked", lambda: pytest.fail("an issue upvote locked users.json"))
+    assert store.upvote_issue(user, issue["id"])
+    store.rebalance(hot=0)
+    assert not store.upvote_issue(user, issue["id"])
+    assert store.apply_upvotes([("issue", user, issue["id"])]) == 0
+    assert store.get_issue(issue["id"])["upvotes"] == 1
+    assert issue["id"] in store.get_user(user)["upvoted_issues"]
+    assert open(store.users_file, "rb").read() == users_file
+
+
+def test_lookups_read_only_the_shards_written_since(stores, monkeypatch):
+    _, store = stores
+    other = ShardedStorage(store.directory, store.users_file)
+    before = store.version()
+    assert store.get_issue("no-such-issue") is None  # builds the id map once
+    monkeypatch.setattr(store, "shard_names", lambda: pytest.fail("scanned every shard"))
+    assert store.get_issue("no-such-issue") is None
+    assert store.version() == before
+    issue = other.add_issue(_issue(pincode="500002"))
+    assert store.version() != before
+    assert store.get_issue(issue["id"])["id"] == issue["id"]
+    assert store.upvote_issue(store.list_users()[0]["email"], issue["id"])
+    version, users, issues, full = store.changes_since(before)
+    shard = store._load_shard(store._shard_name("500002"))
+    assert not full and users and _by_id(issues) == _by_id(shard)
+    assert store.changes_since(version)[1:] == ([], [], False)
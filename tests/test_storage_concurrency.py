@@ -0,0 +1,14 @@
+import pytest
+
+from storage import stress_upvotes
+
+BACKENDS = ("sqlite", "json", "eventlog", "sharded")
+
+
+@pytest.mark.parametrize("buffered", (False, True), ids=("direct", "buffered"))
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_parallel_upvotes_are_neither_lost_nor_doubled(backend, buffered):
+    # Every voter votes twice from a pool of processes; only the first vote may count
+    accepted, final = stress_upvotes(backend, workers=4, votes=300, buffered=buffered)
+    assert accepted == 300
+    assert final == accepted
@@ -0,0 +1,64 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from benchmark import REPORT_CATEGORIES, REPORT_PRIORITIES, synthetic_city, write_city
+from storage import JSONStorage, SQLiteStorage, migrate_json_to_sqlite
+
+TODAY = datetime(2025, 9, 20)
+
+
+def _city(seed=42):
+    return synthetic_city(users=300, issues=2000, pincodes=20, days=90, seed=seed, today=TODAY)
+
+
+def _issues(all_issues):
+    return [issue for issues_list in all_issues.values() for issue in issues_list]
+
+
+def test_a_seed_always_gives_the_same_city():
+    assert _city() == _city()
+    assert _city(seed=7) != _city()
+
+
+def test_the_city_is_consistent():
+    people, all_issues = _city()
+    issues = _issues(all_issues)
+    by_username = {user["username"]: user for user in people}
+    assert len(people) == 300 and len(by_username) == 300 and len(issues) == 2000
+    assert len({issue["id"] for issue in issues}) == 2000
+    assert all(len(issue["id"]) == 32 and int(issue["id"], 16) >= 0 for issue in issues)
+
+    for key, issues_list in all_issues.items():
+        assert {f"{issue['username']}_issues" for issue in issues_list} == {key}
+    for issue in issues:
+        assert issue["username"] in by_username
+        assert issue["category"] in REPORT_CATEGORIES and issue["priority"] in REPORT_PRIORITIES
+        assert issue["status"] in ("Pending", "In Progress", "Resolved")
+        reported = datetime.strptime(f"{issue['date']} {issue['time']}", "%Y-%m-%d %H:%M:%S")
+        assert TODAY - timedelta(days=90) < reported <= TODAY
+        assert issue["month"] == reported.strftime("%B")
+        assert 500001 <= int(issue["pincode"]) < 500021
+
+    # Every upvote is recorded on the voter and counted on the issue, once, by a resident
+    pincode_of = {issue["id"]: issue["pincode"] for issue in issues}
+    votes = Counter()
+    for user in people:
+        assert len(set(user["upvoted_issues"])) == len(user["upvoted_issues"])
+        assert all(pincode_of[issue_id] == user["pincode"] for issue_id in user["upvoted_issues"])
+        votes.update(user["upvoted_issues"])
+    assert all(issue["upvotes"] == votes[issue["id"]] for issue in issues)
+    assert max(votes.values()) > 10 * (sum(votes.values()) / len(issues))  # heavy-tailed
+
+
+def test_a_written_city_loads_into_the_backends(tmp_path):
+    people, all_issues = _city()
+    write_city(str(tmp_path), people, all_issues)
+    paths = [str(tmp_path / name) for name in ("users.json", "officials.json", "all_issues.json",
+                                                "ai_predictions.json")]
+    json_store = JSONStorage(*paths)
+    sqlite_store = SQLiteStorage(str(tmp_path / "fixora.db"))
+    migrate_json_to_sqlite(json_store, sqlite_store)
+    for store in (json_store, sqlite_store):
+        assert len(store.list_issues()) == 2000 and len(store.list_users()) == 300
+        assert store.rollups() == [{"issues": 2000, "upvotes": sum(i["upvotes"] for i in _issues(all_issues))}]
+        assert len(store.list_officials()) == 1
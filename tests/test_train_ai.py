@@ -0,0 +1,36 @@
+import uuid
+
+import train_ai
+from benchmark import synthetic_training_frame
+from storage import get_storage
+from train_ai import issues_since, load_issue_history, watermark
+
+
+def _issue_ids(all_issues_data):
+    return {issue["id"] for issues_list in all_issues_data.values() for issue in issues_list}
+
+
+def test_training_reads_issues_reported_through_storage(workdir):
+    storage = get_storage()
+    issue = dict(storage.list_issues()[0], id=uuid.uuid4().hex)
+    storage.add_issue(issue)
+    assert issue["id"] in _issue_ids(load_issue_history())
+
+
+def test_watermark_finds_new_issues_and_notices_rewrites(workdir):
+    history = load_issue_history()
+    mark = watermark(history)
+    key = next(iter(history))
+    issue = dict(history[key][0], id=uuid.uuid4().hex)
+    history[key].append(issue)
+    assert issues_since(history, mark) == [issue]
+
+    history[key].insert(0, history[key].pop())  # same count per list, different issues seen
+    history[key].pop()
+    assert issues_since(history, mark) is None
+
+
+def test_model_params_may_set_warm_start(monkeypatch):
+    monkeypatch.setitem(train_ai.MODEL_PARAMS, "warm_start", False)
+    model, _ = train_ai.fit_model(synthetic_training_frame(3))
+    assert model.warm_start
@@ -0,0 +1,148 @@
+import threading
+
+import pytest
+
+from repository import Repository
+from storage import _open_storage
+from upvotes import UpvoteBuffer, read_journal
+
+BACKENDS = ("sqlite", "json", "eventlog", "sharded")
+USERS = [f"voter{i}@example.com" for i in range(20)]
+ISSUES = ("pothole", "streetlight")
+
+
+def _issue(issue_id):
+    return {"id": issue_id, "title": issue_id.title(), "description": "test", "pincode": "500001",
+            "location": {"lat": "17.4", "lng": "78.4"}, "category": "Potholes",
+            "priority": "High", "photo": None, "anonymous": False, "upvotes": 0,
+            "date": "2025-01-01", "time": "00:00:00", "month": "January",
+            "username": "reporter", "status": "Pending"}
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    store = _open_storage(request.param, str(tmp_path))
+    for email in USERS:
+        store.add_user({"email": email, "username": email.split("@")[0], "password": "x", "pincode": "500001",
+                        "upvoted_issues": [], "upvoted_ai_predictions": []})
+    for issue_id in ISSUES:
+        store.add_issue(_issue(issue_id))
+    return store
+
+
+@pytest.fixture
+def open_buffer(store, tmp_path):
+    """Opens buffers on one journal, each standing in for an app process."""
+    buffers = []
+
+    def open_buffer():
+        # Flushed by hand, so each test decides when votes reach storage
+        buffers.append(UpvoteBuffer(store, str(tmp_path / "upvote_journal"), interval=3600, max_votes=10 ** 9))
+        return buffers[-1]
+
+    yield open_buffer
+    for buffer in buffers:
+        buffer.close()
+
+
+def _stored(store, issue_id):
+    return store.get_issue(issue_id)["upvotes"]
+
+
+def test_second_vote_is_rejected_before_flush(store, open_buffer):
+    first, second = open_buffer(), open_buffer()
+    assert first.upvote_issue(USERS[0], "pothole")
+    assert not first.upvote_issue(USERS[0], "pothole")
+    assert not second.upvote_issue(USERS[0], "pothole")  # journaled by another process, not stored yet
+    assert second.upvote_issue(USERS[1], "pothole")
+    assert not first.upvote_issue(USERS[2], "no-such-issue")
+
+    assert first.flush() == 2
+    assert _stored(store, "pothole") == 2
+    assert not second.upvote_issue(USERS[0], "pothole")  # now rejected by storage
+
+
+def test_votes_journaled_before_a_crash_are_stored_by_the_next_flush(store, open_buffer, tmp_path):
+    crashed = open_buffer()
+    for email in USERS[:3]:
+        assert crashed.upvote_issue(email, "pothole")
+    # It died mid-append, leaving a torn line, and never flushed
+    segment = next((tmp_path / "upvote_journal").glob("votes-*.journal"))
+    with open(segment, "ab") as f:
+        f.write(b'["issue","voter9@exam')
+
+    survivor = open_buffer()
+    assert survivor.upvote_issue(USERS[3], "pothole")
+    assert survivor.flush() == 4
+    assert _stored(store, "pothole") == 4
+    assert survivor.upvote_issue(USERS[9], "pothole")  # the torn vote was never accepted
+
+
+def test_replaying_a_stored_batch_applies_nothing(store, open_buffer, tmp_path):
+    buffer = open_buffer()
+    assert buffer.upvote_issue(USERS[0], "pothole")
+    # A flush that stored its batch but died before deleting the segment
+    segment = next((tmp_path / "upvote_journal").glob("votes-*.journal"))
+    votes, _ = read_journal(segment)
+    store.apply_upvotes([vote[:3] for vote in votes])
+
+    assert buffer.flush() == 0
+    assert _stored(store, "pothole") == 1
+
+
+def test_votes_during_flushes_are_neither_lost_nor_doubled(store, open_buffer):
+    buffers = [open_buffer() for _ in range(3)]
+    accepted, done = [], threading.Event()
+
+    def vote(buffer, emails):
+        # Every vote is cast twice; only the first may count
+        accepted.append(sum(buffer.upvote_issue(email, issue_id)
+                            for email in emails * 2 for issue_id in ISSUES))
+
+    def flush():
+        while not done.is_set():
+            buffers[0].flush()
+
+    voters = [threading.Thread(target=vote, args=(buffers[i % 3], USERS[i::4])) for i in range(4)]
+    flusher = threading.Thread(target=flush)
+    flusher.start()
+    for thread in voters:
+        thread.start()
+    for thread in voters:
+        thread.join()
+    done.set()
+    flusher.join()
+    buffers[1].flush()
+
+    assert sum(accepted) == len(USERS) * len(ISSUES)
+    assert [_stored(store, issue_id) for issue_id in ISSUES] == [len(USERS)] * len(ISSUES)
+
+
+def test_version_is_shared_between_processes(open_buffer):
+    first, second = open_buffer(), open_buffer()
+    before = first.version()
+    assert second.version() == before
+
+    assert first.upvote_issue(USERS[0], "pothole")
+    voted = second.version()
+    assert voted != before and first.version() == voted
+
+    second.flush()
+    assert first.version() == second.version() != voted
+
+
+def test_buffered_votes_reach_every_consumer(store, open_buffer):
+    buffer = open_buffer()
+    # changes_since is meant for one consumer; a second still sees every vote, through full reloads
+    repositories = [Repository(buffer), Repository(buffer)]
+    for email in USERS[:2]:
+        assert buffer.upvote_issue(email, "pothole")
+        for repository in repositories:
+            assert USERS[0] in {u["email"] for u in repository.list_users()
+                                if "pothole" in u["upvoted_issues"]}
+    assert [r.get_issue("pothole")["upvotes"] for r in repositories] == [2, 2]
+
+    buffer.flush()
+    assert buffer.upvote_issue(USERS[2], "pothole")
+    assert [r.get_issue("pothole")["upvotes"] for r in repositories] == [3, 3]
+    assert [r.get_issue("streetlight")["upvotes"] for r in repositories] == [0, 0]